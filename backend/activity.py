@@ -0,0 +1,121 @@
+"""
+Activity log reads and retention.
+
+Reads are keyset-paginated newest first on (created_at, id), which
+ix_activity_logs_project_created serves directly: a page costs the same however
+deep it is. The cursor is opaque to clients (queries.encode_cursor).
+
+Entries are moved out of activity_logs by the periodic compact_activity_logs
+job into activity_log_archives, a whole calendar month at a time once the month
+is entirely older than ACTIVITY_RETENTION_DAYS. Each batch of moved entries
+becomes new zlib-compressed JSON segments, one per project and month in the
+batch, so archiving never reads back or recompresses earlier segments; a month
+is normally one segment, split only when it spans batches. The hot table (and
+every scan over it, like /admin/logs) stays bounded by the retention window;
+archived months are still readable per project.
+"""
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import delete
+from sqlalchemy.orm import Session, joinedload
+import jobs, models, queries
+
+ACTIVITY_RETENTION_DAYS = int(os.getenv("ACTIVITY_RETENTION_DAYS", "90"))
+COMPACT_BATCH_SIZE = int(os.getenv("ACTIVITY_COMPACT_BATCH", "5000"))
+COMPACT_INTERVAL = timedelta(hours=1)
+
+def page(db: Session, project_id: int, limit: int, before: Optional[str] = None):
+    """Up to `limit` entries older than the `before` cursor, newest first, and the cursor for the next page (None at the end)."""
+    log = models.ActivityLog
+    query = (
+        db.query(log)
+        .options(joinedload(log.user))
+        .filter(log.project_id == project_id)
+    )
+    if before:
+        try:
+            query = query.filter(queries.keyset_before(log.created_at, log.id, before))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    # One extra row tells whether another page exists
+    rows = query.order_by(log.created_at.desc(), log.id.desc()).limit(limit + 1).all()
+    next_cursor = queries.encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+# --- Archive ---
+
+def _entry(log: models.ActivityLog):
+    return {
+        "id": log.id,
+        "user_id": log.user_id,
+        "action": log.action,
+        "details": log.details,
+        "created_at": log.created_at.isoformat(),
+    }
+
+def _pack(entries) -> bytes:
+    return zlib.compress(json.dumps(entries, separators=(",", ":")).encode(), 9)
+
+def unpack(segment: models.ActivityLogArchive):
+    return json.loads(zlib.decompress(segment.data)) if segment.data else []
+
+def month_entries(db: Session, project_id: int, month: str):
+    """All archived entries of one month, oldest first; None if nothing is archived for it."""
+    segments = (
+        db.query(models.ActivityLogArchive)
+        .filter(models.ActivityLogArchive.project_id == project_id, models.ActivityLogArchive.month == month)
+        .all()
+    )
+    if not segments:
+        return None
+    entries = [entry for segment in segments for entry in unpack(segment)]
+    entries.sort(key=lambda entry: (entry["created_at"], entry["id"]))
+    return entries
+
+def compact(db: Session, now: datetime = None, batch_size: int = COMPACT_BATCH_SIZE) -> int:
+    """Move whole months past retention into the archive, one committed batch at a time. Returns how many moved."""
+    horizon = (now or datetime.utcnow()) - timedelta(days=ACTIVITY_RETENTION_DAYS)
+    cutoff = horizon.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    log = models.ActivityLog
+    moved = 0
+    while True:
+        rows = (
+            db.query(log)
+            .filter(log.created_at < cutoff)
+            .order_by(log.created_at, log.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return moved
+        # Deleting first claims the rows: a concurrent run that selected the same
+        # batch deletes fewer than it read and backs off instead of archiving twice
+        deleted = db.execute(delete(log).where(log.id.in_([row.id for row in rows])).execution_options(synchronize_session=False)).rowcount
+        if deleted != len(rows):
+            db.rollback()
+            db.expunge_all()
+            continue
+
+        groups = {}
+        for row in rows:
+            groups.setdefault((row.project_id, row.created_at.strftime("%Y-%m")), []).append(_entry(row))
+        for (project_id, month), entries in groups.items():
+            db.add(models.ActivityLogArchive(
+                project_id=project_id,
+                month=month,
+                entry_count=len(entries),
+                first_at=datetime.fromisoformat(entries[0]["created_at"]),
+                last_at=datetime.fromisoformat(entries[-1]["created_at"]),
+                data=_pack(entries),
+            ))
+        db.commit()
+        moved += len(rows)
+        db.expunge_all()
+
+@jobs.job("compact_activity_logs", every=COMPACT_INTERVAL)
+def handle_compact_activity_logs(db: Session):
+    compact(db)
@@ -1,4 +1,6 @@
 ﻿from sqladmin import Admin, ModelView
+import mentions
+from dependencies import invalidate_user
 from models import User, Project, Stage, Task, Attachment, ConfigBoard, Comment, Notification, ActivityLog
 
 
@@ -12,6 +14,16 @@ class UserAdmin(ModelView, model=User):
     can_delete = True
     can_view_details = True
 
+    async def after_model_change(self, data, model, is_created, request):
+        # Plan/email/token edits must not be masked by cached credentials,
+        # and name/email edits change @mention handles
+        invalidate_user(model.id)
+        mentions.invalidate_all()
+
+    async def after_model_delete(self, model, request):
+        invalidate_user(model.id)
+        mentions.invalidate_all()
+
 class ProjectAdmin(ModelView, model=Project):
     column_list = [Project.id, Project.name, Project.owner_id, Project.created_at]
     name = "Project"
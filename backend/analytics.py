@@ -0,0 +1,135 @@
+"""
+Project analytics computed in the database.
+
+Every figure comes from an aggregate query (GROUP BY status, priority,
+assignee, day) except cycle time, which needs percentiles and reads just two
+columns of the completed tasks. Results are cached per (project, version):
+every task write bumps Project.version (helpers.record_change), so a cached
+entry is never served after a change. The TTL only rolls "overdue" forward.
+"""
+from datetime import datetime, timedelta, date
+from sqlalchemy import func, case, select
+from sqlalchemy.orm import Session
+import models
+from cache import LRUCache, register
+
+DEFAULT_DAYS = 30
+MAX_DAYS = 365
+ANALYTICS_TTL_SECONDS = 300
+
+_cache = register(LRUCache("project_analytics", maxsize=1024, ttl=ANALYTICS_TTL_SECONDS))
+
+def _day(value) -> str:
+    # func.date() gives a date on MySQL and a string on SQLite
+    return value.isoformat() if isinstance(value, date) else str(value)
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def _cycle_time(db: Session, project_id: int):
+    rows = db.execute(
+        select(models.Task.created_at, models.Task.completed_at)
+        .where(models.Task.project_id == project_id, models.Task.completed_at.is_not(None), models.Task.created_at.is_not(None))
+    ).all()
+    hours = sorted(max((completed - created).total_seconds(), 0) / 3600 for created, completed in rows)
+    if not hours:
+        return {"completed": 0, "avg_hours": None, "median_hours": None, "p85_hours": None}
+    return {
+        "completed": len(hours),
+        "avg_hours": round(sum(hours) / len(hours), 2),
+        "median_hours": round(_percentile(hours, 0.5), 2),
+        "p85_hours": round(_percentile(hours, 0.85), 2),
+    }
+
+def _per_day(db: Session, project_id: int, column, start: datetime):
+    day = func.date(column)
+    rows = db.execute(
+        select(day, func.count(models.Task.id))
+        .where(models.Task.project_id == project_id, column >= start)
+        .group_by(day)
+    ).all()
+    return {_day(value): count for value, count in rows if value is not None}
+
+def compute(db: Session, project_id: int, days: int = DEFAULT_DAYS):
+    now = datetime.utcnow()
+    today = now.date()
+    start = datetime.combine(today - timedelta(days=days - 1), datetime.min.time())
+    task = models.Task
+
+    totals = db.execute(
+        select(
+            func.count(task.id),
+            func.sum(case((task.status == "DONE", 1), else_=0)),
+            func.sum(case(((task.due_date < now) & (task.status != "DONE"), 1), else_=0)),
+            func.sum(case((task.created_at < start, 1), else_=0)),
+            func.sum(case((task.completed_at < start, 1), else_=0)),
+        ).where(task.project_id == project_id)
+    ).one()
+    total, done, overdue, created_before, completed_before = (value or 0 for value in totals)
+
+    by_status = dict(
+        db.execute(select(task.status, func.count(task.id)).where(task.project_id == project_id).group_by(task.status)).all()
+    )
+    by_priority = dict(
+        db.execute(select(task.priority, func.count(task.id)).where(task.project_id == project_id).group_by(task.priority)).all()
+    )
+    assignee_rows = db.execute(
+        select(
+            task.assignee_id,
+            models.User.full_name,
+            models.User.email,
+            func.count(task.id),
+            func.sum(case((task.status == "DONE", 1), else_=0)),
+        )
+        .outerjoin(models.User, models.User.id == task.assignee_id)
+        .where(task.project_id == project_id)
+        .group_by(task.assignee_id, models.User.full_name, models.User.email)
+        .order_by(func.count(task.id).desc())
+    ).all()
+
+    created_per_day = _per_day(db, project_id, task.created_at, start)
+    completed_per_day = _per_day(db, project_id, task.completed_at, start)
+
+    throughput = []
+    burndown = []
+    created_so_far, completed_so_far = created_before, completed_before
+    for offset in range(days):
+        key = (start.date() + timedelta(days=offset)).isoformat()
+        created_so_far += created_per_day.get(key, 0)
+        completed_so_far += completed_per_day.get(key, 0)
+        throughput.append({"date": key, "count": completed_per_day.get(key, 0)})
+        burndown.append({"date": key, "remaining": created_so_far - completed_so_far})
+
+    return {
+        "project_id": project_id,
+        "generated_at": now,
+        "days": days,
+        "total_tasks": total,
+        "done": done,
+        "overdue": overdue,
+        "completion_rate": round(done / total * 100, 1) if total else 0,
+        "by_status": {status or "": count for status, count in by_status.items()},
+        "by_priority": {priority or "": count for priority, count in by_priority.items()},
+        "by_assignee": [
+            {
+                "assignee_id": assignee_id,
+                "name": (name or email or "Unknown") if assignee_id else "Unassigned",
+                "total": count,
+                "done": done_count or 0,
+            }
+            for assignee_id, name, email, count, done_count in assignee_rows
+        ],
+        "throughput": throughput,
+        "cycle_time": _cycle_time(db, project_id),
+        "burndown": burndown,
+    }
+
+def get_analytics(db: Session, project: models.Project, days: int = DEFAULT_DAYS):
+    key = (project.id, project.version, days)
+    result = _cache.get(key)
+    if result is None:
+        result = {**compute(db, project.id, days), "version": project.version}
+        # Entries for older versions can never be hit again
+        _cache.invalidate_where(lambda cached_key, value: cached_key[0] == project.id and cached_key[1] != project.version)
+        _cache.set(key, result)
+    return result
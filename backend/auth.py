@@ -2,6 +2,12 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import hmac
+import threading
+import time
 
 import os
 from dotenv import load_dotenv
@@ -12,14 +18,58 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with a different cost are flagged by verify_and_update() and
+# replaced on the user's next login, so changing BCRYPT_ROUNDS needs no migration.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update(plain_password, hashed_password):
+    """(valid, new_hash); new_hash is set when the stored hash should be replaced."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# --- Hashing pool ---
+# bcrypt takes ~100-300ms of CPU per call (and releases the GIL while doing it).
+# Running it on a small dedicated pool keeps it off the event loop and caps how
+# much CPU a login burst can take; past HASH_QUEUE_LIMIT waiting calls, new ones
+# fail fast with HasherBusy (503) instead of queueing without bound.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "64"))
+
+class HasherBusy(Exception):
+    pass
+
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_LIMIT)
+
+def _acquire_slot():
+    if not _hash_slots.acquire(blocking=False):
+        raise HasherBusy()
+
+def _submit(fn, *args):
+    _acquire_slot()
+    try:
+        future = _hash_pool.submit(fn, *args)
+    except BaseException:
+        _hash_slots.release()
+        raise
+    future.add_done_callback(lambda _: _hash_slots.release())
+    return future
+
+async def run_hasher(fn, *args):
+    """Await fn(*args) on the hashing pool. Raises HasherBusy when the queue is full."""
+    return await asyncio.wrap_future(_submit(fn, *args))
+
+def run_hasher_sync(fn, *args):
+    """Same as run_hasher, for sync handlers (already off the event loop)."""
+    return _submit(fn, *args).result()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -29,3 +79,43 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+# --- Signed download URLs ---
+# Browsers open attachment links themselves and can't send the Authorization
+# header, and a bearer token in the query string would end up in logs, history
+# and Referer. A download URL instead carries an expiry and an HMAC over
+# (attachment id, expiry): it grants that one file until then and nothing else.
+# Expiries are rounded up to a DOWNLOAD_URL_TTL boundary, so the URL stays the
+# same for a while and browsers can reuse their cached copy.
+DOWNLOAD_URL_TTL = int(os.getenv("DOWNLOAD_URL_TTL", "900"))
+
+def _download_signature(attachment_id: int, expires: int) -> str:
+    message = f"attachment:{attachment_id}:{expires}".encode()
+    return hmac.new(SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+def sign_download(attachment_id: int):
+    """(expires, signature) for a download URL valid between DOWNLOAD_URL_TTL and twice that."""
+    expires = (int(time.time()) // DOWNLOAD_URL_TTL + 2) * DOWNLOAD_URL_TTL
+    return expires, _download_signature(attachment_id, expires)
+
+def verify_download(attachment_id: int, expires: int, signature: str) -> bool:
+    return expires > time.time() and hmac.compare_digest(_download_signature(attachment_id, expires), signature)
+
+# --- Signed stream URLs ---
+# EventSource and WebSocket can't send the Authorization header either. A stream
+# URL is signed the same way over (scope, user id, expiry), where the scope names
+# the one stream it opens. It is only checked when the connection opens, so it
+# can be short-lived: the client fetches a fresh one for every (re)connect.
+STREAM_URL_TTL = int(os.getenv("STREAM_URL_TTL", "60"))
+
+def _stream_signature(scope: str, user_id: int, expires: int) -> str:
+    message = f"stream:{scope}:{user_id}:{expires}".encode()
+    return hmac.new(SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+def sign_stream(scope: str, user_id: int):
+    """(expires, signature) letting `user_id` open the `scope` stream for the next STREAM_URL_TTL seconds."""
+    expires = int(time.time()) + STREAM_URL_TTL
+    return expires, _stream_signature(scope, user_id, expires)
+
+def verify_stream(scope: str, user_id: int, expires: int, signature: str) -> bool:
+    return expires > time.time() and hmac.compare_digest(_stream_signature(scope, user_id, expires), signature)
@@ -0,0 +1,95 @@
+"""
+Small thread-safe in-process caches with hit/miss counters.
+
+LRUCache bounds entries by count (and optionally by total size, for caches of
+serialized payloads) and can expire entries after a TTL. Each process has its
+own copy, so anything cached here must tolerate a short staleness window in
+multi-worker deployments (TTL) or be invalidated explicitly on every write path.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class LRUCache:
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = None, max_bytes: int = None, sizeof=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self._data = OrderedDict() # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at, size = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None, size)
+            self._bytes += size
+            while self._data and (len(self._data) > self.maxsize or (self.max_bytes and self._bytes > self.max_bytes)):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def invalidate_where(self, predicate):
+        """Drop every entry for which `predicate(key, value)` is true."""
+        with self._lock:
+            for key in [key for key, (value, _, _) in self._data.items() if predicate(key, value)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
+
+_registry = {}
+
+def register(cache: LRUCache) -> LRUCache:
+    """Make a cache visible in all_stats() (GET /admin/metrics)."""
+    _registry[cache.name] = cache
+    return cache
+
+def all_stats():
+    return {name: cache.stats() for name, cache in _registry.items()}
@@ -1,24 +1,226 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, StaticPool
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from collections import deque
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,   # test connection before use, auto-reconnect if dead
-    pool_recycle=280,     # recycle connections every 280s (before PythonAnywhere's ~300s MySQL timeout)
-)
+# --- Connection pool ---
+# Size the pool per worker process: DB_POOL_SIZE + DB_MAX_OVERFLOW connections
+# at most, and a checkout waits up to DB_POOL_TIMEOUT seconds before failing.
+# Pre-ping costs a round trip per checkout; with DB_POOL_RECYCLE below the
+# server's idle timeout it only catches server restarts, so it can be turned off.
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "280")), # before PythonAnywhere's ~300s MySQL timeout
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+}
+
+class PoolStats:
+    """Checkout wait times, timeouts and pre-ping failures for one engine's pool."""
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.pre_ping_failures = 0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self._waits.append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            counters = {"checkouts": self.checkouts, "timeouts": self.timeouts, "pre_ping_failures": self.pre_ping_failures}
+        if not waits:
+            return {**counters, "wait_avg_ms": None, "wait_p95_ms": None, "wait_max_ms": None}
+        p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))]
+        return {
+            **counters,
+            "wait_avg_ms": round(sum(waits) / len(waits) * 1000, 2),
+            "wait_p95_ms": round(p95 * 1000, 2),
+            "wait_max_ms": round(waits[-1] * 1000, 2),
+        }
+
+def _instrumented_pool_class(stats: PoolStats, base=QueuePool):
+    # A class per engine: Pool.recreate() (after dispose) builds a new instance
+    # of the same class, so the stats carry over
+    class InstrumentedQueuePool(base):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                entry = super()._do_get()
+            except PoolTimeout:
+                stats.record_wait(time.perf_counter() - started, timed_out=True)
+                raise
+            stats.record_wait(time.perf_counter() - started)
+            return entry
+    return InstrumentedQueuePool
+
+_engines = {} # name -> (engine, PoolStats)
+
+def is_memory_sqlite(url: str) -> bool:
+    """sqlite://, sqlite:///:memory: and file::memory: / mode=memory URIs."""
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and (
+        not parsed.database or ":memory:" in parsed.database or parsed.query.get("mode") == "memory"
+    )
+
+def _memory_sqlite_options():
+    # The database lives and dies with its connection, so every thread shares
+    # one (StaticPool) and it is never recycled; there is no queue to size
+    options = {key: value for key, value in POOL_OPTIONS.items() if key not in ("pool_size", "max_overflow", "pool_timeout", "pool_recycle", "pool_pre_ping")}
+    return {**options, "poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+
+def make_engine(name: str, url: str, is_async: bool = False):
+    """A sync engine, or an AsyncEngine with is_async; either way its pool shows up in pool_stats()."""
+    stats = PoolStats()
+    if is_memory_sqlite(url):
+        options = _memory_sqlite_options()
+    else:
+        options = {**POOL_OPTIONS, "poolclass": _instrumented_pool_class(stats, AsyncAdaptedQueuePool if is_async else QueuePool)}
+    new_engine = create_async_engine(url, **options) if is_async else create_engine(url, **options)
+    sync_engine = new_engine.sync_engine if is_async else new_engine
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _count_pre_ping_failures(context):
+        if context.is_pre_ping:
+            with stats._lock:
+                stats.pre_ping_failures += 1
+
+    _engines[name] = (sync_engine, stats)
+    return new_engine
+
+def pool_stats():
+    """Per-engine pool occupancy plus checkout statistics, for GET /admin/metrics."""
+    result = {}
+    for name, (each, stats) in _engines.items():
+        pool = each.pool
+        occupancy = {}
+        if isinstance(pool, QueuePool):
+            occupancy = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+            }
+        result[name] = {**occupancy, **stats.snapshot()}
+    return result
+
+engine = make_engine("primary", SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# --- Optional read replica ---
+# READ_DATABASE_URL points read-heavy endpoints (get_read_db) at a replica.
+# Replicas lag, so a user who committed a write in the last READ_STALENESS_SECONDS
+# keeps reading from the primary and sees their own changes; everyone else may
+# see data up to the replica's lag old. Write tracking is per process, so set
+# READ_STALENESS_SECONDS comfortably above the replica's usual lag.
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+READ_STALENESS_SECONDS = float(os.getenv("READ_STALENESS_SECONDS", "5"))
+
+read_engine = make_engine("replica", READ_DATABASE_URL) if READ_DATABASE_URL else None
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine) if read_engine is not None else None
+
+_last_write = {} # user id -> monotonic time of their last committed write
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_flush_write(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _mark_statement_write(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["wrote"] = True
+
+@event.listens_for(SessionLocal, "after_commit")
+def _remember_writer(session):
+    # session.info["user_id"] is set by dependencies.get_current_user
+    if session.info.pop("wrote", False) and session.info.get("user_id") is not None:
+        now = time.monotonic()
+        _last_write[session.info["user_id"]] = now
+        if len(_last_write) > 10000:
+            for user_id, at in list(_last_write.items()):
+                if now - at >= READ_STALENESS_SECONDS:
+                    _last_write.pop(user_id, None)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
+
+def read_session(user_id: int = None):
+    """A session on the replica, or on the primary when there is none or `user_id` wrote recently."""
+    if ReadSessionLocal is None:
+        return SessionLocal()
+    last_write = _last_write.get(user_id)
+    if last_write is not None and time.monotonic() - last_write < READ_STALENESS_SECONDS:
+        return SessionLocal()
+    return ReadSessionLocal()
+
 Base = declarative_base()
 
-def get_db():
+# --- Optional async engine ---
+# Set ASYNC_DATABASE_URL to the same database through an async driver
+# (mysql+aiomysql://, mysql+asyncmy://, sqlite+aiosqlite://) to serve the
+# async endpoints without borrowing a thread per query. Those drivers are
+# optional; without the variable the async endpoints run their statements on a
+# sync session through the thread pool instead.
+#
+# Scope: only these endpoints run on it - POST /token, GET /users/me, the
+# notification list, unread count and read endpoints, and the notification
+# stream's authentication. Everything else stays on sync sessions, because
+# async sessions don't fire the SessionLocal commit hooks (activity log,
+# notifications, events, blob release, job wake-up) those handlers rely on.
+# Porting them needs those hooks moved first.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DATABASE_URL:
+    async_engine = make_engine("async", ASYNC_DATABASE_URL, is_async=True)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def is_async(db) -> bool:
+    return isinstance(db, AsyncSession)
+
+@asynccontextmanager
+async def async_session():
+    """An AsyncSession in async mode, otherwise a sync Session; use with execute()/commit() below."""
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        await run_in_threadpool(db.close)
+
+async def execute(db, statement):
+    if is_async(db):
+        return await db.execute(statement)
+    return await run_in_threadpool(db.execute, statement)
+
+async def commit(db):
+    if is_async(db):
+        await db.commit()
+    else:
+        await run_in_threadpool(db.commit)
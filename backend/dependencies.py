@@ -1,11 +1,22 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.orm import Session, make_transient_to_detached
 from jose import JWTError, jwt
+import hashlib, os, time
 import models, auth, database
+from cache import LRUCache, register
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Verified token -> user row, so the hot path skips jwt.decode and the users lookup.
+# invalidate_user() reaches this process only: other workers keep serving the
+# cached row - its plan (and so the plan limits in plans.py), email and API
+# token - for up to TOKEN_CACHE_TTL seconds after a change. Lower the TTL to
+# shorten that window, or set it to 0 to read the user on every request.
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL", "60"))
+_token_cache = register(LRUCache("auth_tokens", maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")), ttl=TOKEN_CACHE_TTL_SECONDS))
+
 def get_db():
     db = database.SessionLocal()
     try:
@@ -13,20 +24,93 @@ def get_db():
     finally:
         db.close()
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _cached_user(key: str):
+    """A detached copy of the cached user row, or None."""
+    cached = _token_cache.get(key)
+    if cached is None:
+        return None
+    user = models.User(**cached)
+    make_transient_to_detached(user)
+    return user
+
+def _decode_token(token: str) -> str:
     try:
         payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    user = db.query(models.User).filter(models.User.email == email).first()
+        raise credentials_exception()
+    if payload.get("sub") is None:
+        raise credentials_exception()
+    return payload
+
+def _remember(key: str, user: models.User, payload: dict):
+    ttl = TOKEN_CACHE_TTL_SECONDS
+    if payload.get("exp"):
+        # Never serve a token from cache past its own expiry
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        _token_cache.set(key, {c.name: getattr(user, c.name) for c in models.User.__table__.columns}, ttl=ttl)
+
+def user_from_token(token: str, db: Session):
+    key = _cache_key(token)
+    user = _cached_user(key)
+    if user is not None:
+        # Attach the cached row to this session without a SELECT
+        return db.merge(user, load=False)
+
+    payload = _decode_token(token)
+    user = db.query(models.User).filter(models.User.email == payload["sub"]).first()
+    if user is None:
+        raise credentials_exception()
+    _remember(key, user, payload)
+    return user
+
+async def user_from_token_async(token: str, db):
+    """user_from_token for a session from database.async_session()."""
+    key = _cache_key(token)
+    user = _cached_user(key)
+    if user is not None:
+        return user
+
+    payload = _decode_token(token)
+    result = await database.execute(db, select(models.User).where(models.User.email == payload["sub"]))
+    user = result.scalars().first()
     if user is None:
-        raise credentials_exception
+        raise credentials_exception()
+    _remember(key, user, payload)
     return user
+
+def invalidate_user(user_id: int):
+    """Drop this process's cached tokens for a user; call when their plan, email or API token changes."""
+    _token_cache.invalidate_where(lambda key, columns: columns["id"] == user_id)
+
+# Sync on purpose: FastAPI runs it in the thread pool, so a cache miss doesn't block the event loop
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    user = user_from_token(token, db)
+    db.info["user_id"] = user.id # lets database.read_session() route this user's reads after a write
+    return user
+
+def get_read_db(current_user: models.User = Depends(get_current_user)):
+    """Session for read-only endpoints: the replica when configured (see database.read_session)."""
+    db = database.read_session(current_user.id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with database.async_session() as db:
+        yield db
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db = Depends(get_async_db)):
+    """For async handlers. The user is detached unless it was just loaded; read its columns only."""
+    return await user_from_token_async(token, db)
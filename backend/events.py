@@ -0,0 +1,134 @@
+"""
+In-process publish/subscribe used to push events (notifications, board updates)
+to connected clients.
+
+Handlers never publish directly: they call queue_event() on their session and
+the event goes out after that session commits, so subscribers never see a
+change that was rolled back. Publishing is thread-safe (sync handlers run in
+the threadpool) and hands each event to the subscriber's own event loop.
+
+InMemoryBroker only reaches subscribers in the current process. To fan out
+across several workers, install a broker with the same publish/subscribe/
+unsubscribe/replay interface (e.g. backed by Redis pub/sub) via set_broker().
+"""
+import asyncio
+import threading
+from collections import defaultdict, deque
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import database
+
+SUBSCRIBER_QUEUE_SIZE = 100
+HISTORY_SIZE = 200 # recent events kept per channel for resume
+
+# What to do when a subscriber's queue is full
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
+class Subscription:
+    """One connected client. Events arrive on `queue` in the subscriber's loop."""
+    def __init__(self, channel: str, loop: asyncio.AbstractEventLoop, maxsize: int = SUBSCRIBER_QUEUE_SIZE, on_overflow: str = DROP_OLDEST):
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.on_overflow = on_overflow
+        self.overflowed = False
+
+    def deliver(self, payload: dict):
+        # Runs in self.loop
+        if self.overflowed:
+            return
+        if self.queue.full():
+            if self.on_overflow == DISCONNECT:
+                # Slow consumer: drop what it has queued and wake it with the None sentinel
+                self.overflowed = True
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+                self.queue.put_nowait(None)
+                return
+            self.queue.get_nowait()
+        self.queue.put_nowait(payload)
+
+class InMemoryBroker:
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        self._subscribers = defaultdict(set)
+        self._history = defaultdict(lambda: deque(maxlen=history_size))
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str, maxsize: int = SUBSCRIBER_QUEUE_SIZE, on_overflow: str = DROP_OLDEST) -> Subscription:
+        """Call from the coroutine that will consume the subscription."""
+        subscription = Subscription(channel, asyncio.get_running_loop(), maxsize, on_overflow)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel: str, payload: dict):
+        with self._lock:
+            # Only events carrying an id can be resumed from
+            if "id" in payload:
+                self._history[channel].append(payload)
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, payload)
+            except RuntimeError:
+                # Loop already closed; the stream's finally block will unsubscribe it
+                pass
+
+    def replay(self, channel: str, after_id: int):
+        """
+        Events on `channel` with id > after_id, and whether that is all of them.
+        Incomplete means events were already evicted; the client must resync.
+        """
+        with self._lock:
+            history = list(self._history.get(channel, ()))
+        if not history:
+            return [], False
+        missed = [payload for payload in history if payload["id"] > after_id]
+        complete = min(payload["id"] for payload in history) <= after_id + 1
+        return sorted(missed, key=lambda payload: payload["id"]), complete
+
+    def subscriber_count(self, channel: str = None) -> int:
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+broker = InMemoryBroker()
+
+def set_broker(new_broker):
+    global broker
+    broker = new_broker
+
+def get_broker():
+    return broker
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+def project_channel(project_id: int) -> str:
+    return f"project:{project_id}"
+
+# --- Publish-after-commit ---
+
+def queue_event(db: Session, channel: str, payload: dict):
+    """Publish `payload` on `channel` once `db` commits; dropped on rollback."""
+    db.info.setdefault("pending_events", []).append((channel, payload))
+
+@event.listens_for(database.SessionLocal, "after_commit")
+def _publish_pending_events(session):
+    pending = session.info.pop("pending_events", None)
+    for channel, payload in pending or ():
+        broker.publish(channel, payload)
+
+@event.listens_for(database.SessionLocal, "after_rollback")
+def _discard_pending_events(session):
+    session.info.pop("pending_events", None)
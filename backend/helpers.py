@@ -1,24 +1,178 @@
-import models
-from sqlalchemy.orm import Session
+"""
+Shared write helpers.
+
+Side effects of a request (activity log rows, notifications) are not written
+one by one: log_activity() and create_notification() only collect rows on the
+session, and _flush_side_effects() writes them in bulk right before the
+request's single commit. Nothing is written if the request rolls back.
+"""
+import models, schemas, database, jobs, mentions, snapshots
+from events import queue_event, user_channel, project_channel
+from sqlalchemy import update, insert, delete, event, case
+from sqlalchemy.orm import Session, joinedload
+import datetime
+import os
+
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "30"))
+NOTIFICATION_PRUNE_BATCH = 5000
+PROJECT_CHANGES_RETENTION_DAYS = int(os.getenv("PROJECT_CHANGES_RETENTION_DAYS", "30"))
+PROJECT_CHANGES_PRUNE_BATCH = 5000
 
 def create_notification(db: Session, user_id: int, content: str, type: str = "INFO"):
-    notification = models.Notification(user_id=user_id, content=content, type=type)
-    db.add(notification)
-    db.commit()
+    db.info.setdefault("pending_notifications", []).append(
+        models.Notification(user_id=user_id, content=content, type=type)
+    )
+
+def change_unread(user_id: int, delta: int):
+    """UPDATE for User.unread_notifications; never goes below zero."""
+    counter = models.User.unread_notifications
+    return (
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(unread_notifications=case((counter + delta > 0, counter + delta), else_=0))
+        .execution_options(synchronize_session=False)
+    )
 
 def log_activity(db: Session, project_id: int, action: str, details: str = None, user_id: int = None):
-    log = models.ActivityLog(project_id=project_id, user_id=user_id, action=action, details=details)
-    db.add(log)
-    db.commit()
+    db.info.setdefault("pending_activity", []).append({
+        "project_id": project_id,
+        "user_id": user_id,
+        "action": action,
+        "details": details,
+        "created_at": datetime.datetime.utcnow(),
+    })
+
+@event.listens_for(database.SessionLocal, "before_commit")
+def _flush_side_effects(session):
+    activity = session.info.pop("pending_activity", None)
+    if activity:
+        # One executemany INSERT for all of the request's log rows
+        session.execute(insert(models.ActivityLog), activity)
+
+    notifications = session.info.pop("pending_notifications", None)
+    if notifications:
+        # Added through the ORM (batched where the dialect can return ids) because
+        # the pushed event needs each notification's id
+        session.add_all(notifications)
+        session.flush()
+        unread = {}
+        for notification in notifications:
+            unread[notification.user_id] = unread.get(notification.user_id, 0) + 1
+        for user_id, count in sorted(unread.items()): # fixed lock order across requests
+            session.execute(change_unread(user_id, count))
+        for notification in notifications:
+            # Pushed to the user's open notification streams once the commit succeeds
+            queue_event(session, user_channel(notification.user_id), {
+                "type": "notification",
+                "data": schemas.Notification.model_validate(notification).model_dump(mode="json"),
+            })
+
+@event.listens_for(database.SessionLocal, "after_rollback")
+def _discard_side_effects(session):
+    session.info.pop("pending_activity", None)
+    session.info.pop("pending_notifications", None)
+
+def record_change(db: Session, project_id: int, entity: str, entity_id: int, op: str = "upsert", data: dict = None):
+    """
+    Bump the project's version and note which row changed, for delta sync.
+    The UPDATE holds the project row lock until commit, so versions commit in order.
+    `data` (the changed fields) is broadcast to the project's live subscribers,
+    with the new version as the event id.
+    """
+    return record_changes(db, project_id, [(entity, entity_id, op, data)])
+
+def record_changes(db: Session, project_id: int, changes):
+    """
+    record_change for many rows at once: `changes` is a list of
+    (entity, entity_id, op, data). Each change still gets its own version (and
+    event id), but the version is bumped by one UPDATE. Returns the last version.
+    """
+    if not changes:
+        return None
+    db.execute(
+        update(models.Project)
+        .where(models.Project.id == project_id)
+        .values(version=models.Project.version + len(changes))
+        .execution_options(synchronize_session=False)
+    )
+    last_version = db.query(models.Project.version).filter(models.Project.id == project_id).scalar()
+    snapshots.changed(db, project_id, last_version)
+    first_version = last_version - len(changes) + 1
+    for version, (entity, entity_id, op, data) in enumerate(changes, start=first_version):
+        db.add(models.ProjectChange(project_id=project_id, version=version, entity=entity, entity_id=entity_id, op=op))
+        queue_event(db, project_channel(project_id), {
+            "type": "change",
+            "id": version,
+            "entity": entity,
+            "entity_id": entity_id,
+            "op": op,
+            "data": data,
+        })
+    return last_version
 
 def process_mentions(db: Session, text: str, project_id: int, task_title: str, current_user: models.User):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
-    if not project:
+    index = mentions.get_index(db, project_id)
+    if index is None:
         return
-        
-    members = [project.owner] + project.members
-    for member in members:
-        name_mention = f"@{member.full_name.split(' ')[0]}" if member.full_name else f"@{member.email.split('@')[0]}"
-        if name_mention in text or f"@{member.email}" in text:
-            if member.id != current_user.id:
-                create_notification(db, member.id, f"{current_user.full_name or 'User'} mentioned you in a comment on '{task_title}'")
+    for user_id in index.resolve(text):
+        if user_id != current_user.id:
+            create_notification(db, user_id, f"{current_user.full_name or 'User'} mentioned you in a comment on '{task_title}'")
+
+# --- Background jobs (run by jobs.py workers) ---
+
+@jobs.job("comment_created")
+def handle_comment_created(db: Session, comment_id: int):
+    """Mention resolution and the assignee's "new comment" notification."""
+    comment = (
+        db.query(models.Comment)
+        .options(joinedload(models.Comment.task), joinedload(models.Comment.user))
+        .filter(models.Comment.id == comment_id)
+        .first()
+    )
+    if not comment or not comment.task:
+        return # deleted before the job ran
+    task, author = comment.task, comment.user
+    process_mentions(db, comment.content, task.project_id, task.title, author)
+    if task.assignee_id and task.assignee_id != author.id:
+        create_notification(db, task.assignee_id, f"New comment on task '{task.title}' by {author.full_name or author.email}")
+
+@jobs.job("notify")
+def handle_notify(db: Session, user_id: int, content: str, type: str = "INFO"):
+    create_notification(db, user_id, content, type)
+
+@jobs.job("prune_notifications", every=datetime.timedelta(hours=1))
+def handle_prune_notifications(db: Session):
+    """Delete read notifications older than NOTIFICATION_RETENTION_DAYS. Unread ones are kept."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=NOTIFICATION_RETENTION_DAYS)
+    while True:
+        ids = [
+            notification_id for (notification_id,) in
+            db.query(models.Notification.id)
+            .filter(models.Notification.is_read == True, models.Notification.created_at < cutoff)
+            .limit(NOTIFICATION_PRUNE_BATCH)
+        ]
+        if not ids:
+            return
+        db.execute(delete(models.Notification).where(models.Notification.id.in_(ids)).execution_options(synchronize_session=False))
+        db.commit()
+
+@jobs.job("prune_project_changes", every=datetime.timedelta(hours=1))
+def handle_prune_project_changes(db: Session):
+    """
+    Delete project_changes rows older than PROJECT_CHANGES_RETENTION_DAYS. A client
+    whose `since` predates what is left gets a resync answer from /changes.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=PROJECT_CHANGES_RETENTION_DAYS)
+    while True:
+        # Oldest first by primary key, so each batch reads only rows it deletes
+        ids = [
+            change_id for (change_id,) in
+            db.query(models.ProjectChange.id)
+            .filter(models.ProjectChange.created_at < cutoff)
+            .order_by(models.ProjectChange.id)
+            .limit(PROJECT_CHANGES_PRUNE_BATCH)
+        ]
+        if not ids:
+            return
+        db.execute(delete(models.ProjectChange).where(models.ProjectChange.id.in_(ids)).execution_options(synchronize_session=False))
+        db.commit()
@@ -0,0 +1,290 @@
+"""
+Background jobs backed by the `jobs` table, so no external broker is needed.
+
+Request handlers call enqueue() inside their own transaction; the job row
+commits (or rolls back) with the request. A small pool of worker threads
+claims pending rows with a conditional UPDATE, which is safe across threads
+and across processes, and runs the handler registered for the job's kind:
+
+    @jobs.job("comment_created")
+    def handle_comment_created(db, comment_id):
+        ...
+
+Failed jobs are retried with backoff up to MAX_ATTEMPTS. Jobs left "running"
+by a crashed worker are picked up again after STALE_AFTER. Finished (done or
+failed) rows are deleted JOB_RETENTION_DAYS after they finish by the periodic
+purge_finished_jobs job.
+
+Periodic jobs pass `every`; workers queue one whenever the last job of that
+kind was created longer than `every` ago:
+
+    @jobs.job("compact_activity_logs", every=timedelta(hours=1))
+    def compact(db):
+        ...
+
+Two processes can both find a periodic job due and queue it twice, so
+periodic handlers must be safe to run concurrently.
+
+Run workers in-process (start_workers(), wired to app startup) or standalone
+with `python jobs.py`.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, or_, and_, update, delete
+from sqlalchemy.orm import Session
+import database, models
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL", "5"))
+MAX_ATTEMPTS = 5
+STALE_AFTER = timedelta(minutes=10)
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+JOB_PURGE_BATCH = 5000
+
+_handlers = {}
+_schedules = {} # kind -> interval, for periodic jobs
+
+def job(kind: str, every: timedelta = None):
+    """Register the decorated function as the handler for `kind`. It gets (db, **payload)."""
+    def register(fn):
+        _handlers[kind] = fn
+        if every is not None:
+            _schedules[kind] = every
+        return fn
+    return register
+
+def enqueue(db: Session, kind: str, **payload):
+    """Queue a job; it becomes visible to workers when `db` commits."""
+    db.add(models.Job(kind=kind, payload=json.dumps(payload)))
+    db.info["jobs_enqueued"] = True
+
+# --- Metrics ---
+
+class JobStats:
+    """In-process counters plus recent wait/run latencies, for /admin/jobs."""
+    def __init__(self, window: int = 500):
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self._waits = deque(maxlen=window)
+        self._runs = deque(maxlen=window)
+
+    def record(self, wait: float, run: float, ok: bool, retrying: bool):
+        with self._lock:
+            if ok:
+                self.processed += 1
+            elif retrying:
+                self.retried += 1
+            else:
+                self.failed += 1
+            self._waits.append(wait)
+            self._runs.append(run)
+
+    @staticmethod
+    def _summary(values):
+        if not values:
+            return {"avg_ms": None, "p95_ms": None}
+        ordered = sorted(values)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return {"avg_ms": round(sum(ordered) / len(ordered) * 1000, 2), "p95_ms": round(p95 * 1000, 2)}
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "processed": self.processed,
+                "failed": self.failed,
+                "retried": self.retried,
+                "queue_wait": self._summary(list(self._waits)),
+                "run_time": self._summary(list(self._runs)),
+            }
+
+stats = JobStats()
+
+def metrics(db: Session):
+    depth = dict(
+        db.query(models.Job.status, func.count(models.Job.id))
+        .group_by(models.Job.status)
+        .all()
+    )
+    oldest_pending = db.query(func.min(models.Job.created_at)).filter(models.Job.status == "pending").scalar()
+    return {
+        "queue_depth": depth.get("pending", 0),
+        "by_status": depth,
+        "oldest_pending_age_seconds": (datetime.utcnow() - oldest_pending).total_seconds() if oldest_pending else 0,
+        "workers": len(_pool.threads) if _pool else 0,
+        **stats.snapshot(),
+    }
+
+# --- Cleanup ---
+
+@job("purge_finished_jobs", every=timedelta(hours=1))
+def handle_purge_finished_jobs(db: Session):
+    """Delete done/failed jobs that finished more than JOB_RETENTION_DAYS ago."""
+    cutoff = datetime.utcnow() - timedelta(days=JOB_RETENTION_DAYS)
+    while True:
+        ids = [
+            job_id for (job_id,) in
+            db.query(models.Job.id)
+            .filter(models.Job.status.in_(("done", "failed")), models.Job.finished_at < cutoff)
+            .limit(JOB_PURGE_BATCH)
+        ]
+        if not ids:
+            return
+        db.execute(delete(models.Job).where(models.Job.id.in_(ids)).execution_options(synchronize_session=False))
+        db.commit()
+
+# --- Worker ---
+
+def _claim(db: Session):
+    now = datetime.utcnow()
+    claimable = or_(
+        and_(models.Job.status == "pending", models.Job.run_after <= now),
+        and_(models.Job.status == "running", models.Job.started_at < now - STALE_AFTER),
+    )
+    candidates = db.query(models.Job.id).filter(claimable).order_by(models.Job.id).limit(5).all()
+    for (job_id,) in candidates:
+        # Only one worker's UPDATE can match; the others see rowcount 0 and move on
+        claimed = db.execute(
+            update(models.Job)
+            .where(models.Job.id == job_id, claimable)
+            .values(status="running", started_at=now, attempts=models.Job.attempts + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if claimed:
+            return db.query(models.Job).filter(models.Job.id == job_id).first()
+    return None
+
+_schedule_lock = threading.Lock()
+_next_schedule_check = 0.0
+
+def enqueue_due():
+    """Queue periodic jobs that are due. Checks at most once per poll interval per process."""
+    global _next_schedule_check
+    with _schedule_lock:
+        if not _schedules or time.monotonic() < _next_schedule_check:
+            return
+        _next_schedule_check = time.monotonic() + POLL_INTERVAL_SECONDS
+    db = database.SessionLocal()
+    try:
+        now = datetime.utcnow()
+        for kind, interval in _schedules.items():
+            last = db.query(func.max(models.Job.created_at)).filter(models.Job.kind == kind).scalar()
+            if last is None or last <= now - interval:
+                enqueue(db, kind)
+        db.commit()
+    finally:
+        db.close()
+
+def run_one() -> bool:
+    """Claim and run a single job. Returns False when there was nothing to do."""
+    db = database.SessionLocal()
+    try:
+        claimed = _claim(db)
+        if claimed is None:
+            return False
+        job_id, kind, payload = claimed.id, claimed.kind, json.loads(claimed.payload or "{}")
+        wait = (claimed.started_at - claimed.created_at).total_seconds()
+        attempts = claimed.attempts
+        started = time.monotonic()
+        try:
+            handler = _handlers.get(kind)
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind '{kind}'")
+            handler(db, **payload)
+            db.commit()
+            ok, error = True, None
+        except Exception as e:
+            db.rollback()
+            logger.exception("Job %s (%s) failed", job_id, kind)
+            ok, error = False, f"{type(e).__name__}: {e}"
+        run = time.monotonic() - started
+
+        retrying = not ok and attempts < MAX_ATTEMPTS
+        values = {"finished_at": datetime.utcnow(), "last_error": error}
+        if ok:
+            values["status"] = "done"
+        elif retrying:
+            values["status"] = "pending"
+            values["run_after"] = datetime.utcnow() + timedelta(seconds=2 ** attempts)
+        else:
+            values["status"] = "failed"
+        db.execute(update(models.Job).where(models.Job.id == job_id).values(**values))
+        db.commit()
+        stats.record(wait, run, ok, retrying)
+        return True
+    finally:
+        db.close()
+
+class WorkerPool:
+    def __init__(self, size: int):
+        self.size = size
+        self.threads = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def start(self):
+        for i in range(self.size):
+            thread = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        self._wake.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def wake(self):
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                enqueue_due()
+                if run_one():
+                    continue
+            except Exception:
+                logger.exception("Job worker error")
+            self._wake.wait(POLL_INTERVAL_SECONDS)
+            self._wake.clear()
+
+_pool = None
+
+def start_workers(size: int = JOB_WORKERS):
+    global _pool
+    if _pool is None and size > 0:
+        _pool = WorkerPool(size)
+        _pool.start()
+    return _pool
+
+def stop_workers():
+    global _pool
+    if _pool is not None:
+        _pool.stop()
+        _pool = None
+
+@event.listens_for(database.SessionLocal, "after_commit")
+def _wake_workers(session):
+    if session.info.pop("jobs_enqueued", False) and _pool is not None:
+        _pool.wake()
+
+if __name__ == "__main__":
+    import helpers, activity  # register the job handlers
+    logging.basicConfig(level=logging.INFO)
+    models.Base.metadata.create_all(bind=database.engine)
+    start_workers(max(JOB_WORKERS, 1))
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        stop_workers()
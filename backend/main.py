@@ -6,20 +6,27 @@ from fastapi.exceptions import HTTPException
 from starlette.middleware.base import BaseHTTPMiddleware
 import models
 from database import engine
-from routers import auth, projects, tasks, configs, notifications, admin
+from routers import auth, projects, tasks, configs, notifications, admin, realtime
 from admin_panel import register_admin
+import jobs
+import storage
 import os
 
 # Create tables
 models.Base.metadata.create_all(bind=engine)
 
 # Ensure uploads directory exists
-os.makedirs("uploads", exist_ok=True)
+os.makedirs(storage.UPLOAD_DIR, exist_ok=True)
 
 app = FastAPI()
 
-# Register SQLAdmin panel at /admin (see admin_panel.py for model views)
-register_admin(app, engine)
+@app.on_event("startup")
+def start_job_workers():
+    jobs.start_workers()
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    jobs.stop_workers()
 
 # Fix HTTPS scheme on PythonAnywhere — nginx proxies as http internally
 # This patches scope["scheme"] to https when X-Forwarded-Proto header is present
@@ -48,6 +55,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor"],
 )
 
 class NoCacheMiddleware(BaseHTTPMiddleware):
@@ -61,7 +69,26 @@ class NoCacheMiddleware(BaseHTTPMiddleware):
 
 app.add_middleware(NoCacheMiddleware)
 
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Starlette spools a multipart body to disk before the handler runs, so refuse
+# oversized attachment uploads from Content-Length up front; storage.stage_upload
+# still enforces the limit for chunked bodies without one
+class UploadLimitMiddleware:
+    MULTIPART_OVERHEAD = 64 * 1024
+
+    def __init__(self, app):
+        self.app = app
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"].endswith("/attachments/"):
+            length = dict(scope.get("headers", [])).get(b"content-length")
+            if length and length.isdigit() and int(length) > storage.MAX_UPLOAD_BYTES + self.MULTIPART_OVERHEAD:
+                response = JSONResponse(status_code=413, content={"detail": f"File exceeds the {storage.MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit"})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+app.add_middleware(UploadLimitMiddleware)
+
+# Attachments are served by GET /attachments/{id}/download, which checks project access
 
 app.include_router(auth.router)
 app.include_router(projects.router)
@@ -69,6 +96,12 @@ app.include_router(tasks.router)
 app.include_router(configs.router)
 app.include_router(notifications.router)
 app.include_router(admin.router)
+app.include_router(realtime.router)
+
+# Register SQLAdmin panel at /admin (see admin_panel.py for model views).
+# Its mount catches every /admin/* path, so it goes after the routers: the
+# JSON admin API (/admin/stats, /admin/jobs, ...) must be matched first.
+register_admin(app, engine)
 
 frontend_dist = os.path.abspath(
     os.path.join(os.path.dirname(__file__), "../frontend/dist")
@@ -0,0 +1,75 @@
+"""
+@mention resolution.
+
+Each project gets a MentionIndex (handle -> user ids) built once from its owner
+and members and cached until membership or a member's name/email changes.
+Resolving a comment is then a single pass over the text: every @token is
+looked up in the index, so the cost depends on the comment length, not on how
+many members the project has.
+
+Handles, matched case-insensitively (str.casefold, so "Straße" matches @STRASSE):
+    @<first name>            (or @<email local part> when the user has no name)
+    @<full email address>
+"""
+import re
+from sqlalchemy.orm import Session, joinedload, selectinload
+import models, queries
+from cache import LRUCache, register
+
+# An email address, or a run of word characters/dots/dashes
+MENTION_TOKEN = re.compile(r"@([A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+|[\w.+-]+)")
+
+INDEX_TTL_SECONDS = 600 # bounds staleness for changes made by other processes
+
+_indexes = register(LRUCache("mention_index", maxsize=2048, ttl=INDEX_TTL_SECONDS))
+
+def handles_for(user: models.User):
+    email = (user.email or "").casefold()
+    if user.full_name:
+        yield user.full_name.split(" ")[0].casefold()
+    elif email:
+        yield email.split("@")[0]
+    if email:
+        yield email
+
+class MentionIndex:
+    def __init__(self, users):
+        self.handles = {}
+        for user in users:
+            for handle in handles_for(user):
+                self.handles.setdefault(handle, []).append(user.id)
+
+    def resolve(self, text: str):
+        """User ids mentioned in `text`, in order of first mention, without duplicates."""
+        found = []
+        seen = set()
+        for match in MENTION_TOKEN.finditer(text or ""):
+            handle = match.group(1).rstrip(".").casefold()
+            for user_id in self.handles.get(handle, ()):
+                if user_id not in seen:
+                    seen.add(user_id)
+                    found.append(user_id)
+        return found
+
+def build_index(db: Session, project_id: int):
+    project = queries.get_project(db, project_id, [joinedload(models.Project.owner), selectinload(models.Project.members)])
+    if not project:
+        return None
+    users = ([project.owner] if project.owner else []) + list(project.members)
+    return MentionIndex(users)
+
+def get_index(db: Session, project_id: int):
+    index = _indexes.get(project_id)
+    if index is None:
+        index = build_index(db, project_id)
+        if index is not None:
+            _indexes.set(project_id, index)
+    return index
+
+def invalidate(project_id: int):
+    """Call after a project's membership changes."""
+    _indexes.invalidate(project_id)
+
+def invalidate_all():
+    """Call after a user's name or email changes (they may be in any project)."""
+    _indexes.clear()
@@ -7,14 +7,64 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from database import SQLALCHEMY_DATABASE_URL
 
+# (description, statement) pairs, applied in order. Each one is attempted on every
+# run; failures (column/index already exists) are reported and skipped.
+MIGRATIONS = [
+    ("Added api_token column to users table", "ALTER TABLE users ADD COLUMN api_token VARCHAR(500)"),
+    ("Added ix_tasks_project_updated index", "CREATE INDEX ix_tasks_project_updated ON tasks (project_id, updated_at, id)"),
+    ("Added ix_tasks_project_status index", "CREATE INDEX ix_tasks_project_status ON tasks (project_id, status, updated_at)"),
+    ("Added ix_tasks_project_assignee index", "CREATE INDEX ix_tasks_project_assignee ON tasks (project_id, assignee_id, updated_at)"),
+    ("Added ix_tasks_project_stage index", "CREATE INDEX ix_tasks_project_stage ON tasks (project_id, stage_id, updated_at)"),
+    ("Added ix_tasks_project_due index", "CREATE INDEX ix_tasks_project_due ON tasks (project_id, due_date)"),
+    ("Added ix_tasks_project_completed index", "CREATE INDEX ix_tasks_project_completed ON tasks (project_id, completed_at)"),
+    ("Added version column to projects table", "ALTER TABLE projects ADD COLUMN version INT NOT NULL DEFAULT 0"),
+    ("Added uq_project_members_project_user index", "CREATE UNIQUE INDEX uq_project_members_project_user ON project_members (project_id, user_id)"),
+    ("Added ix_project_members_user index", "CREATE INDEX ix_project_members_user ON project_members (user_id)"),
+    ("Added ix_users_created_at index", "CREATE INDEX ix_users_created_at ON users (created_at)"),
+    ("Added ix_projects_owner_id index", "CREATE INDEX ix_projects_owner_id ON projects (owner_id)"),
+    ("Added ix_projects_created_at index", "CREATE INDEX ix_projects_created_at ON projects (created_at)"),
+    ("Added project_count column to users table", "ALTER TABLE users ADD COLUMN project_count INT NOT NULL DEFAULT 0"),
+    ("Added task_count column to projects table", "ALTER TABLE projects ADD COLUMN task_count INT NOT NULL DEFAULT 0"),
+    ("Added stage_count column to projects table", "ALTER TABLE projects ADD COLUMN stage_count INT NOT NULL DEFAULT 0"),
+    # Recounts run every time, which also repairs drift from edits made outside plans.py (e.g. the admin panel)
+    ("Recounted users.project_count", "UPDATE users SET project_count = (SELECT COUNT(*) FROM projects WHERE projects.owner_id = users.id)"),
+    ("Recounted projects.task_count", "UPDATE projects SET task_count = (SELECT COUNT(*) FROM tasks WHERE tasks.project_id = projects.id)"),
+    ("Recounted projects.stage_count", "UPDATE projects SET stage_count = (SELECT COUNT(*) FROM stages WHERE stages.project_id = projects.id)"),
+    # The blobs table itself is created by create_all() on startup
+    ("Added sha256 column to attachments table", "ALTER TABLE attachments ADD COLUMN sha256 VARCHAR(64)"),
+    ("Added size column to attachments table", "ALTER TABLE attachments ADD COLUMN size BIGINT"),
+    ("Added content_type column to attachments table", "ALTER TABLE attachments ADD COLUMN content_type VARCHAR(255)"),
+    ("Added ix_attachments_sha256 index", "CREATE INDEX ix_attachments_sha256 ON attachments (sha256)"),
+    # activity_log_archives is created by create_all() on startup
+    ("Added ix_activity_logs_project_created index", "CREATE INDEX ix_activity_logs_project_created ON activity_logs (project_id, created_at, id)"),
+    ("Added ix_activity_logs_created index", "CREATE INDEX ix_activity_logs_created ON activity_logs (created_at, id)"),
+    ("Added ix_jobs_kind_created index", "CREATE INDEX ix_jobs_kind_created ON jobs (kind, created_at)"),
+    ("Added unread_notifications column to users table", "ALTER TABLE users ADD COLUMN unread_notifications INT NOT NULL DEFAULT 0"),
+    ("Added ix_notifications_user_read_created index", "CREATE INDEX ix_notifications_user_read_created ON notifications (user_id, is_read, created_at)"),
+    ("Added revision column to config_boards table", "ALTER TABLE config_boards ADD COLUMN revision INT NOT NULL DEFAULT 0"),
+    ("Recounted users.unread_notifications", "UPDATE users SET unread_notifications = (SELECT COUNT(*) FROM notifications WHERE notifications.user_id = users.id AND notifications.is_read = 0)"),
+    # A month may now span several archive segments; one of the two DROP forms fails depending on the database
+    ("Dropped uq_activity_log_archives_project_month index (MySQL)", "DROP INDEX uq_activity_log_archives_project_month ON activity_log_archives"),
+    ("Dropped uq_activity_log_archives_project_month index", "DROP INDEX uq_activity_log_archives_project_month"),
+    ("Added ix_activity_log_archives_project_month index", "CREATE INDEX ix_activity_log_archives_project_month ON activity_log_archives (project_id, month)"),
+    # tasks.updated_at is a keyset column for GET /projects/{id}/tasks: backfill NULLs (every run), then forbid them.
+    # One of the two ALTER forms fails depending on the database; SQLite can't alter columns and relies on the backfill.
+    ("Backfilled tasks.updated_at", "UPDATE tasks SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL"),
+    ("Made tasks.updated_at NOT NULL (MySQL)", "ALTER TABLE tasks MODIFY updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+    ("Made tasks.updated_at NOT NULL", "ALTER TABLE tasks ALTER COLUMN updated_at SET NOT NULL"),
+]
+
 def migrate():
     engine = create_engine(SQLALCHEMY_DATABASE_URL)
     with engine.connect() as conn:
-        try:
-            conn.execute(text("ALTER TABLE users ADD COLUMN api_token VARCHAR(500)"))
-            print("Migration successful: Added api_token column to users table.")
-        except Exception as e:
-            print(f"Migration failed (column might already exist): {e}")
+        for description, statement in MIGRATIONS:
+            try:
+                conn.execute(text(statement))
+                conn.commit()
+                print(f"Migration successful: {description}.")
+            except Exception as e:
+                conn.rollback()
+                print(f"Migration skipped ({description}; might already be applied): {e}")
 
 if __name__ == "__main__":
     migrate()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Table, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Text, Table, Boolean, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -6,20 +6,26 @@ import json
 
 class ReprMixin:
     """Mixin that makes every model __repr__ return its columns as JSON."""
-    def __repr__(self):
-        columns = {c.name: getattr(self, c.name) for c in self.__table__.columns}
+    def to_dict(self, exclude=()):
+        columns = {c.name: getattr(self, c.name) for c in self.__table__.columns if c.name not in exclude}
         # Convert non-serializable types (datetime) to string
         for k, v in columns.items():
             if isinstance(v, datetime.datetime):
                 columns[k] = v.isoformat()
-        return json.dumps(columns, indent=2, default=str)
+        return columns
+
+    def __repr__(self):
+        return json.dumps(self.to_dict(), indent=2, default=str)
 
 # Association table for Project members (Many-to-Many)
 project_members = Table(
     'project_members',
     Base.metadata,
     Column('user_id', Integer, ForeignKey('users.id')),
-    Column('project_id', Integer, ForeignKey('projects.id'))
+    Column('project_id', Integer, ForeignKey('projects.id')),
+    # Membership checks look up (project_id, user_id); accessible-project lists go by user_id
+    Index('uq_project_members_project_user', 'project_id', 'user_id', unique=True),
+    Index('ix_project_members_user', 'user_id'),
 )
 
 class User(ReprMixin, Base):
@@ -28,9 +34,11 @@ class User(ReprMixin, Base):
     email = Column(String(255), unique=True, index=True)
     hashed_password = Column(String(255))
     full_name = Column(String(255))
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
     plan = Column(String(50), default="free") # free, paid
     api_token = Column(String(500), nullable=True) # store long-lived token
+    project_count = Column(Integer, default=0, nullable=False) # owned projects, maintained by plans.py
+    unread_notifications = Column(Integer, default=0, nullable=False) # maintained by helpers.py and routers/notifications.py
     
     owned_projects = relationship("Project", back_populates="owner")
     joined_projects = relationship("Project", secondary=project_members, back_populates="members")
@@ -47,8 +55,11 @@ class Project(ReprMixin, Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), index=True)
     description = Column(Text)
-    owner_id = Column(Integer, ForeignKey("users.id"))
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    version = Column(Integer, default=0, nullable=False) # bumped by every write, see helpers.record_change
+    task_count = Column(Integer, default=0, nullable=False) # maintained by plans.py
+    stage_count = Column(Integer, default=0, nullable=False)
     
     owner = relationship("User", back_populates="owned_projects")
     members = relationship("User", secondary=project_members, back_populates="joined_projects")
@@ -57,6 +68,8 @@ class Project(ReprMixin, Base):
     activity_logs = relationship("ActivityLog", back_populates="project", cascade="all, delete-orphan")
     attachments = relationship("Attachment", back_populates="project", cascade="all, delete-orphan")
     stages = relationship("Stage", back_populates="project", cascade="all, delete-orphan")
+    changes = relationship("ProjectChange", back_populates="project", cascade="all, delete-orphan", passive_deletes=True)
+    activity_archives = relationship("ActivityLogArchive", back_populates="project", cascade="all, delete-orphan", passive_deletes=True)
 
     def __repr__(self):
         return super().__repr__()
@@ -84,7 +97,7 @@ class Task(ReprMixin, Base):
     project_id = Column(Integer, ForeignKey("projects.id"))
     assignee_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, nullable=False) # a keyset column: NULLs would break paging
     completed_at = Column(DateTime, nullable=True)
     due_date = Column(DateTime, nullable=True)
     
@@ -97,6 +110,27 @@ class Task(ReprMixin, Base):
     attachments = relationship("Attachment", back_populates="task", cascade="all, delete-orphan")
     comments = relationship("Comment", back_populates="task", cascade="all, delete-orphan")
 
+    # Back the filters and (updated_at, id) keyset order of GET /projects/{id}/tasks
+    __table_args__ = (
+        Index("ix_tasks_project_updated", "project_id", "updated_at", "id"),
+        Index("ix_tasks_project_status", "project_id", "status", "updated_at"),
+        Index("ix_tasks_project_assignee", "project_id", "assignee_id", "updated_at"),
+        Index("ix_tasks_project_stage", "project_id", "stage_id", "updated_at"),
+        Index("ix_tasks_project_due", "project_id", "due_date"),
+        Index("ix_tasks_project_completed", "project_id", "completed_at"),
+    )
+
+    def __repr__(self):
+        return super().__repr__()
+
+class Blob(ReprMixin, Base):
+    """One stored file per distinct content; attachments reference it by hash (see storage.py)."""
+    __tablename__ = "blobs"
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    refcount = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
     def __repr__(self):
         return super().__repr__()
 
@@ -105,6 +139,9 @@ class Attachment(ReprMixin, Base):
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String(255))
     file_path = Column(String(500))
+    sha256 = Column(String(64), nullable=True, index=True) # content address in storage.py; null for legacy uploads
+    size = Column(BigInteger, nullable=True)
+    content_type = Column(String(255), nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     task_id = Column(Integer, ForeignKey("tasks.id"), nullable=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
@@ -125,12 +162,33 @@ class ConfigBoard(ReprMixin, Base):
     project_id = Column(Integer, ForeignKey("projects.id"))
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    revision = Column(Integer, default=0, nullable=False) # bumped by every content change, see revisions.py
     
     project = relationship("Project", back_populates="configs")
+    revisions = relationship("ConfigRevision", back_populates="config", cascade="all, delete-orphan", passive_deletes=True)
 
     def __repr__(self):
         return super().__repr__()
 
+class ConfigRevision(ReprMixin, Base):
+    """Reverse delta from one ConfigBoard revision to the previous one (see revisions.py)."""
+    __tablename__ = "config_revisions"
+    id = Column(Integer, primary_key=True, index=True)
+    config_id = Column(Integer, ForeignKey("config_boards.id", ondelete="CASCADE"))
+    revision = Column(Integer)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    delta = Column(LargeBinary(length=2 ** 24 - 1)) # zlib-compressed JSON edits; MEDIUMBLOB on MySQL
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    config = relationship("ConfigBoard", back_populates="revisions")
+
+    __table_args__ = (
+        Index("uq_config_revisions_config_revision", "config_id", "revision", unique=True),
+    )
+
+    def __repr__(self):
+        return json.dumps(self.to_dict(exclude=("delta",)), indent=2, default=str)
+
 # New Models
 
 class Comment(ReprMixin, Base):
@@ -158,6 +216,11 @@ class Notification(ReprMixin, Base):
 
     user = relationship("User", back_populates="notifications")
 
+    __table_args__ = (
+        # Latest-N (unread first), mark-all-read and retention pruning
+        Index("ix_notifications_user_read_created", "user_id", "is_read", "created_at"),
+    )
+
     def __repr__(self):
         return super().__repr__()
 
@@ -173,5 +236,74 @@ class ActivityLog(ReprMixin, Base):
     project = relationship("Project", back_populates="activity_logs")
     user = relationship("User", back_populates="activity_logs")
 
+    __table_args__ = (
+        # Keyset pages of one project's log, newest first
+        Index("ix_activity_logs_project_created", "project_id", "created_at", "id"),
+        # Admin log listing and retention compaction
+        Index("ix_activity_logs_created", "created_at", "id"),
+    )
+
+    def __repr__(self):
+        return super().__repr__()
+
+class ActivityLogArchive(ReprMixin, Base):
+    """Activity entries past retention as zlib-compressed JSON segments, one or more per project and month (see activity.py)."""
+    __tablename__ = "activity_log_archives"
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"))
+    month = Column(String(7)) # YYYY-MM
+    entry_count = Column(Integer, default=0, nullable=False)
+    first_at = Column(DateTime)
+    last_at = Column(DateTime)
+    data = Column(LargeBinary(length=2 ** 32 - 1)) # LONGBLOB on MySQL
+
+    project = relationship("Project", back_populates="activity_archives")
+
+    __table_args__ = (
+        Index("ix_activity_log_archives_project_month", "project_id", "month"),
+    )
+
+    def __repr__(self):
+        return json.dumps(self.to_dict(exclude=("data",)), indent=2, default=str)
+
+class ProjectChange(ReprMixin, Base):
+    """One row per write to a project, read back by GET /projects/{id}/changes."""
+    __tablename__ = "project_changes"
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"))
+    version = Column(Integer) # project version after this change
+    entity = Column(String(50)) # task, stage, comment, attachment, member, config
+    entity_id = Column(Integer)
+    op = Column(String(10), default="upsert") # upsert, delete
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    project = relationship("Project", back_populates="changes")
+
+    __table_args__ = (
+        Index("ix_project_changes_project_version", "project_id", "version"),
+    )
+
+    def __repr__(self):
+        return super().__repr__()
+
+class Job(ReprMixin, Base):
+    """Durable background job, claimed and run by jobs.py workers."""
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(100))
+    payload = Column(Text) # JSON keyword arguments for the handler
+    status = Column(String(20), default="pending") # pending, running, done, failed
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    run_after = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index("ix_jobs_kind_created", "kind", "created_at"), # periodic job scheduling
+    )
+
     def __repr__(self):
         return super().__repr__()
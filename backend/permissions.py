@@ -0,0 +1,47 @@
+"""
+Project authorization.
+
+A user may access a project they own or are a member of. The set of project
+ids a user can access is read with one indexed query (owned projects UNION
+memberships) and kept on the session for the rest of the request, so every
+later check - for the project, its tasks, comments, attachments, configs - is
+a set lookup with no further SQL.
+
+The cache lives in `db.info`, i.e. it is scoped to the request's session.
+Anything that changes membership in the same request calls invalidate().
+"""
+from fastapi import HTTPException
+from sqlalchemy import select, union
+from sqlalchemy.orm import Session
+import models
+
+_CACHE_KEY = "accessible_projects"
+
+def accessible_project_ids(db: Session, user: models.User) -> frozenset:
+    cache = db.info.setdefault(_CACHE_KEY, {})
+    ids = cache.get(user.id)
+    if ids is None:
+        query = union(
+            select(models.Project.id).where(models.Project.owner_id == user.id),
+            select(models.project_members.c.project_id).where(models.project_members.c.user_id == user.id),
+        )
+        ids = frozenset(db.execute(query).scalars())
+        cache[user.id] = ids
+    return ids
+
+def can_access(db: Session, user: models.User, project_id: int) -> bool:
+    return project_id in accessible_project_ids(db, user)
+
+def require_access(db: Session, user: models.User, project_id: int):
+    if not can_access(db, user, project_id):
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+def is_member(db: Session, project_id: int, user_id: int) -> bool:
+    """Single-row lookup on the (project_id, user_id) unique index."""
+    return db.execute(
+        select(models.project_members.c.user_id)
+        .where(models.project_members.c.project_id == project_id, models.project_members.c.user_id == user_id)
+    ).first() is not None
+
+def invalidate(db: Session):
+    db.info.pop(_CACHE_KEY, None)
@@ -0,0 +1,76 @@
+"""
+Plan limits and the counters they are enforced against.
+
+Each plan maps to a PlanLimits (None = unlimited). Plan strings:
+    free            1 project, 500 tasks and 10 stages per project
+    paid            10 projects
+    custom_<N>      N projects
+
+Counts are kept in denormalized columns (User.project_count,
+Project.task_count, Project.stage_count) by the write paths below instead of
+COUNT(*) per insert. A slot is claimed with a single conditional UPDATE
+    SET count = count + n WHERE id = ? AND count + n <= limit
+so the check and the increment are one atomic statement: the row lock it takes
+is held until commit, and concurrent inserts can't both pass the check. A
+failed request rolls the increment back with everything else.
+
+`python migrate_db.py` recounts every counter from the real rows.
+"""
+from typing import NamedTuple, Optional
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+import models
+
+class PlanLimits(NamedTuple):
+    projects: Optional[int]
+    tasks_per_project: Optional[int] = None
+    stages_per_project: Optional[int] = None
+
+PLANS = {
+    "free": PlanLimits(projects=1, tasks_per_project=500, stages_per_project=10),
+    "paid": PlanLimits(projects=10),
+}
+
+def limits_for(plan: Optional[str]) -> PlanLimits:
+    plan = plan or "free"
+    if plan in PLANS:
+        return PLANS[plan]
+    if plan.startswith("custom_"):
+        try:
+            return PlanLimits(projects=int(plan.split("_", 1)[1]))
+        except ValueError:
+            pass
+    return PlanLimits(projects=1)
+
+def _increment(db: Session, model, row_id: int, column, by: int = 1, limit: Optional[int] = None) -> bool:
+    statement = update(model).where(model.id == row_id)
+    if limit is not None:
+        statement = statement.where(column + by <= limit)
+    result = db.execute(statement.values({column: column + by}).execution_options(synchronize_session=False))
+    return result.rowcount == 1
+
+def claim_project(db: Session, user: models.User):
+    limit = limits_for(user.plan).projects
+    if not _increment(db, models.User, user.id, models.User.project_count, limit=limit):
+        raise HTTPException(status_code=403, detail=f"Project limit reached for your plan ({limit} projects).")
+
+def claim_tasks(db: Session, user: models.User, project_id: int, count: int = 1):
+    limit = limits_for(user.plan).tasks_per_project
+    if not _increment(db, models.Project, project_id, models.Project.task_count, by=count, limit=limit):
+        raise HTTPException(status_code=403, detail=f"Free plan is limited to {limit} tasks per project.")
+
+def claim_stage(db: Session, user: models.User, project_id: int):
+    limit = limits_for(user.plan).stages_per_project
+    if not _increment(db, models.Project, project_id, models.Project.stage_count, limit=limit):
+        raise HTTPException(status_code=403, detail=f"Free plan is limited to {limit} stages.")
+
+def release_project(db: Session, owner_id: int):
+    _increment(db, models.User, owner_id, models.User.project_count, by=-1)
+
+def release_tasks(db: Session, project_id: int, count: int = 1):
+    if count:
+        _increment(db, models.Project, project_id, models.Project.task_count, by=-count)
+
+def release_stage(db: Session, project_id: int):
+    _increment(db, models.Project, project_id, models.Project.stage_count, by=-1)
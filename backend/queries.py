@@ -0,0 +1,131 @@
+"""
+Loader strategies shared by the routers.
+
+Each *_options() helper returns the eager-loading options needed to serialize
+one response schema from schemas.py without touching a lazy relationship, so
+an endpoint issues the same number of SELECTs no matter how many rows it
+returns. count_queries() is the matching harness for checking that.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+import base64
+import json
+from sqlalchemy import and_, event, or_, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+import models
+
+# --- Loader options, one per response shape ---
+
+def task_options():
+    """schemas.Task: assignee, attachments, comments + comment authors."""
+    return [
+        joinedload(models.Task.assignee),
+        selectinload(models.Task.attachments),
+        selectinload(models.Task.comments).joinedload(models.Comment.user),
+    ]
+
+def comment_options():
+    """schemas.Comment: the comment author."""
+    return [joinedload(models.Comment.user)]
+
+def project_options():
+    """schemas.Project: every nested collection, each task loaded once."""
+    task_path = selectinload(models.Project.tasks)
+    return [
+        joinedload(models.Project.owner),
+        selectinload(models.Project.members),
+        task_path.joinedload(models.Task.assignee),
+        task_path.selectinload(models.Task.attachments),
+        task_path.selectinload(models.Task.comments).joinedload(models.Comment.user),
+        selectinload(models.Project.attachments),
+        selectinload(models.Project.configs),
+        # Stage.tasks resolves to the Task rows already in the identity map
+        selectinload(models.Project.stages).selectinload(models.Stage.tasks),
+    ]
+
+def task_access_options():
+    """Task plus its project, for task-scoped authorization (see permissions.py)."""
+    return [joinedload(models.Task.project)]
+
+def config_access_options():
+    return [joinedload(models.ConfigBoard.project)]
+
+def stage_options():
+    """schemas.Stage: the stage's tasks, each serialized as schemas.Task."""
+    task_path = selectinload(models.Stage.tasks)
+    return [
+        task_path.joinedload(models.Task.assignee),
+        task_path.selectinload(models.Task.attachments),
+        task_path.selectinload(models.Task.comments).joinedload(models.Comment.user),
+    ]
+
+# --- Common lookups ---
+
+def get_project(db: Session, project_id: int, options=()):
+    return db.query(models.Project).options(*options).filter(models.Project.id == project_id).first()
+
+def get_task(db: Session, task_id: int, options=()):
+    return db.query(models.Task).options(*options).filter(models.Task.id == task_id).first()
+
+def get_stage(db: Session, stage_id: int, options=()):
+    return db.query(models.Stage).options(*options).filter(models.Stage.id == stage_id).first()
+
+def get_config(db: Session, config_id: int, options=()):
+    return db.query(models.ConfigBoard).options(*options).filter(models.ConfigBoard.id == config_id).first()
+
+def user_projects_query(db: Session, user: models.User, options=()):
+    """Projects the user owns or is a member of, in a single SELECT (plus eager loads)."""
+    member_of = select(models.project_members.c.project_id).where(models.project_members.c.user_id == user.id)
+    return db.query(models.Project).options(*options).filter(
+        or_(models.Project.owner_id == user.id, models.Project.id.in_(member_of))
+    )
+
+# --- Keyset pagination ---
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Opaque cursor for a (timestamp, id) keyset position."""
+    raw = json.dumps([timestamp.isoformat() if timestamp else None, row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises ValueError on anything malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return (datetime.fromisoformat(timestamp) if timestamp else None), int(row_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+def keyset_before(timestamp_column, id_column, cursor: str):
+    """Filter for rows strictly after `cursor` in (timestamp DESC, id DESC) order."""
+    timestamp, row_id = decode_cursor(cursor)
+    return or_(
+        timestamp_column < timestamp,
+        and_(timestamp_column == timestamp, id_column < row_id),
+    )
+
+# --- Query-count harness ---
+
+@contextmanager
+def count_queries(engine):
+    """
+    Count the SQL statements executed on `engine` inside the block:
+
+        with count_queries(engine) as counter:
+            client.get("/projects/1")
+        assert counter["count"] <= 10
+
+    Run the same request against small and large fixtures; an endpoint that
+    lazy-loads per row shows a count that grows with the data.
+    """
+    counter = {"count": 0, "statements": []}
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter["count"] += 1
+        counter["statements"].append(statement)
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
@@ -0,0 +1,65 @@
+"""
+In-process rate limiting for anonymous endpoints.
+
+A token bucket per client: `burst` requests at once, refilled at `per_minute`.
+Buckets live in a bounded LRU, so a flood of distinct addresses costs memory
+only up to `max_clients`. Like cache.py, limits are per process: with N
+workers a client gets up to N times the limit.
+
+Behind a reverse proxy every request comes from the proxy's address; set
+CLIENT_IP_HEADER to the header the proxy puts the real address in (e.g.
+X-Real-IP). Only do so behind a proxy that overwrites it, or clients can
+pick their own bucket.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from fastapi import HTTPException, Request
+
+CLIENT_IP_HEADER = os.getenv("CLIENT_IP_HEADER")
+
+def client_ip(request: Request) -> str:
+    if CLIENT_IP_HEADER:
+        forwarded = request.headers.get(CLIENT_IP_HEADER)
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+class RateLimiter:
+    def __init__(self, name: str, per_minute: float, burst: int, max_clients: int = 100000):
+        self.name = name
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict() # key -> (tokens, last refill)
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def retry_after(self, key) -> float:
+        """Take a token for `key`: 0 if allowed, otherwise seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                self.limited += 1
+                wait = (1 - tokens) / self.rate
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def check(self, request: Request):
+        """Raise 429 with Retry-After when the caller's address is over the limit."""
+        wait = self.retry_after(client_ip(request))
+        if wait:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
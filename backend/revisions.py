@@ -0,0 +1,130 @@
+"""
+ConfigBoard revisions and text patches.
+
+ConfigBoard.revision goes up by one on every content change. Writers send the
+revision they edited (base_revision) and the write is a conditional
+    UPDATE ... SET revision = base + 1 WHERE id = ? AND revision = base
+so a concurrent change makes it match no row and the request gets a 409
+instead of silently overwriting the other editor.
+
+A patch is a list of splices against the base text, {"pos", "delete",
+"insert"}, sorted by pos and not overlapping. Positions and lengths count
+UTF-16 code units, the same as JavaScript string indices, so the editor can
+send what it computes without converting.
+
+History keeps reverse deltas: config_revisions row N holds the zlib-compressed
+splices that turn revision N back into N-1, and the board row holds the
+latest text in full. Older revisions are rebuilt by walking back from the
+current text. Only the last CONFIG_REVISIONS_KEPT are kept.
+"""
+import json
+import os
+import sys
+import zlib
+from array import array
+from datetime import datetime
+from typing import List
+from fastapi import HTTPException
+from sqlalchemy import update, delete
+from sqlalchemy.orm import Session
+import models, schemas
+
+CONFIG_REVISIONS_KEPT = int(os.getenv("CONFIG_REVISIONS_KEPT", "200"))
+
+def _units(text: str) -> bytes:
+    return (text or "").encode("utf-16-le")
+
+def _code_units(text: str) -> array:
+    units = array("H")
+    units.frombytes(_units(text))
+    if sys.byteorder == "big":
+        units.byteswap()
+    return units
+
+def _text(units: bytes) -> str:
+    try:
+        return units.decode("utf-16-le")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Edit boundary splits a character")
+
+def apply_edits(text: str, edits: List[schemas.TextEdit]):
+    """The patched text and the reverse edits that restore `text` from it."""
+    units = _units(text)
+    length = len(units) // 2
+    pieces, reverse = [], []
+    cursor, shift = 0, 0
+    for edit in edits:
+        if edit.pos < cursor or edit.pos + edit.delete > length:
+            raise HTTPException(status_code=400, detail="Edits must be sorted, non-overlapping and inside the base text")
+        pieces.append(units[cursor * 2:edit.pos * 2])
+        inserted = _units(edit.insert)
+        pieces.append(inserted)
+        removed = _text(units[edit.pos * 2:(edit.pos + edit.delete) * 2])
+        reverse.append({"pos": edit.pos + shift, "delete": len(inserted) // 2, "insert": removed})
+        shift += len(inserted) // 2 - edit.delete
+        cursor = edit.pos + edit.delete
+    pieces.append(units[cursor * 2:])
+    return _text(b"".join(pieces)), reverse
+
+def splice(old: str, new: str):
+    """One edit that turns `old` into `new` (everything between the common prefix and suffix)."""
+    old_units, new_units = _code_units(old), _code_units(new)
+    limit = min(len(old_units), len(new_units))
+    prefix = 0
+    while prefix < limit and old_units[prefix] == new_units[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old_units[-suffix - 1] == new_units[-suffix - 1]:
+        suffix += 1
+    # Keep surrogate pairs whole
+    if prefix and 0xD800 <= old_units[prefix - 1] <= 0xDBFF:
+        prefix -= 1
+    if suffix and 0xDC00 <= old_units[len(old_units) - suffix] <= 0xDFFF:
+        suffix -= 1
+    return [{
+        "pos": prefix,
+        "delete": len(old_units) - prefix - suffix,
+        "insert": _text(_units(new)[prefix * 2:(len(new_units) - suffix) * 2]),
+    }]
+
+def write_content(db: Session, config: models.ConfigBoard, base_revision: int, content: str, reverse: list, user_id: int):
+    """Store new content as revision base_revision + 1, or 409 if the board moved on since base_revision."""
+    updated = db.execute(
+        update(models.ConfigBoard)
+        .where(models.ConfigBoard.id == config.id, models.ConfigBoard.revision == base_revision)
+        .values(content=content, revision=base_revision + 1, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        db.rollback() # a fresh transaction sees the current revision, not this one's snapshot
+        current = db.query(models.ConfigBoard.revision).filter(models.ConfigBoard.id == config.id).scalar()
+        raise HTTPException(status_code=409, detail={"message": "Config was changed by someone else", "revision": current})
+    db.add(models.ConfigRevision(
+        config_id=config.id,
+        revision=base_revision + 1,
+        user_id=user_id,
+        delta=zlib.compress(json.dumps(reverse, separators=(",", ":")).encode()),
+    ))
+    db.execute(
+        delete(models.ConfigRevision)
+        .where(models.ConfigRevision.config_id == config.id, models.ConfigRevision.revision <= base_revision + 1 - CONFIG_REVISIONS_KEPT)
+        .execution_options(synchronize_session=False)
+    )
+    db.expire(config)
+
+def content_at(db: Session, config: models.ConfigBoard, revision: int) -> str:
+    if revision == config.revision:
+        return config.content
+    rows = (
+        db.query(models.ConfigRevision)
+        .filter(models.ConfigRevision.config_id == config.id, models.ConfigRevision.revision > revision)
+        .order_by(models.ConfigRevision.revision.desc())
+        .all()
+    )
+    if revision < 0 or revision > config.revision or len(rows) != config.revision - revision:
+        raise HTTPException(status_code=404, detail="Revision not available")
+    text = config.content
+    for row in rows:
+        edits = [schemas.TextEdit(**edit) for edit in json.loads(zlib.decompress(row.delta))]
+        text, _ = apply_edits(text, edits)
+    return text
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-import models
-from dependencies import get_db, get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, or_, select
+from typing import Optional
+import models, jobs, cache, database
+from dependencies import get_read_db, get_current_user
 import os
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "")
+ADMIN_PAGE_MAX = 500
+ADMIN_STATS_TTL_SECONDS = float(os.getenv("ADMIN_STATS_TTL", "60"))
 
 def require_admin(current_user: models.User = Depends(get_current_user)):
     if not ADMIN_EMAIL or current_user.email != ADMIN_EMAIL:
@@ -17,60 +20,131 @@ def require_admin(current_user: models.User = Depends(get_current_user)):
         )
     return current_user
 
+# Headline counts change slowly and are the most expensive thing on the page
+_stats_cache = cache.register(cache.LRUCache("admin_stats", maxsize=1, ttl=ADMIN_STATS_TTL_SECONDS))
+
+def _page(skip: int, limit: int):
+    if skip < 0 or limit < 1 or limit > ADMIN_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"skip must be >= 0 and limit between 1 and {ADMIN_PAGE_MAX}")
+
+def _order_by(columns: dict, sort: str, order: str, tiebreak):
+    if sort not in columns:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(columns)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    column = columns[sort]
+    return [column.asc(), tiebreak.asc()] if order == "asc" else [column.desc(), tiebreak.desc()]
+
 @router.get("/stats")
-def get_stats(db: Session = Depends(get_db), admin=Depends(require_admin)):
-    total_users = db.query(models.User).count()
-    paid_users = db.query(models.User).filter(models.User.plan == "paid").count()
-    free_users = total_users - paid_users
-    total_projects = db.query(models.Project).count()
-    total_tasks = db.query(models.Task).count()
-    total_logs = db.query(models.ActivityLog).count()
-    return {
-        "total_users": total_users,
-        "paid_users": paid_users,
-        "free_users": free_users,
-        "total_projects": total_projects,
-        "total_tasks": total_tasks,
-        "total_logs": total_logs,
-    }
+def get_stats(db: Session = Depends(get_read_db), admin=Depends(require_admin)):
+    stats = _stats_cache.get("stats")
+    if stats is None:
+        # Every count in one round trip
+        row = db.execute(select(
+            select(func.count(models.User.id)).scalar_subquery().label("total_users"),
+            select(func.count(models.User.id)).where(models.User.plan == "paid").scalar_subquery().label("paid_users"),
+            select(func.count(models.Project.id)).scalar_subquery().label("total_projects"),
+            select(func.count(models.Task.id)).scalar_subquery().label("total_tasks"),
+            select(func.count(models.ActivityLog.id)).scalar_subquery().label("total_logs"),
+        )).one()
+        stats = {
+            "total_users": row.total_users,
+            "paid_users": row.paid_users,
+            "free_users": row.total_users - row.paid_users,
+            "total_projects": row.total_projects,
+            "total_tasks": row.total_tasks,
+            "total_logs": row.total_logs,
+        }
+        _stats_cache.set("stats", stats)
+    return stats
 
 @router.get("/users")
-def get_all_users(db: Session = Depends(get_db), admin=Depends(require_admin)):
-    users = db.query(models.User).order_by(models.User.created_at.desc()).all()
-    result = []
-    for u in users:
-        result.append({
-            "id": u.id,
-            "email": u.email,
-            "full_name": u.full_name,
-            "plan": u.plan,
-            "project_count": len(u.owned_projects),
-            "created_at": u.created_at,
-        })
-    return result
+def get_all_users(response: Response, skip: int = 0, limit: int = 100, sort: str = "created_at", order: str = "desc", q: Optional[str] = None, db: Session = Depends(get_read_db), admin=Depends(require_admin)):
+    """One page of users with their owned-project counts. The total matching count is in X-Total-Count."""
+    _page(skip, limit)
+    filters = []
+    if q:
+        pattern = f"%{q}%"
+        filters.append(or_(models.User.email.ilike(pattern), models.User.full_name.ilike(pattern)))
+
+    columns = {
+        "created_at": models.User.created_at,
+        "email": models.User.email,
+        "full_name": models.User.full_name,
+        "plan": models.User.plan,
+        "project_count": models.User.project_count, # maintained by plans.py
+    }
+    rows = db.execute(
+        select(models.User.id, models.User.email, models.User.full_name, models.User.plan, models.User.created_at, models.User.project_count)
+        .where(*filters)
+        .order_by(*_order_by(columns, sort, order, models.User.id))
+        .offset(skip)
+        .limit(limit)
+    ).all()
+    response.headers["X-Total-Count"] = str(db.execute(select(func.count(models.User.id)).where(*filters)).scalar())
+    return [dict(row._mapping) for row in rows]
 
 @router.get("/projects")
-def get_all_projects(db: Session = Depends(get_db), admin=Depends(require_admin)):
-    projects = db.query(models.Project).order_by(models.Project.created_at.desc()).all()
+def get_all_projects(response: Response, skip: int = 0, limit: int = 100, sort: str = "created_at", order: str = "desc", q: Optional[str] = None, db: Session = Depends(get_read_db), admin=Depends(require_admin)):
+    """One page of projects with owner, task and member counts. The total matching count is in X-Total-Count."""
+    _page(skip, limit)
+    filters = []
+    if q:
+        pattern = f"%{q}%"
+        filters.append(or_(models.Project.name.ilike(pattern), models.User.email.ilike(pattern)))
+
+    members = (
+        select(models.project_members.c.project_id, func.count().label("member_count"))
+        .group_by(models.project_members.c.project_id)
+        .subquery()
+    )
+    member_count = func.coalesce(members.c.member_count, 0)
+    columns = {
+        "created_at": models.Project.created_at,
+        "name": models.Project.name,
+        "owner_email": models.User.email,
+        "task_count": models.Project.task_count, # maintained by plans.py
+        "member_count": member_count,
+    }
+    rows = db.execute(
+        select(
+            models.Project.id,
+            models.Project.name,
+            models.Project.description,
+            models.User.full_name.label("owner_name"),
+            models.User.email.label("owner_email"),
+            models.Project.task_count,
+            member_count.label("member_count"),
+            models.Project.created_at,
+        )
+        .outerjoin(models.User, models.User.id == models.Project.owner_id)
+        .outerjoin(members, members.c.project_id == models.Project.id)
+        .where(*filters)
+        .order_by(*_order_by(columns, sort, order, models.Project.id))
+        .offset(skip)
+        .limit(limit)
+    ).all()
+    total = db.execute(
+        select(func.count(models.Project.id))
+        .outerjoin(models.User, models.User.id == models.Project.owner_id)
+        .where(*filters)
+    ).scalar()
+    response.headers["X-Total-Count"] = str(total)
     result = []
-    for p in projects:
-        result.append({
-            "id": p.id,
-            "name": p.name,
-            "description": p.description,
-            "owner_name": p.owner.full_name if p.owner else "Unknown",
-            "owner_email": p.owner.email if p.owner else "",
-            "task_count": len(p.tasks),
-            "member_count": len(p.members),
-            "created_at": p.created_at,
-        })
+    for row in rows:
+        project = dict(row._mapping)
+        project["owner_name"] = project["owner_name"] if project["owner_email"] is not None else "Unknown"
+        project["owner_email"] = project["owner_email"] or ""
+        result.append(project)
     return result
 
 @router.get("/logs")
-def get_all_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), admin=Depends(require_admin)):
+def get_all_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db), admin=Depends(require_admin)):
+    _page(skip, limit)
     logs = (
         db.query(models.ActivityLog)
-        .order_by(models.ActivityLog.created_at.desc())
+        .options(joinedload(models.ActivityLog.project), joinedload(models.ActivityLog.user))
+        .order_by(models.ActivityLog.created_at.desc(), models.ActivityLog.id.desc()) # ix_activity_logs_created
         .offset(skip)
         .limit(limit)
         .all()
@@ -87,3 +161,11 @@ def get_all_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db),
             "created_at": log.created_at,
         })
     return result
+
+@router.get("/jobs")
+def get_job_metrics(db: Session = Depends(get_read_db), admin=Depends(require_admin)):
+    return jobs.metrics(db)
+
+@router.get("/metrics")
+def get_cache_metrics(admin=Depends(require_admin)):
+    return {"caches": cache.all_stats(), "db_pools": database.pool_stats()}
@@ -1,29 +1,53 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
-import schemas, models, auth
-from dependencies import get_db, get_current_user
+import schemas, models, auth, database
+from dependencies import get_db, get_async_db, get_current_user, get_current_user_async, invalidate_user
 
 router = APIRouter()
 
+def hasher_busy_exception():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins in progress, please retry",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/token", response_model=schemas.Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db = Depends(get_async_db)):
+    result = await database.execute(db, select(models.User).where(models.User.email == form_data.username))
+    user = result.scalars().first()
+    valid, new_hash = False, None
+    if user:
+        try:
+            valid, new_hash = await auth.run_hasher(auth.verify_and_update, form_data.password, user.hashed_password)
+        except auth.HasherBusy:
+            raise hasher_busy_exception()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     access_token = auth.create_access_token(data={"sub": user.email})
-    return {"access_token": access_token, "token_type": "bearer", "user": user}
+    response = {"access_token": access_token, "token_type": "bearer", "user": schemas.User.model_validate(user)}
+    if new_hash:
+        # Stored with an outdated cost (BCRYPT_ROUNDS changed); upgrade it transparently
+        await database.execute(db, update(models.User).where(models.User.id == user.id).values(hashed_password=new_hash))
+        await database.commit(db)
+        invalidate_user(user.id)
+    return response
 
 @router.post("/users/", response_model=schemas.User)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = auth.get_password_hash(user.password)
+    try:
+        hashed_password = auth.run_hasher_sync(auth.get_password_hash, user.password)
+    except auth.HasherBusy:
+        raise hasher_busy_exception()
     db_user = models.User(email=user.email, full_name=user.full_name, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
@@ -31,11 +55,11 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return db_user
 
 @router.get("/users/me", response_model=schemas.User)
-async def read_users_me(current_user: models.User = Depends(get_current_user)):
+async def read_users_me(current_user: models.User = Depends(get_current_user_async)):
     return current_user
 
 @router.get("/users/api-token", response_model=schemas.Token)
-async def generate_api_token(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+def generate_api_token(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
     # Check if user already has a token
     if current_user.api_token:
         # Verify if it's still valid (optional, but good practice). For now, return existing.
@@ -52,5 +76,6 @@ async def generate_api_token(current_user: models.User = Depends(get_current_use
     # Save token to user
     current_user.api_token = access_token
     db.commit()
+    invalidate_user(current_user.id)
     
     return {"access_token": access_token, "token_type": "bearer", "user": current_user}
@@ -1,91 +1,249 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import delete
 from typing import List
+import hashlib
+import os
+import threading
 import uuid
 from datetime import datetime
-import schemas, models
+import schemas, models, queries, permissions, revisions, database
 from dependencies import get_db, get_current_user
+from helpers import record_change
+from cache import LRUCache, register
+from ratelimit import RateLimiter
 
 router = APIRouter()
 
+# --- Shared (public) boards ---
+# Rendered responses are cached per share token and dropped by every write path
+# below once it commits. A render that raced such a write isn't cached (see
+# _shared_generation). Other workers' copies expire after SHARED_CACHE_TTL.
+# Browsers and CDNs may serve a response for SHARED_MAX_AGE seconds, and a
+# stale one for SHARED_STALE_SECONDS more while they revalidate in the background.
+SHARED_CACHE_TTL = float(os.getenv("SHARED_CACHE_TTL", "60"))
+SHARED_MISSING_TTL = 30 # unknown or unshared tokens, so probing them doesn't reach the DB either
+SHARED_MAX_AGE = int(os.getenv("SHARED_MAX_AGE", "60"))
+SHARED_STALE_SECONDS = int(os.getenv("SHARED_STALE_SECONDS", "600"))
+
+_shared_cache = register(LRUCache(
+    "shared_configs",
+    maxsize=4096,
+    ttl=SHARED_CACHE_TTL,
+    max_bytes=int(os.getenv("SHARED_CACHE_BYTES", str(64 * 1024 * 1024))),
+    sizeof=lambda entry: len(entry[0]) if entry else 0,
+))
+_shared_limiter = RateLimiter(
+    "shared_configs",
+    per_minute=float(os.getenv("SHARED_RATE_PER_MINUTE", "120")),
+    burst=int(os.getenv("SHARED_RATE_BURST", "30")),
+)
+# Only one request per token renders a cache miss; the rest wait for its result
+_render_locks = [threading.Lock() for _ in range(64)]
+# Bumped by every invalidation; a render only caches its result if no invalidation
+# happened since it started, so a read from before a write can't outlive the write
+_shared_generation = 0
+_generation_lock = threading.Lock()
+
+def _invalidate_shared(*tokens):
+    global _shared_generation
+    with _generation_lock:
+        _shared_generation += 1
+        for token in tokens:
+            if token:
+                _shared_cache.invalidate(token)
+
+def _cache_shared(share_token: str, entry, generation: int, ttl: float = None):
+    with _generation_lock:
+        if generation == _shared_generation:
+            _shared_cache.set(share_token, entry, ttl=ttl)
+
+def _render_shared(share_token: str):
+    """(body, etag) for a public board, or None; filled into the cache."""
+    with _render_locks[hash(share_token) % len(_render_locks)]:
+        entry = _shared_cache.get(share_token, False)
+        if entry is not False:
+            return entry
+        generation = _shared_generation
+        db = database.SessionLocal()
+        try:
+            db_config = db.query(models.ConfigBoard).filter(
+                models.ConfigBoard.share_token == share_token,
+                models.ConfigBoard.is_public == 1
+            ).first()
+            if not db_config:
+                _cache_shared(share_token, None, generation, ttl=SHARED_MISSING_TTL)
+                return None
+            body = schemas.ConfigBoard.model_validate(db_config).model_dump_json().encode()
+        finally:
+            db.close()
+        entry = (body, f'"{hashlib.sha256(body).hexdigest()}"')
+        _cache_shared(share_token, entry, generation)
+        return entry
+
 @router.get("/projects/{project_id}/configs/", response_model=List[schemas.ConfigBoard])
 def get_project_configs(project_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    project = queries.get_project(db, project_id, [selectinload(models.Project.configs)])
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-    if project.owner_id != current_user.id and current_user not in project.members:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    permissions.require_access(db, current_user, project.id)
     return project.configs
 
 @router.post("/projects/{project_id}/configs/", response_model=schemas.ConfigBoard)
 def create_config(project_id: int, config: schemas.ConfigBoardCreate, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    project = queries.get_project(db, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-    if project.owner_id != current_user.id and current_user not in project.members:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    permissions.require_access(db, current_user, project.id)
     
     db_config = models.ConfigBoard(**config.dict(), project_id=project_id)
     db.add(db_config)
+    db.flush()
+    record_change(db, project_id, "config", db_config.id, data=db_config.to_dict(exclude=("content",)))
     db.commit()
     db.refresh(db_config)
     return db_config
 
-@router.put("/configs/{config_id}", response_model=schemas.ConfigBoard)
-def update_config(config_id: int, config_update: schemas.ConfigBoardUpdate, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_config = db.query(models.ConfigBoard).filter(models.ConfigBoard.id == config_id).first()
+def _get_accessible_config(db: Session, current_user: models.User, config_id: int):
+    db_config = queries.get_config(db, config_id, queries.config_access_options())
     if not db_config:
         raise HTTPException(status_code=404, detail="Config not found")
-    
-    project = db_config.project
-    if project.owner_id != current_user.id and current_user not in project.members:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    permissions.require_access(db, current_user, db_config.project.id)
+    return db_config
+
+def _saved(db: Session, db_config: models.ConfigBoard):
+    # Content is left out of the live event; subscribers refetch the board if they have it open
+    record_change(db, db_config.project_id, "config", db_config.id, data=db_config.to_dict(exclude=("content",)))
+    db.commit()
+    db.refresh(db_config)
+    _invalidate_shared(db_config.share_token)
+    return db_config
+
+@router.put("/configs/{config_id}", response_model=schemas.ConfigBoard)
+def update_config(config_id: int, config_update: schemas.ConfigBoardUpdate, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Replace fields. With base_revision, a content change 409s if someone else saved first; without it, last write wins."""
+    db_config = _get_accessible_config(db, current_user, config_id)
     
     update_data = config_update.dict(exclude_unset=True)
+    base_revision = update_data.pop("base_revision", None)
+    content = update_data.pop("content", None)
     for key, value in update_data.items():
         setattr(db_config, key, value)
     
     db_config.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(db_config)
-    return db_config
+    if content is not None and content != db_config.content:
+        base = db_config.revision if base_revision is None else base_revision
+        if base != db_config.revision:
+            # The board has already moved on; report it without writing anything
+            raise HTTPException(status_code=409, detail={"message": "Config was changed by someone else", "revision": db_config.revision})
+        db.flush()
+        revisions.write_content(db, db_config, base, content, revisions.splice(content, db_config.content), current_user.id)
+    return _saved(db, db_config)
+
+@router.patch("/configs/{config_id}", response_model=schemas.ConfigBoard)
+def patch_config(config_id: int, patch: schemas.ConfigBoardPatch, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Apply text edits made against base_revision (see revisions.py). Upload and
+    write volume follow the size of the edit; 409 with the current revision if
+    the board changed since base_revision.
+    """
+    db_config = _get_accessible_config(db, current_user, config_id)
+    if patch.base_revision != db_config.revision:
+        raise HTTPException(status_code=409, detail={"message": "Config was changed by someone else", "revision": db_config.revision})
+    
+    if patch.name is not None:
+        db_config.name = patch.name
+    db_config.updated_at = datetime.utcnow()
+    content, reverse = revisions.apply_edits(db_config.content, patch.edits)
+    if content != db_config.content:
+        db.flush()
+        revisions.write_content(db, db_config, patch.base_revision, content, reverse, current_user.id)
+    return _saved(db, db_config)
+
+@router.get("/configs/{config_id}/revisions", response_model=List[schemas.ConfigRevision])
+def get_config_revisions(config_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Kept revisions, newest first."""
+    _get_accessible_config(db, current_user, config_id)
+    return (
+        db.query(models.ConfigRevision.revision, models.ConfigRevision.user_id, models.ConfigRevision.created_at)
+        .filter(models.ConfigRevision.config_id == config_id)
+        .order_by(models.ConfigRevision.revision.desc())
+        .all()
+    )
+
+@router.get("/configs/{config_id}/revisions/{revision}")
+def get_config_revision(config_id: int, revision: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """The board's content as of `revision`."""
+    db_config = _get_accessible_config(db, current_user, config_id)
+    return {"revision": revision, "content": revisions.content_at(db, db_config, revision)}
 
 @router.delete("/configs/{config_id}")
 def delete_config(config_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_config = db.query(models.ConfigBoard).filter(models.ConfigBoard.id == config_id).first()
+    db_config = queries.get_config(db, config_id, queries.config_access_options())
     if not db_config:
         raise HTTPException(status_code=404, detail="Config not found")
     
     project = db_config.project
-    if project.owner_id != current_user.id and current_user not in project.members:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    permissions.require_access(db, current_user, project.id)
     
+    # Bulk delete: the ON DELETE CASCADE isn't enforced everywhere (SQLite) and the ORM cascade would load each row
+    db.execute(delete(models.ConfigRevision).where(models.ConfigRevision.config_id == config_id))
+    token = db_config.share_token
     db.delete(db_config)
+    record_change(db, project.id, "config", config_id, op="delete")
     db.commit()
+    _invalidate_shared(token)
     return {"message": "Config deleted successfully"}
 
 @router.post("/configs/{config_id}/share")
 def share_config(config_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_config = db.query(models.ConfigBoard).filter(models.ConfigBoard.id == config_id).first()
+    db_config = queries.get_config(db, config_id, queries.config_access_options())
     if not db_config:
         raise HTTPException(status_code=404, detail="Config not found")
     
     project = db_config.project
-    if project.owner_id != current_user.id and current_user not in project.members:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    permissions.require_access(db, current_user, project.id)
     
+    previous_token = db_config.share_token
     db_config.share_token = str(uuid.uuid4())[:8]
     db_config.is_public = 1
+    record_change(db, project.id, "config", config_id, data={"share_token": db_config.share_token, "is_public": 1})
     db.commit()
     db.refresh(db_config)
+    _invalidate_shared(previous_token, db_config.share_token)
     return {"share_token": db_config.share_token, "share_url": f"/shared/{db_config.share_token}"}
 
+@router.delete("/configs/{config_id}/share")
+def unshare_config(config_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    db_config = _get_accessible_config(db, current_user, config_id)
+    token = db_config.share_token
+    db_config.share_token = None
+    db_config.is_public = 0
+    record_change(db, db_config.project_id, "config", config_id, data={"share_token": None, "is_public": 0})
+    db.commit()
+    _invalidate_shared(token)
+    return {"message": "Config is no longer shared"}
+
 @router.get("/shared/{share_token}", response_model=schemas.ConfigBoard)
-def get_shared_config(share_token: str, db: Session = Depends(get_db)):
-    db_config = db.query(models.ConfigBoard).filter(
-        models.ConfigBoard.share_token == share_token,
-        models.ConfigBoard.is_public == 1
-    ).first()
-    if not db_config:
+async def get_shared_config(share_token: str, request: Request):
+    """
+    Anonymous read of a shared board. Served from memory after the first view,
+    rate limited per client address, with a strong ETag and 304s.
+    """
+    _shared_limiter.check(request)
+    entry = _shared_cache.get(share_token, False)
+    if entry is False:
+        entry = await run_in_threadpool(_render_shared, share_token)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Shared config not found")
-    return db_config
+
+    body, etag = entry
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={SHARED_MAX_AGE}, stale-while-revalidate={SHARED_STALE_SECONDS}",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,25 +1,113 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from typing import List
-import schemas, models
-from dependencies import get_db, get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, update
+from typing import List, Optional
+from datetime import datetime
+import asyncio, json
+import auth, schemas, models, database, events
+from dependencies import get_async_db, get_current_user_async, user_from_token_async, credentials_exception
+from helpers import change_unread
 
+# Async handlers: with ASYNC_DATABASE_URL set they never touch the thread pool
+# (see database.py). They only read and flag rows (and adjust the unread counter
+# in the same transaction), so no commit hooks are needed.
 router = APIRouter()
 
+NOTIFICATION_PAGE_MAX = 200
+STREAM_KEEPALIVE_SECONDS = 25 # below typical proxy idle timeouts
+
 @router.get("/notifications/", response_model=List[schemas.Notification])
-def get_notifications(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return current_user.notifications
+async def get_notifications(limit: int = 50, offset: int = 0, unread_first: bool = True, current_user: models.User = Depends(get_current_user_async), db = Depends(get_async_db)):
+    """Newest notifications, unread ones first unless unread_first=false."""
+    if limit < 1 or limit > NOTIFICATION_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {NOTIFICATION_PAGE_MAX}")
+    query = select(models.Notification).where(models.Notification.user_id == current_user.id)
+    order = [models.Notification.created_at.desc(), models.Notification.id.desc()]
+    if unread_first:
+        order.insert(0, models.Notification.is_read.asc())
+    result = await database.execute(db, query.order_by(*order).offset(offset).limit(limit))
+    return result.scalars().all()
+
+@router.get("/notifications/unread-count")
+async def get_unread_count(current_user: models.User = Depends(get_current_user_async), db = Depends(get_async_db)):
+    """The badge count, from the maintained counter rather than a COUNT(*)."""
+    # Not current_user.unread_notifications: that row may come from the token cache
+    result = await database.execute(db, select(models.User.unread_notifications).where(models.User.id == current_user.id))
+    return {"unread": result.scalar() or 0}
+
+async def _authenticate_stream(token: str):
+    # Own short-lived session: the stream outlives the request's dependencies
+    async with database.async_session() as db:
+        return (await user_from_token_async(token, db)).id
+
+@router.get("/notifications/stream-link", response_model=schemas.StreamLink)
+async def get_stream_link(current_user: models.User = Depends(get_current_user_async)):
+    """A short-lived signed URL for EventSource, which can't send the Authorization header (see auth.sign_stream)."""
+    expires, signature = auth.sign_stream("notifications", current_user.id)
+    return {
+        "url": f"/notifications/stream?user_id={current_user.id}&expires={expires}&signature={signature}",
+        "expires_at": datetime.utcfromtimestamp(expires),
+    }
+
+@router.get("/notifications/stream")
+async def stream_notifications(request: Request, user_id: Optional[int] = None, expires: int = 0, signature: str = ""):
+    """
+    Server-Sent Events stream of new notifications for the current user.
+    Browsers open the URL from /notifications/stream-link; other clients may send the bearer token.
+    """
+    authorization = request.headers.get("Authorization", "")
+    if user_id is not None:
+        if not auth.verify_stream("notifications", user_id, expires, signature):
+            raise HTTPException(status_code=403, detail="Stream link is invalid or has expired")
+    elif authorization.lower().startswith("bearer "):
+        user_id = await _authenticate_stream(authorization[7:])
+    else:
+        raise credentials_exception()
+
+    subscription = events.get_broker().subscribe(events.user_channel(user_id))
+
+    async def event_stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(subscription.queue.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {payload['type']}\ndata: {json.dumps(payload['data'])}\n\n"
+        finally:
+            events.get_broker().unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.put("/notifications/read-all")
-def mark_all_notifications_read(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db.query(models.Notification).filter(models.Notification.user_id == current_user.id, models.Notification.is_read == False).update({"is_read": True})
-    db.commit()
+async def mark_all_notifications_read(current_user: models.User = Depends(get_current_user_async), db = Depends(get_async_db)):
+    result = await database.execute(db,
+        update(models.Notification)
+        .where(models.Notification.user_id == current_user.id, models.Notification.is_read == False)
+        .values(is_read=True)
+    )
+    # By the rows actually flipped: notifications committed meanwhile stay counted
+    if result.rowcount:
+        await database.execute(db, change_unread(current_user.id, -result.rowcount))
+    await database.commit(db)
     return {"message": "All marked as read"}
 
 @router.put("/notifications/{notification_id}/read")
-def mark_notification_read(notification_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    notification = db.query(models.Notification).filter(models.Notification.id == notification_id, models.Notification.user_id == current_user.id).first()
-    if notification:
-        notification.is_read = True
-        db.commit()
+async def mark_notification_read(notification_id: int, current_user: models.User = Depends(get_current_user_async), db = Depends(get_async_db)):
+    result = await database.execute(db,
+        update(models.Notification)
+        .where(models.Notification.id == notification_id, models.Notification.user_id == current_user.id, models.Notification.is_read == False)
+        .values(is_read=True)
+    )
+    if result.rowcount:
+        await database.execute(db, change_unread(current_user.id, -result.rowcount))
+    await database.commit(db)
     return {"message": "Marked as read"}
@@ -1,51 +1,161 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
-from typing import List
-import shutil
-import schemas, models
-from dependencies import get_db, get_current_user
-from helpers import log_activity
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, joinedload, selectinload, noload
+from sqlalchemy import func, insert, delete, select, and_
+from typing import List, Optional
+import schemas, models, queries, mentions, permissions, analytics, plans, storage, activity, snapshots
+from dependencies import get_db, get_read_db, get_current_user
+from helpers import log_activity, record_change, record_changes
 
 router = APIRouter()
 
 @router.get("/projects/", response_model=List[schemas.Project])
-def read_projects(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    all_projects = list(set(current_user.owned_projects + current_user.joined_projects))
-    all_projects.sort(key=lambda x: x.created_at, reverse=True)
-    return all_projects
+def read_projects(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    return (
+        queries.user_projects_query(db, current_user, queries.project_options())
+        .order_by(models.Project.created_at.desc())
+        .all()
+    )
 
 @router.post("/projects/", response_model=schemas.Project)
 def create_project(project: schemas.ProjectCreate, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Check plan limits
-    project_count = db.query(models.Project).filter(models.Project.owner_id == current_user.id).count()
-    limit = 1 # Free plan default
-    
-    if current_user.plan == "paid":
-        limit = 10
-    elif current_user.plan and current_user.plan.startswith("custom_"):
-        try:
-             limit = int(current_user.plan.split("_")[1])
-        except:
-             limit = 1 # Fallback
-    
-    if project_count >= limit:
-         raise HTTPException(status_code=403, detail=f"Project limit reached for your plan ({limit} projects).")
-
+    plans.claim_project(db, current_user)
     db_project = models.Project(**project.dict(), owner_id=current_user.id)
     db.add(db_project)
-    db.commit()
-    db.refresh(db_project)
+    db.flush()
     log_activity(db, db_project.id, "Project initialized", user_id=current_user.id)
-    return db_project
+    db.commit()
+    return queries.get_project(db, db_project.id, queries.project_options())
 
-@router.get("/projects/{project_id}", response_model=schemas.Project)
-def read_project(project_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+PROJECT_VIEWS = ("full", "board", "summary")
+PROJECT_INCLUDES = ("comments", "attachments", "files", "configs")
+
+def _parse_includes(include: Optional[str]):
+    if not include:
+        return set()
+    includes = {part.strip() for part in include.split(",") if part.strip()}
+    unknown = includes - set(PROJECT_INCLUDES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include: {', '.join(sorted(unknown))}. Allowed: {', '.join(PROJECT_INCLUDES)}")
+    return includes
+
+def _build_project_view(db: Session, project: models.Project, view: str, includes: set):
+    status_counts = dict(
+        db.query(models.Task.status, func.count(models.Task.id))
+        .filter(models.Task.project_id == project.id)
+        .group_by(models.Task.status)
+        .all()
+    )
+    data = {
+        "id": project.id,
+        "name": project.name,
+        "description": project.description,
+        "owner_id": project.owner_id,
+        "owner": project.owner,
+        "created_at": project.created_at,
+        "version": project.version,
+        "members": project.members,
+        "stages": project.stages,
+        "task_count": sum(status_counts.values()),
+        "task_counts_by_status": {status or "": count for status, count in status_counts.items()},
+        "attachments": project.attachments if "files" in includes else None,
+        "configs": project.configs if "configs" in includes else None,
+    }
+    if view == "summary":
+        return schemas.ProjectSummary.model_validate(data, from_attributes=True)
+
+    task_query = db.query(models.Task).filter(models.Task.project_id == project.id).options(joinedload(models.Task.assignee))
+    if "comments" in includes:
+        task_query = task_query.options(selectinload(models.Task.comments).joinedload(models.Comment.user))
+    else:
+        task_query = task_query.options(noload(models.Task.comments))
+    if "attachments" in includes:
+        task_query = task_query.options(selectinload(models.Task.attachments))
+    else:
+        task_query = task_query.options(noload(models.Task.attachments))
+    tasks = task_query.order_by(models.Task.id).all()
+
+    comment_counts = {}
+    if "comments" not in includes:
+        comment_counts = dict(
+            db.query(models.Comment.task_id, func.count(models.Comment.id))
+            .join(models.Task, models.Comment.task_id == models.Task.id)
+            .filter(models.Task.project_id == project.id)
+            .group_by(models.Comment.task_id)
+            .all()
+        )
+    attachment_counts = {}
+    if "attachments" not in includes:
+        attachment_counts = dict(
+            db.query(models.Attachment.task_id, func.count(models.Attachment.id))
+            .join(models.Task, models.Attachment.task_id == models.Task.id)
+            .filter(models.Task.project_id == project.id)
+            .group_by(models.Attachment.task_id)
+            .all()
+        )
+
+    cards = []
+    for task in tasks:
+        card = schemas.TaskCard.model_validate(task)
+        cards.append(card.model_copy(update={
+            "comment_count": len(task.comments) if "comments" in includes else comment_counts.get(task.id, 0),
+            "attachment_count": len(task.attachments) if "attachments" in includes else attachment_counts.get(task.id, 0),
+            "comments": card.comments if "comments" in includes else None,
+            "attachments": card.attachments if "attachments" in includes else None,
+        }))
+    data["tasks"] = cards
+    return schemas.ProjectBoard.model_validate(data, from_attributes=True)
+
+@router.get("/projects/{project_id}", response_model=None)
+def read_project(project_id: int, request: Request, view: str = "full", include: Optional[str] = None, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Return a project in one of three shapes:
+    - full: the complete nested schemas.Project (default, what the web client uses today)
+    - board: each task once, flat, with comment/attachment counts instead of bodies
+    - summary: project header, members, stages and task counts only
+    `include` adds comments/attachments (board) or files/configs (board, summary) back in.
+    Served from a serialized snapshot while the project is unchanged (see snapshots.py).
+    """
+    if view not in PROJECT_VIEWS:
+        raise HTTPException(status_code=400, detail=f"Unknown view '{view}'. Allowed: {', '.join(PROJECT_VIEWS)}")
+    includes = _parse_includes(include)
+    key = (project_id, view, tuple(sorted(includes)))
+
+    snapshot = snapshots.get(db, key)
+    if snapshot is None:
+        snapshot = _build_snapshot(db, key, project_id, view, includes)
+    # Checked against the database every time: a membership change on another worker can't be seen in the snapshot
+    permissions.require_access(db, current_user, project_id)
+
+    headers = {"ETag": snapshot.etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and snapshot.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+def _build_snapshot(db: Session, key, project_id: int, view: str, includes: set):
+    query = db.query(models.Project).filter(models.Project.id == project_id)
+    if view == "full":
+        query = query.options(*queries.project_options())
+    else:
+        query = query.options(
+            joinedload(models.Project.owner),
+            selectinload(models.Project.members),
+            selectinload(models.Project.stages),
+        )
+        if "files" in includes:
+            query = query.options(selectinload(models.Project.attachments))
+        if "configs" in includes:
+            query = query.options(selectinload(models.Project.configs))
+    project = query.first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-    if project.owner_id != current_user.id and current_user not in project.members:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    return project
+
+    if view == "full":
+        payload = schemas.Project.model_validate(project)
+    else:
+        payload = _build_project_view(db, project, view, includes)
+    return snapshots.store(key, payload.model_dump_json().encode(), project.version)
 
 @router.delete("/projects/{project_id}")
 def delete_project(project_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -54,13 +164,15 @@ def delete_project(project_id: int, current_user: models.User = Depends(get_curr
         raise HTTPException(status_code=404, detail="Project not found")
     if project.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
+    plans.release_project(db, project.owner_id)
     db.delete(project)
+    snapshots.changed(db, project_id, float("inf")) # never cache this id again
     db.commit()
     return {"message": "Project deleted"}
 
 @router.post("/projects/{project_id}/invite")
 def invite_user(project_id: int, email: str, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    project = queries.get_project(db, project_id)
     if not project:
          raise HTTPException(status_code=404, detail="Project not found")
     if project.owner_id != current_user.id:
@@ -70,17 +182,20 @@ def invite_user(project_id: int, email: str, current_user: models.User = Depends
     if not user_to_add:
         raise HTTPException(status_code=404, detail="User not found")
         
-    if user_to_add in project.members or user_to_add.id == project.owner_id:
+    if user_to_add.id == project.owner_id or permissions.is_member(db, project_id, user_to_add.id):
         raise HTTPException(status_code=400, detail="User already in project")
         
-    project.members.append(user_to_add)
+    db.execute(insert(models.project_members).values(project_id=project_id, user_id=user_to_add.id))
+    permissions.invalidate(db)
+    record_change(db, project_id, "member", user_to_add.id, data=schemas.User.model_validate(user_to_add).model_dump(mode="json"))
     log_activity(db, project_id, f"Invited user {email}", user_id=current_user.id)
     db.commit()
+    mentions.invalidate(project_id)
     return {"message": "User invited"}
 
 @router.delete("/projects/{project_id}/members/{user_id}")
 def remove_member(project_id: int, user_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    project = queries.get_project(db, project_id)
     if not project:
          raise HTTPException(status_code=404, detail="Project not found")
     if project.owner_id != current_user.id:
@@ -90,67 +205,186 @@ def remove_member(project_id: int, user_id: int, current_user: models.User = Dep
     if not user_to_remove:
         raise HTTPException(status_code=404, detail="User not found")
         
-    if user_to_remove not in project.members:
+    if not permissions.is_member(db, project_id, user_id):
         raise HTTPException(status_code=400, detail="User not in project")
         
-    project.members.remove(user_to_remove)
+    db.execute(
+        delete(models.project_members)
+        .where(models.project_members.c.project_id == project_id, models.project_members.c.user_id == user_id)
+    )
+    permissions.invalidate(db)
+    record_change(db, project_id, "member", user_id, op="delete")
     log_activity(db, project_id, f"Removed user {user_to_remove.email}", user_id=current_user.id)
     db.commit()
+    mentions.invalidate(project_id)
     return {"message": "User removed"}
 
+ACTIVITY_PAGE_MAX = 200
+
+def _get_accessible_project(db: Session, current_user: models.User, project_id: int):
+    project = queries.get_project(db, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    permissions.require_access(db, current_user, project.id)
+    return project
+
 @router.get("/projects/{project_id}/activity", response_model=List[schemas.ActivityLog])
-def get_activity_log(project_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+def get_activity_log(project_id: int, response: Response, limit: int = 50, before: Optional[str] = None, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """
+    Newest activity first, `limit` entries at a time. Pass the X-Next-Cursor
+    response header back as `before` for the next page; it is absent on the last.
+    Entries past retention are under /activity/archive.
+    """
+    if limit < 1 or limit > ACTIVITY_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {ACTIVITY_PAGE_MAX}")
+    _get_accessible_project(db, current_user, project_id)
+    logs, next_cursor = activity.page(db, project_id, limit, before)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return logs
+
+@router.get("/projects/{project_id}/activity/archive", response_model=List[schemas.ActivityArchiveSegment])
+def get_activity_archive(project_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """Archived months, newest first."""
+    _get_accessible_project(db, current_user, project_id)
+    archive = models.ActivityLogArchive
+    return (
+        db.query(
+            archive.month,
+            func.sum(archive.entry_count).label("entry_count"),
+            func.min(archive.first_at).label("first_at"),
+            func.max(archive.last_at).label("last_at"),
+        )
+        .filter(archive.project_id == project_id)
+        .group_by(archive.month)
+        .order_by(archive.month.desc())
+        .all()
+    )
+
+@router.get("/projects/{project_id}/activity/archive/{month}", response_model=List[schemas.ActivityLog])
+def get_archived_activity(project_id: int, month: str, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """One archived month (YYYY-MM), newest first."""
+    _get_accessible_project(db, current_user, project_id)
+    entries = activity.month_entries(db, project_id, month)
+    if entries is None:
+        raise HTTPException(status_code=404, detail="No archived activity for that month")
+    user_ids = {entry["user_id"] for entry in entries if entry["user_id"]}
+    users = {user.id: user for user in db.query(models.User).filter(models.User.id.in_(user_ids))} if user_ids else {}
+    return [
+        {**entry, "project_id": project_id, "user": users.get(entry["user_id"])}
+        for entry in reversed(entries)
+    ]
+
+@router.get("/projects/{project_id}/analytics", response_model=schemas.ProjectAnalytics)
+def get_project_analytics(project_id: int, days: int = analytics.DEFAULT_DAYS, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Task breakdowns, throughput, cycle time and a burndown over the last `days` days."""
+    if days < 1 or days > analytics.MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"days must be between 1 and {analytics.MAX_DAYS}")
+    project = queries.get_project(db, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-    if project.owner_id != current_user.id and current_user not in project.members:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    return project.activity_logs
+    permissions.require_access(db, current_user, project.id)
+    return analytics.get_analytics(db, project, days)
 
-@router.post("/projects/{project_id}/attachments/", response_model=schemas.Attachment)
-def upload_project_attachment(project_id: int, file: UploadFile = File(...), current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+# Entity name in ProjectChange -> (model, response schema, key in ProjectChanges)
+CHANGE_ENTITIES = {
+    "task": (models.Task, schemas.Task, "tasks"),
+    "stage": (models.Stage, schemas.StageSummary, "stages"),
+    "comment": (models.Comment, schemas.Comment, "comments"),
+    "attachment": (models.Attachment, schemas.Attachment, "attachments"),
+    "member": (models.User, schemas.User, "members"),
+    "config": (models.ConfigBoard, schemas.ConfigBoard, "configs"),
+}
+
+CHANGE_LOADER_OPTIONS = {
+    "task": queries.task_options,
+    "comment": queries.comment_options,
+}
+
+@router.get("/projects/{project_id}/changes", response_model=schemas.ProjectChanges)
+def get_project_changes(project_id: int, since: int = 0, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Everything that changed after version `since`: current rows for upserts, ids for deletions.
+    Clients keep the returned `version` and pass it as `since` next time.
+    Change history is kept for PROJECT_CHANGES_RETENTION_DAYS; for an older `since`
+    the answer is {"resync": true} with no rows, and the client reloads the project.
+    """
+    project = queries.get_project(db, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    permissions.require_access(db, current_user, project.id)
+
+    change = models.ProjectChange
+    # Versions are contiguous, so anything before the oldest retained one was pruned
+    oldest = db.query(func.min(change.version)).filter(change.project_id == project_id).scalar()
+    if since < project.version and since < (oldest if oldest is not None else project.version + 1) - 1:
+        return {"version": project.version, "since": since, "resync": True}
+
+    # Last operation per row wins: one row per (entity, entity_id), picked in SQL
+    last = (
+        select(change.entity, change.entity_id, func.max(change.version).label("version"))
+        .where(change.project_id == project_id, change.version > since)
+        .group_by(change.entity, change.entity_id)
+        .subquery()
+    )
+    changes = db.execute(
+        select(change.entity, change.entity_id, change.op, change.version)
+        .join(last, and_(
+            change.project_id == project_id,
+            change.version == last.c.version,
+            change.entity == last.c.entity,
+            change.entity_id == last.c.entity_id,
+        ))
+    ).all()
+    latest = {(row.entity, row.entity_id): row.op for row in changes}
+
+    version = max([project.version] + [row.version for row in changes])
+    result = {"version": version, "since": since, "deleted": {}}
+    for entity, (model, schema, key) in CHANGE_ENTITIES.items():
+        upsert_ids = [entity_id for (e, entity_id), op in latest.items() if e == entity and op == "upsert"]
+        deleted_ids = [entity_id for (e, entity_id), op in latest.items() if e == entity and op == "delete"]
+        rows = []
+        if upsert_ids:
+            options = CHANGE_LOADER_OPTIONS.get(entity, list)()
+            rows = db.query(model).options(*options).filter(model.id.in_(upsert_ids)).all()
+            # Rows removed without their own tombstone (e.g. via cascade) count as deleted
+            found = {row.id for row in rows}
+            deleted_ids += [entity_id for entity_id in upsert_ids if entity_id not in found]
+        result[key] = [schema.model_validate(row) for row in rows]
+        result["deleted"][key] = sorted(deleted_ids)
+    return result
+
+def _authorize_project_upload(db: Session, current_user: models.User, project_id: int):
+    project = queries.get_project(db, project_id)
     if not project:
          raise HTTPException(status_code=404, detail="Project not found")
-    if project.owner_id != current_user.id and current_user not in project.members:
-         raise HTTPException(status_code=403, detail="Not authorized")
-    
-    file_location = f"uploads/{file.filename}"
-    with open(file_location, "wb+") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    db_attachment = models.Attachment(filename=file.filename, file_path=file_location, project_id=project_id)
-    db.add(db_attachment)
-    db.commit()
-    db.refresh(db_attachment)
-    db.add(db_attachment)
-    db.commit()
-    db.refresh(db_attachment)
-    return db_attachment
+    permissions.require_access(db, current_user, project.id)
+
+@router.post("/projects/{project_id}/attachments/", response_model=schemas.Attachment)
+async def upload_project_attachment(project_id: int, file: UploadFile = File(...), current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    await run_in_threadpool(_authorize_project_upload, db, current_user, project_id)
+    staged = await storage.stage_upload(file)
+    return await run_in_threadpool(storage.create_attachment, db, staged, file, project_id)
 
 @router.post("/projects/{project_id}/stages/", response_model=schemas.Stage)
 def create_stage(project_id: int, stage: schemas.StageCreate, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    project = queries.get_project(db, project_id)
     if not project:
          raise HTTPException(status_code=404, detail="Project not found")
-    if project.owner_id != current_user.id and current_user not in project.members:
-         raise HTTPException(status_code=403, detail="Not authorized")
+    permissions.require_access(db, current_user, project.id)
 
-    # Check limits for free plan
-    if current_user.plan == "free" or current_user.plan is None:
-        stage_count = db.query(models.Stage).filter(models.Stage.project_id == project_id).count()
-        if stage_count >= 10:
-             raise HTTPException(status_code=403, detail="Free plan is limited to 10 stages.")
-    
+    plans.claim_stage(db, current_user, project_id)
     db_stage = models.Stage(**stage.dict(), project_id=project_id)
     db.add(db_stage)
+    db.flush()
+    record_change(db, project_id, "stage", db_stage.id, data=db_stage.to_dict())
     db.commit()
     db.refresh(db_stage)
     return db_stage
 
 @router.delete("/stages/{stage_id}")
 def delete_stage(stage_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    stage = db.query(models.Stage).filter(models.Stage.id == stage_id).first()
+    stage = queries.get_stage(db, stage_id, [joinedload(models.Stage.project)])
     if not stage:
         raise HTTPException(status_code=404, detail="Stage not found")
     
@@ -158,6 +392,10 @@ def delete_stage(stage_id: int, current_user: models.User = Depends(get_current_
     if project.owner_id != current_user.id:
          raise HTTPException(status_code=403, detail="Not authorized")
     
+    # Stage.tasks cascades, so the stage's tasks go with it
+    record_changes(db, project.id, [("task", task.id, "delete", None) for task in stage.tasks] + [("stage", stage_id, "delete", None)])
+    plans.release_tasks(db, project.id, len(stage.tasks))
+    plans.release_stage(db, project.id)
     db.delete(stage)
     db.commit()
     return {"message": "Stage deleted"}
@@ -0,0 +1,126 @@
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import datetime
+import asyncio
+import auth, database, events, models, queries, permissions, schemas
+from dependencies import get_current_user, get_db
+
+router = APIRouter()
+
+PROJECT_QUEUE_SIZE = 256 # events buffered per client before it counts as a slow consumer
+SEND_TIMEOUT_SECONDS = 10
+PING_INTERVAL_SECONDS = 25
+ACCESS_CHECK_SECONDS = 60 # how often an open stream re-checks that its user may still read the project
+
+def _stream_scope(project_id: int) -> str:
+    return f"project:{project_id}"
+
+def _authorize_project_stream(user_id: int, project_id: int):
+    """Returns the project's current version, or raises HTTPException."""
+    db = database.SessionLocal()
+    try:
+        user = db.get(models.User, user_id)
+        project = queries.get_project(db, project_id)
+        if not user or not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        permissions.require_access(db, user, project.id)
+        return project.version
+    finally:
+        db.close()
+
+def _can_still_access(user_id: int, project_id: int) -> bool:
+    db = database.SessionLocal()
+    try:
+        user = db.get(models.User, user_id)
+        return user is not None and permissions.can_access(db, user, project_id)
+    finally:
+        db.close()
+
+def _revokes(payload: dict, user_id: int) -> bool:
+    """Whether `payload` is the removal of `user_id` from the project."""
+    return payload.get("entity") == "member" and payload.get("op") == "delete" and payload.get("entity_id") == user_id
+
+@router.get("/projects/{project_id}/events-link", response_model=schemas.StreamLink)
+def get_project_events_link(project_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """A short-lived signed URL for the project's WebSocket, which browsers can't send headers to (see auth.sign_stream)."""
+    if not queries.get_project(db, project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    permissions.require_access(db, current_user, project_id)
+    expires, signature = auth.sign_stream(_stream_scope(project_id), current_user.id)
+    return {
+        "url": f"/projects/{project_id}/events?user_id={current_user.id}&expires={expires}&signature={signature}",
+        "expires_at": datetime.utcfromtimestamp(expires),
+    }
+
+@router.websocket("/projects/{project_id}/events")
+async def project_events(websocket: WebSocket, project_id: int, user_id: int = 0, expires: int = 0, signature: str = "", last_event_id: Optional[int] = None):
+    """
+    Live change feed for one project, opened with the URL from /projects/{id}/events-link
+    (fetch a fresh one for every reconnect). Each message is a compact diff:
+        {"type": "change", "id": <project version>, "entity", "entity_id", "op", "data"}
+    Reconnect with ?last_event_id=<last id seen> to receive what was missed. If those
+    events are no longer buffered the server sends {"type": "resync"} and the client
+    should catch up through GET /projects/{id}/changes?since=<last id seen>.
+    Clients that fall too far behind are disconnected (close code 1013) and should resume the same way.
+    A user who loses access (removed from the project, or the project deleted) is
+    disconnected with close code 1008: at once on removal, otherwise within ACCESS_CHECK_SECONDS.
+    """
+    if not auth.verify_stream(_stream_scope(project_id), user_id, expires, signature):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    try:
+        version = await run_in_threadpool(_authorize_project_stream, user_id, project_id)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    broker = events.get_broker()
+    channel = events.project_channel(project_id)
+    # Subscribe before replaying so nothing published in between is lost
+    subscription = broker.subscribe(channel, maxsize=PROJECT_QUEUE_SIZE, on_overflow=events.DISCONNECT)
+    try:
+        replayed = set()
+        if last_event_id is not None and last_event_id < version:
+            missed, complete = broker.replay(channel, last_event_id)
+            if complete:
+                for payload in missed:
+                    await websocket.send_json(payload)
+                    replayed.add(payload["id"])
+            else:
+                await websocket.send_json({"type": "resync", "since": last_event_id, "version": version})
+        await websocket.send_json({"type": "ready", "version": version})
+
+        loop = asyncio.get_running_loop()
+        next_access_check = loop.time() + ACCESS_CHECK_SECONDS
+        while True:
+            if loop.time() >= next_access_check:
+                if not await run_in_threadpool(_can_still_access, user_id, project_id):
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Access revoked")
+                    break
+                next_access_check = loop.time() + ACCESS_CHECK_SECONDS
+            try:
+                payload = await asyncio.wait_for(subscription.queue.get(), timeout=min(PING_INTERVAL_SECONDS, max(next_access_check - loop.time(), 0)))
+            except asyncio.TimeoutError:
+                if loop.time() >= next_access_check:
+                    continue
+                payload = {"type": "ping"}
+            if payload is None:
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Slow consumer")
+                break
+            if payload.get("id") in replayed:
+                continue
+            if _revokes(payload, user_id):
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Access revoked")
+                break
+            try:
+                await asyncio.wait_for(websocket.send_json(payload), timeout=SEND_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Slow consumer")
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broker.unsubscribe(subscription)
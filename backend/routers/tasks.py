@@ -1,50 +1,127 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
-from datetime import datetime
-import shutil, os
-import schemas, models
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import and_, or_, update
+from typing import Optional
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import quote
+import os
+import schemas, models, queries, permissions, plans, storage, auth
 from dependencies import get_db, get_current_user
-from helpers import log_activity, create_notification, process_mentions
+from helpers import log_activity, record_change, record_changes
+import jobs
 
 router = APIRouter()
 
 @router.post("/projects/{project_id}/tasks/", response_model=schemas.Task)
 def create_task(project_id: int, task: schemas.TaskCreate, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    project = queries.get_project(db, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-    if project.owner_id != current_user.id and current_user not in project.members:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    permissions.require_access(db, current_user, project.id)
 
-    # Check task limits for free plan
-    if current_user.plan == "free" or current_user.plan is None:
-        # Count tasks in the project
-        task_count = db.query(models.Task).filter(models.Task.project_id == project_id).count()
-        if task_count >= 500:
-            raise HTTPException(status_code=403, detail="Free plan is limited to 500 tasks per project.")
+    plans.claim_tasks(db, current_user, project_id)
 
     db_task = models.Task(**task.dict(), project_id=project_id)
     db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
+    db.flush()
+    record_change(db, project_id, "task", db_task.id, data=db_task.to_dict())
     
     log_activity(db, project_id, f"Created task: {task.title}", user_id=current_user.id)
     
     if task.assignee_id and task.assignee_id != current_user.id:
-        create_notification(db, task.assignee_id, f"You have been assigned to task '{task.title}' in project '{project.name}'")
+        jobs.enqueue(db, "notify", user_id=task.assignee_id, content=f"You have been assigned to task '{task.title}' in project '{project.name}'")
+
+    db.commit()
+    return queries.get_task(db, db_task.id, queries.task_options())
+
+# Matches the board's isArchived(): DONE for more than a week
+ARCHIVE_AFTER = timedelta(days=7)
+TASK_PAGE_MAX = 200
 
-    return db_task
+def _csv(value: Optional[str]):
+    return [part.strip() for part in value.split(",") if part.strip()] if value else []
+
+@router.get("/projects/{project_id}/tasks", response_model=schemas.TaskPage)
+def list_tasks(
+    project_id: int,
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    assignee_id: Optional[int] = None,
+    stage_id: Optional[int] = None,
+    due_after: Optional[datetime] = None,
+    due_before: Optional[datetime] = None,
+    completed: Optional[bool] = None,
+    archived: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    One page of a project's tasks, most recently updated first.
+    `status` and `priority` accept comma-separated lists; pass `next_cursor` back as `cursor` for the next page.
+    """
+    project = queries.get_project(db, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    permissions.require_access(db, current_user, project.id)
+    if limit < 1 or limit > TASK_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {TASK_PAGE_MAX}")
+
+    query = db.query(models.Task).filter(models.Task.project_id == project_id)
+    if status:
+        query = query.filter(models.Task.status.in_(_csv(status)))
+    if priority:
+        query = query.filter(models.Task.priority.in_(_csv(priority)))
+    if assignee_id is not None:
+        query = query.filter(models.Task.assignee_id == assignee_id)
+    if stage_id is not None:
+        query = query.filter(models.Task.stage_id == stage_id)
+    if due_after is not None:
+        query = query.filter(models.Task.due_date >= due_after)
+    if due_before is not None:
+        query = query.filter(models.Task.due_date < due_before)
+    if completed is not None:
+        query = query.filter(models.Task.status == "DONE" if completed else models.Task.status != "DONE")
+    if archived is not None:
+        is_archived = and_(models.Task.status == "DONE", models.Task.completed_at < datetime.utcnow() - ARCHIVE_AFTER)
+        if archived:
+            query = query.filter(is_archived)
+        else:
+            query = query.filter(or_(models.Task.status != "DONE", models.Task.completed_at == None, models.Task.completed_at >= datetime.utcnow() - ARCHIVE_AFTER))
+    if cursor:
+        try:
+            query = query.filter(queries.keyset_before(models.Task.updated_at, models.Task.id, cursor))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Fetch one extra row to know whether another page exists
+    tasks = (
+        query.options(*queries.task_options())
+        .order_by(models.Task.updated_at.desc(), models.Task.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = queries.encode_cursor(tasks[-1].updated_at, tasks[-1].id)
+    return {"items": tasks, "next_cursor": next_cursor}
 
 @router.patch("/tasks/{task_id}", response_model=schemas.Task)
 def update_task(task_id: int, status: str = None, priority: str = None, assignee_id: int = None, due_date: datetime = None, title: str = None, description: str = None, stage_id: int = None, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
+    task = queries.get_task(db, task_id, queries.task_access_options())
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
     project = task.project
-    if project.owner_id != current_user.id and current_user not in project.members:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    permissions.require_access(db, current_user, project.id)
     
+    before = task.to_dict()
+
     if title is not None: task.title = title
     if description is not None: task.description = description
 
@@ -64,7 +141,7 @@ def update_task(task_id: int, status: str = None, priority: str = None, assignee
     if assignee_id is not None:
         if assignee_id != task.assignee_id:
              task.assignee_id = assignee_id
-             create_notification(db, assignee_id, f"You have been assigned to task '{task.title}'")
+             jobs.enqueue(db, "notify", user_id=assignee_id, content=f"You have been assigned to task '{task.title}'")
              log_activity(db, project.id, f"Assigned task '{task.title}' to user {assignee_id}", user_id=current_user.id)
     
     if due_date is not None:
@@ -73,47 +150,211 @@ def update_task(task_id: int, status: str = None, priority: str = None, assignee
     if stage_id is not None:
         task.stage_id = stage_id
 
+    # Only the fields that actually changed go out to live subscribers
+    after = task.to_dict()
+    changes = {key: value for key, value in after.items() if before.get(key) != value}
+    if changes: # a no-op PATCH keeps the version, the cached snapshots and the feed as they are
+        record_change(db, project.id, "task", task_id, data=changes)
     db.commit()
-    db.refresh(task)
-    return task
+    return queries.get_task(db, task_id, queries.task_options())
 
 @router.delete("/tasks/{task_id}")
 def delete_task(task_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
+    task = queries.get_task(db, task_id, queries.task_access_options())
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
     project = task.project
-    if project.owner_id != current_user.id and current_user not in project.members:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    permissions.require_access(db, current_user, project.id)
         
     db.delete(task)
+    plans.release_tasks(db, project.id)
+    record_change(db, project.id, "task", task_id, op="delete")
     db.commit()
     return {"message": "Task deleted"}
 
-@router.post("/tasks/{task_id}/attachments/", response_model=schemas.Attachment)
-def upload_attachment(task_id: int, file: UploadFile = File(...), current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
+TASK_BATCH_MAX = 500
+
+def _batch_errors(errors):
+    return HTTPException(status_code=400, detail={"message": "Batch rejected; nothing was applied", "errors": errors})
+
+@router.post("/projects/{project_id}/tasks:batch", response_model=schemas.TaskBatchResponse)
+def batch_tasks(project_id: int, batch: schemas.TaskBatch, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Apply many task creates/updates/deletes in one transaction. All operations are
+    validated first; if any is invalid nothing is applied and the 400 lists the
+    failing operation indexes. Produces one activity entry and at most one
+    assignment notification per user.
+    """
+    project = queries.get_project(db, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    permissions.require_access(db, current_user, project.id)
+    operations = batch.operations
+    if not operations or len(operations) > TASK_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"A batch must have between 1 and {TASK_BATCH_MAX} operations")
+
+    # --- Validate everything before writing anything ---
+    target_ids = [op.id for op in operations if op.op != "create"]
+    existing = {}
+    if target_ids:
+        existing = {
+            task.id: task
+            for task in db.query(models.Task)
+            # Deleting cascades to these; load them up front rather than per task
+            .options(selectinload(models.Task.comments), selectinload(models.Task.attachments))
+            .filter(models.Task.project_id == project_id, models.Task.id.in_(target_ids))
+        }
+    field_sets = [op.fields.model_dump(exclude_unset=True) if op.fields else {} for op in operations]
+    stage_ids = {fields["stage_id"] for fields in field_sets if fields.get("stage_id") is not None}
+    assignee_ids = {fields["assignee_id"] for fields in field_sets if fields.get("assignee_id") is not None}
+    valid_stages = set()
+    if stage_ids:
+        valid_stages = {row.id for row in db.query(models.Stage.id).filter(models.Stage.project_id == project_id, models.Stage.id.in_(stage_ids))}
+    valid_assignees = set()
+    if assignee_ids:
+        valid_assignees = {
+            user_id for (user_id,) in db.query(models.project_members.c.user_id)
+            .filter(models.project_members.c.project_id == project_id, models.project_members.c.user_id.in_(assignee_ids))
+        }
+        if project.owner_id in assignee_ids:
+            valid_assignees.add(project.owner_id)
+
+    errors = []
+    seen = set()
+    for index, (op, fields) in enumerate(zip(operations, field_sets)):
+        if op.op == "create":
+            if not fields.get("title"):
+                errors.append({"index": index, "detail": "create requires fields.title"})
+        elif op.id is None:
+            errors.append({"index": index, "detail": f"{op.op} requires id"})
+        elif op.id not in existing:
+            errors.append({"index": index, "detail": f"Task {op.id} not found in this project"})
+        elif op.id in seen:
+            errors.append({"index": index, "detail": f"Task {op.id} appears in more than one operation"})
+        if op.op != "create" and op.id is not None:
+            seen.add(op.id)
+        if op.op == "update" and "title" in fields and not fields["title"]:
+            errors.append({"index": index, "detail": "title cannot be empty"})
+        if fields.get("stage_id") is not None and fields["stage_id"] not in valid_stages:
+            errors.append({"index": index, "detail": f"Stage {fields['stage_id']} not found in this project"})
+        if fields.get("assignee_id") is not None and fields["assignee_id"] not in valid_assignees:
+            errors.append({"index": index, "detail": f"User {fields['assignee_id']} is not a member of this project"})
+    if errors:
+        raise _batch_errors(errors)
+
+    creates = sum(1 for op in operations if op.op == "create")
+    deletes = sum(1 for op in operations if op.op == "delete")
+    if creates > deletes:
+        plans.claim_tasks(db, current_user, project_id, creates - deletes)
+    else:
+        plans.release_tasks(db, project_id, deletes - creates)
+
+    # --- Apply ---
+    now = datetime.utcnow()
+    results = [None] * len(operations)
+    changes = []
+    assigned = {} # user id -> titles of tasks newly assigned to them
+    new_tasks = []
+    updates = []
+    for index, (op, fields) in enumerate(zip(operations, field_sets)):
+        if op.op == "create":
+            task = models.Task(**{"status": "TODO", "priority": "MEDIUM", **fields}, project_id=project_id)
+            if task.status == "DONE":
+                task.completed_at = now
+            new_tasks.append((index, task))
+            if task.assignee_id and task.assignee_id != current_user.id:
+                assigned.setdefault(task.assignee_id, []).append(task.title)
+        elif op.op == "update":
+            task = existing[op.id]
+            values = {key: value for key, value in fields.items() if getattr(task, key) != value}
+            if "status" in values:
+                if values["status"] == "DONE":
+                    values["completed_at"] = now
+                elif task.status == "DONE":
+                    values["completed_at"] = None
+            if values.get("assignee_id") and values["assignee_id"] != current_user.id:
+                assigned.setdefault(values["assignee_id"], []).append(values.get("title", task.title))
+            if values:
+                updates.append({"id": task.id, **values, "updated_at": now})
+                # Like update_task, only the changed fields go out to live subscribers
+                changes.append(("task", task.id, "upsert", {
+                    key: value.isoformat() if isinstance(value, datetime) else value
+                    for key, value in {**values, "updated_at": now}.items()
+                }))
+                results[index] = {"index": index, "op": "update", "id": task.id, "status": "updated"}
+            else:
+                results[index] = {"index": index, "op": "update", "id": task.id, "status": "unchanged"}
+        else:
+            db.delete(existing[op.id])
+            changes.append(("task", op.id, "delete", None))
+            results[index] = {"index": index, "op": "delete", "id": op.id, "status": "deleted"}
+
+    if updates:
+        # ORM bulk UPDATE by primary key: one executemany per distinct set of columns
+        db.execute(update(models.Task), updates)
+    if new_tasks:
+        db.add_all([task for _, task in new_tasks])
+    db.flush()
+    for index, task in new_tasks:
+        changes.append(("task", task.id, "upsert", task.to_dict()))
+        results[index] = {"index": index, "op": "create", "id": task.id, "status": "created"}
+
+    version = record_changes(db, project_id, changes) or project.version
+    summary = ", ".join(
+        f"{count} {label}" for count, label in (
+            (creates, "created"),
+            (sum(1 for result in results if result["status"] == "updated"), "updated"),
+            (deletes, "deleted"),
+        ) if count
+    )
+    if summary:
+        log_activity(db, project_id, f"Batch edited tasks: {summary}", user_id=current_user.id)
+    for user_id, titles in assigned.items():
+        content = (
+            f"You have been assigned to task '{titles[0]}' in project '{project.name}'" if len(titles) == 1
+            else f"You have been assigned to {len(titles)} tasks in project '{project.name}'"
+        )
+        jobs.enqueue(db, "notify", user_id=user_id, content=content)
+    db.commit()
+
+    touched = [result["id"] for result in results if result["status"] in ("created", "updated")]
+    tasks = {}
+    if touched:
+        tasks = {
+            task.id: task
+            for task in db.query(models.Task).options(*queries.task_options()).populate_existing().filter(models.Task.id.in_(touched))
+        }
+    for result in results:
+        result["task"] = tasks.get(result["id"])
+    return {"version": version, "results": results}
+
+def _authorize_task_upload(db: Session, current_user: models.User, task_id: int):
+    task = queries.get_task(db, task_id, queries.task_access_options())
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-        
-    project = task.project
-    if project.owner_id != current_user.id and current_user not in project.members:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    
-    file_location = f"uploads/{file.filename}"
-    with open(file_location, "wb+") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    db_attachment = models.Attachment(filename=file.filename, file_path=file_location, task_id=task_id)
-    db.add(db_attachment)
-    db.commit()
-    db.refresh(db_attachment)
-    return db_attachment
+    permissions.require_access(db, current_user, task.project.id)
+    return task.project.id
 
-@router.delete("/attachments/{attachment_id}")
-def delete_attachment(attachment_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    attachment = db.query(models.Attachment).filter(models.Attachment.id == attachment_id).first()
+@router.post("/tasks/{task_id}/attachments/", response_model=schemas.Attachment)
+async def upload_attachment(task_id: int, file: UploadFile = File(...), current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    # Async so the upload streams into storage without holding a worker thread;
+    # the short DB steps run in the thread pool
+    project_id = await run_in_threadpool(_authorize_task_upload, db, current_user, task_id)
+    staged = await storage.stage_upload(file)
+    return await run_in_threadpool(storage.create_attachment, db, staged, file, project_id, task_id=task_id)
+
+def _get_attachment(db: Session, current_user: models.User, attachment_id: int):
+    """Attachment and its project id, checking the user can access that project."""
+    attachment = (
+        db.query(models.Attachment)
+        .options(
+            joinedload(models.Attachment.task).joinedload(models.Task.project),
+            joinedload(models.Attachment.project),
+        )
+        .filter(models.Attachment.id == attachment_id)
+        .first()
+    )
     if not attachment:
         raise HTTPException(status_code=404, detail="Attachment not found")
     
@@ -126,43 +367,137 @@ def delete_attachment(attachment_id: int, current_user: models.User = Depends(ge
     if not project:
          raise HTTPException(status_code=404, detail="Project not found associated with attachment")
 
-    if project.owner_id != current_user.id and current_user not in project.members:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    
-    if os.path.exists(attachment.file_path):
-        os.remove(attachment.file_path)
-    
+    permissions.require_access(db, current_user, project.id)
+    return attachment, project.id
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Takes precedence over If-Modified-Since; weak comparison as GET allows
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+INLINE_CONTENT_TYPES = ("image/", "video/", "audio/", "application/pdf", "text/plain")
+
+def _disposition(content_type: Optional[str]) -> str:
+    # Uploaded HTML/SVG opened inline would run script on the API's origin
+    if content_type and content_type != "image/svg+xml" and content_type.startswith(INLINE_CONTENT_TYPES):
+        return "inline"
+    return "attachment"
+
+@router.get("/attachments/{attachment_id}/link", response_model=schemas.AttachmentLink)
+def get_attachment_link(attachment_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """A short-lived signed download URL for a project member to open (see auth.sign_download)."""
+    _get_attachment(db, current_user, attachment_id)
+    expires, signature = auth.sign_download(attachment_id)
+    return {
+        "url": f"/attachments/{attachment_id}/download?expires={expires}&signature={signature}",
+        "expires_at": datetime.utcfromtimestamp(expires),
+    }
+
+@router.get("/attachments/{attachment_id}/download")
+def download_attachment(attachment_id: int, request: Request, expires: int = 0, signature: str = "", db: Session = Depends(get_db)):
+    """
+    Serve an attachment through a signed URL from /attachments/{id}/link, with
+    Range and conditional GET. Content-addressed files never change, so their
+    ETag is the SHA-256 and they may be cached for a year; files from before
+    that get a stat-based ETag and are revalidated every time.
+    """
+    if not auth.verify_download(attachment_id, expires, signature):
+        raise HTTPException(status_code=403, detail="Download link is invalid or has expired")
+    attachment = db.query(models.Attachment).filter(models.Attachment.id == attachment_id).first()
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    backend = storage.get_storage()
+
+    if attachment.sha256:
+        path = backend.local_path(attachment.sha256)
+        etag = f'"{attachment.sha256}"'
+        last_modified = (attachment.created_at or datetime.utcnow()).replace(tzinfo=timezone.utc)
+        cache_control = "private, max-age=31536000, immutable"
+        if path is None and not backend.exists(attachment.sha256):
+            raise HTTPException(status_code=404, detail="Attachment file missing")
+    else:
+        path = attachment.file_path
+        try:
+            stat_result = os.stat(path)
+        except (FileNotFoundError, TypeError):
+            raise HTTPException(status_code=404, detail="Attachment file missing")
+        etag = f'W/"{int(stat_result.st_mtime)}-{stat_result.st_size}"'
+        last_modified = datetime.fromtimestamp(stat_result.st_mtime, timezone.utc)
+        cache_control = "private, no-cache"
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified.replace(microsecond=0), usegmt=True),
+        "Cache-Control": cache_control,
+        "X-Content-Type-Options": "nosniff",
+        "Referrer-Policy": "no-referrer", # the signed URL must not leak from documents opened inline
+    }
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    media_type = attachment.content_type or "application/octet-stream"
+    disposition = _disposition(media_type)
+    if path is None:
+        # Backends without files (MemoryStorage) serve whole bodies
+        headers["Accept-Ranges"] = "none"
+        headers["Content-Disposition"] = f"{disposition}; filename*=utf-8''{quote(attachment.filename or 'file')}"
+        return Response(content=backend.read(attachment.sha256), media_type=media_type, headers=headers)
+    # FileResponse answers Range/If-Range itself and hands the whole file to the
+    # server as a path (zero-copy sendfile) when the server supports it
+    return FileResponse(path, media_type=media_type, headers=headers, filename=attachment.filename or "file", content_disposition_type=disposition)
+
+@router.delete("/attachments/{attachment_id}")
+def delete_attachment(attachment_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    attachment, project_id = _get_attachment(db, current_user, attachment_id)
+    # Its blob (or legacy file) is released by storage's flush hook
     db.delete(attachment)
+    record_change(db, project_id, "attachment", attachment_id, op="delete")
     db.commit()
     return {"message": "Attachment deleted successfully"}
 
 @router.post("/tasks/{task_id}/comments/", response_model=schemas.Comment)
 def create_comment(task_id: int, comment: schemas.CommentCreate, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
+    task = queries.get_task(db, task_id, queries.task_access_options())
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
     project = task.project
-    if project.owner_id != current_user.id and current_user not in project.members:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    permissions.require_access(db, current_user, project.id)
     
     db_comment = models.Comment(**comment.dict(), task_id=task_id, user_id=current_user.id)
     db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
-    db_comment.user = current_user
+    db.flush()
+    record_change(db, project.id, "comment", db_comment.id, data={**db_comment.to_dict(), "user": schemas.User.model_validate(current_user).model_dump(mode="json")})
 
     log_activity(db, project.id, f"Commented on task '{task.title}'", user_id=current_user.id)
-    process_mentions(db, comment.content, project.id, task.title, current_user)
-    
-    if task.assignee_id and task.assignee_id != current_user.id:
-        create_notification(db, task.assignee_id, f"New comment on task '{task.title}' by {current_user.full_name or current_user.email}")
+    # Mentions and the assignee notification fan out in the background
+    jobs.enqueue(db, "comment_created", comment_id=db_comment.id)
 
+    db.commit()
+    db.refresh(db_comment)
+    db_comment.user = current_user
     return db_comment
 
 @router.delete("/comments/{comment_id}")
 def delete_comment(comment_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    comment = db.query(models.Comment).filter(models.Comment.id == comment_id).first()
+    comment = (
+        db.query(models.Comment)
+        .options(joinedload(models.Comment.task).joinedload(models.Task.project))
+        .filter(models.Comment.id == comment_id)
+        .first()
+    )
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
     
@@ -173,5 +508,6 @@ def delete_comment(comment_id: int, current_user: models.User = Depends(get_curr
              raise HTTPException(status_code=403, detail="Not authorized")
 
     db.delete(comment)
+    record_change(db, comment.task.project_id, "comment", comment_id, op="delete")
     db.commit()
     return {"message": "Comment deleted"}
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -44,12 +44,23 @@ class AttachmentBase(BaseModel):
 
 class Attachment(AttachmentBase):
     id: int
+    sha256: Optional[str] = None
+    size: Optional[int] = None
+    content_type: Optional[str] = None
     created_at: datetime
     task_id: Optional[int]
     project_id: Optional[int]
     class Config:
         from_attributes = True
 
+class AttachmentLink(BaseModel):
+    url: str # relative to the API root
+    expires_at: datetime
+
+class StreamLink(BaseModel):
+    url: str # relative to the API root; open it before expires_at
+    expires_at: datetime
+
 # Tasks
 class TaskBase(BaseModel):
     title: str
@@ -75,6 +86,39 @@ class Task(TaskBase):
     class Config:
         from_attributes = True
 
+class TaskUpdate(BaseModel):
+    # Only the fields that are present are changed; null clears a field
+    title: Optional[str] = None
+    description: Optional[str] = None
+    status: Optional[str] = None
+    priority: Optional[str] = None
+    due_date: Optional[datetime] = None
+    assignee_id: Optional[int] = None
+    stage_id: Optional[int] = None
+
+class TaskBatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None # update/delete
+    fields: Optional[TaskUpdate] = None # create/update; create requires a title
+
+class TaskBatch(BaseModel):
+    operations: List[TaskBatchOperation]
+
+class TaskBatchResult(BaseModel):
+    index: int
+    op: str
+    id: int
+    status: str # created, updated, unchanged, deleted
+    task: Optional[Task] = None
+
+class TaskBatchResponse(BaseModel):
+    version: int
+    results: List[TaskBatchResult]
+
+class TaskPage(BaseModel):
+    items: List[Task] = []
+    next_cursor: Optional[str] = None # pass back as ?cursor= for the next page
+
 # Config Board
 class ConfigBoardBase(BaseModel):
     name: str
@@ -88,6 +132,25 @@ class ConfigBoardUpdate(BaseModel):
     name: Optional[str] = None
     content: Optional[str] = None
     is_public: Optional[int] = None
+    base_revision: Optional[int] = None # when set, 409 if the board has moved on
+
+class TextEdit(BaseModel):
+    # Splice against the base text; positions count UTF-16 code units like JS strings
+    pos: int = Field(ge=0)
+    delete: int = Field(default=0, ge=0)
+    insert: str = ""
+
+class ConfigBoardPatch(BaseModel):
+    base_revision: int
+    edits: List[TextEdit] = Field(max_length=1000)
+    name: Optional[str] = None
+
+class ConfigRevision(BaseModel):
+    revision: int
+    user_id: Optional[int] = None
+    created_at: datetime
+    class Config:
+        from_attributes = True
 
 class ConfigBoard(ConfigBoardBase):
     id: int
@@ -95,6 +158,7 @@ class ConfigBoard(ConfigBoardBase):
     share_token: Optional[str] = None
     created_at: datetime
     updated_at: datetime
+    revision: int = 0
     class Config:
         from_attributes = True
 
@@ -112,6 +176,14 @@ class ActivityLog(ActivityLogBase):
     class Config:
         from_attributes = True
 
+class ActivityArchiveSegment(BaseModel):
+    month: str
+    entry_count: int
+    first_at: Optional[datetime] = None
+    last_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
 # Notifications
 class NotificationBase(BaseModel):
     content: str
@@ -153,6 +225,7 @@ class Project(ProjectBase):
     owner_id: int
     owner: Optional[User] = None  # Include owner details
     created_at: datetime
+    version: int = 0
     tasks: List[Task] = []
     members: List[User] = [] # Include members
     attachments: List[Attachment] = []
@@ -160,3 +233,92 @@ class Project(ProjectBase):
     configs: List[ConfigBoard] = []
     class Config:
         from_attributes = True
+
+# Project views (slim payloads for GET /projects/{id}?view=...)
+class TaskCard(TaskBase):
+    id: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    project_id: int
+    assignee: Optional[User] = None
+    comment_count: int = 0
+    attachment_count: int = 0
+    comments: Optional[List[Comment]] = None # only with include=comments
+    attachments: Optional[List[Attachment]] = None # only with include=attachments
+    class Config:
+        from_attributes = True
+
+class StageSummary(StageBase):
+    id: int
+    project_id: int
+    created_at: datetime
+    class Config:
+        from_attributes = True
+
+class ProjectSummary(ProjectBase):
+    id: int
+    owner_id: int
+    owner: Optional[User] = None
+    created_at: datetime
+    version: int = 0
+    members: List[User] = []
+    stages: List[StageSummary] = []
+    task_count: int = 0
+    task_counts_by_status: Dict[str, int] = {}
+    attachments: Optional[List[Attachment]] = None # only with include=files
+    configs: Optional[List[ConfigBoard]] = None # only with include=configs
+    class Config:
+        from_attributes = True
+
+class ProjectBoard(ProjectSummary):
+    tasks: List[TaskCard] = []
+
+# Delta sync (GET /projects/{id}/changes)
+class ProjectChanges(BaseModel):
+    version: int
+    since: int
+    resync: bool = False # `since` is older than the retained history; reload the project instead
+    tasks: List[Task] = []
+    stages: List[StageSummary] = []
+    comments: List[Comment] = []
+    attachments: List[Attachment] = []
+    members: List[User] = []
+    configs: List[ConfigBoard] = []
+    deleted: Dict[str, List[int]] = {} # tombstones, keyed like the lists above
+
+class AssigneeTaskCount(BaseModel):
+    assignee_id: Optional[int] = None
+    name: str
+    total: int
+    done: int
+
+class DailyCount(BaseModel):
+    date: str
+    count: int
+
+class BurndownPoint(BaseModel):
+    date: str
+    remaining: int
+
+class CycleTime(BaseModel):
+    completed: int
+    avg_hours: Optional[float] = None
+    median_hours: Optional[float] = None
+    p85_hours: Optional[float] = None
+
+class ProjectAnalytics(BaseModel):
+    project_id: int
+    version: int
+    generated_at: datetime
+    days: int
+    total_tasks: int
+    done: int
+    overdue: int
+    completion_rate: float
+    by_status: Dict[str, int]
+    by_priority: Dict[str, int]
+    by_assignee: List[AssigneeTaskCount]
+    throughput: List[DailyCount] # tasks completed per day
+    cycle_time: CycleTime # created_at -> completed_at
+    burndown: List[BurndownPoint] # open tasks at the end of each day
@@ -0,0 +1,85 @@
+"""
+Serialized project snapshots for GET /projects/{id}.
+
+The endpoint's response is cached as the finished JSON bytes, per (project,
+view, includes), together with its ETag. A repeat load of an unchanged project
+is then a dict lookup plus the caller's access check (one indexed query, see
+permissions.py) - no loading and no serialization - and a matching
+If-None-Match costs nothing more than the 304. Access is never read from the
+snapshot, so removing a member takes effect on every worker at once.
+
+Every project write goes through helpers.record_changes(), which calls
+changed(); once that session commits, the project's snapshots are dropped and
+the next read rebuilds them. A snapshot built from data older than the last
+committed write (a slow read racing a write) is not stored.
+
+Invalidation reaches this process only. Other workers serve their copy until
+PROJECT_SNAPSHOT_TTL runs out; set PROJECT_SNAPSHOT_VERIFY=true there to check
+each hit against projects.version with a single primary-key lookup instead.
+"""
+import hashlib
+import os
+import threading
+from typing import NamedTuple, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import database, models
+from cache import LRUCache, register
+
+PROJECT_SNAPSHOT_TTL = float(os.getenv("PROJECT_SNAPSHOT_TTL", "60"))
+PROJECT_SNAPSHOT_BYTES = int(os.getenv("PROJECT_SNAPSHOT_BYTES", str(64 * 1024 * 1024)))
+PROJECT_SNAPSHOT_VERIFY = os.getenv("PROJECT_SNAPSHOT_VERIFY", "false").lower() in ("1", "true", "yes")
+
+class Snapshot(NamedTuple):
+    body: bytes
+    etag: str
+    version: int
+
+_cache = register(LRUCache(
+    "project_snapshots",
+    maxsize=4096,
+    ttl=PROJECT_SNAPSHOT_TTL,
+    max_bytes=PROJECT_SNAPSHOT_BYTES,
+    sizeof=lambda snapshot: len(snapshot.body),
+))
+
+_lock = threading.Lock()
+_committed_versions = {} # project id -> last committed version seen by this process
+
+def get(db: Session, key) -> Optional[Snapshot]:
+    snapshot = _cache.get(key)
+    if snapshot is not None and PROJECT_SNAPSHOT_VERIFY:
+        version = db.query(models.Project.version).filter(models.Project.id == key[0]).scalar()
+        if version != snapshot.version:
+            _cache.invalidate(key)
+            return None
+    return snapshot
+
+def store(key, body: bytes, version: int) -> Snapshot:
+    snapshot = Snapshot(body, f'"{hashlib.sha256(body).hexdigest()}"', version)
+    with _lock:
+        if version < _committed_versions.get(key[0], 0):
+            return snapshot # already out of date; serve it once but don't keep it
+    _cache.set(key, snapshot)
+    return snapshot
+
+def changed(db: Session, project_id: int, version: float):
+    """Drop the project's snapshots once `db` commits; `version` is the version the commit leaves it at."""
+    pending = db.info.setdefault("changed_projects", {})
+    pending[project_id] = max(pending.get(project_id, 0), version)
+
+def invalidate(project_id: int, version: float = 0):
+    with _lock:
+        if version > _committed_versions.get(project_id, 0):
+            _committed_versions[project_id] = version
+    _cache.invalidate_where(lambda key, snapshot: key[0] == project_id)
+
+# insert=True: ahead of events.py's publisher, so a client refetching on a live event can't get the old snapshot
+@event.listens_for(database.SessionLocal, "after_commit", insert=True)
+def _invalidate_changed(session):
+    for project_id, version in session.info.pop("changed_projects", {}).items():
+        invalidate(project_id, version)
+
+@event.listens_for(database.SessionLocal, "after_rollback")
+def _forget_changed(session):
+    session.info.pop("changed_projects", None)
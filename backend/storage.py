@@ -0,0 +1,312 @@
+"""
+Content-addressed attachment storage.
+
+Uploads are streamed in chunks into a staging area while their SHA-256 is
+computed, then moved to a path derived from the hash, so identical files are
+stored once however many attachments point at them. The `blobs` table keeps a
+reference count per hash; a blob's file is removed only when its last
+attachment goes.
+
+References are dropped by a before_flush hook on deleted Attachment instances,
+so every way an attachment goes (directly, or cascaded from its task, stage or
+project, also from the admin panel) releases its blob. Files follow the
+transaction: a staged upload is moved into place, and the file of a blob whose
+last reference went is unlinked, only after it commits. A rollback (or a failed
+commit) discards the staged upload and keeps released files.
+
+Ordering against concurrent uploads of the same content: attach_blob() takes
+the blob row lock (UPDATE/INSERT), and the file is moved into place once that
+reference is committed. The post-commit unlink first inserts a placeholder row
+for the hash: that fails if an upload has re-created the blob meanwhile (the
+file stays), and otherwise holds any new upload of it back until the file is
+gone.
+
+Backends implement the StorageBackend interface. LocalStorage (default) keeps
+files under UPLOAD_DIR sharded as blobs/ab/cd/<sha256>; MemoryStorage is a
+stand-in for tests. Install another with set_storage().
+"""
+import hashlib
+import logging
+import os
+import uuid
+from typing import NamedTuple, Optional
+import aiofiles
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import event, update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import database, models
+from helpers import record_change
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+class StagedBlob(NamedTuple):
+    sha256: str
+    size: int
+    token: str # backend-specific handle on the staged data
+
+class UploadTooLarge(Exception):
+    pass
+
+class StorageBackend:
+    """Interface every backend implements."""
+    async def open_staging(self):
+        """Returns (token, writer); the writer has async write(chunk) and close()."""
+        raise NotImplementedError
+    def commit(self, staged: StagedBlob):
+        """Move staged data to its content address (replacing an identical copy)."""
+        raise NotImplementedError
+    def discard(self, staged: StagedBlob):
+        raise NotImplementedError
+    def delete(self, sha256: str):
+        raise NotImplementedError
+    def exists(self, sha256: str) -> bool:
+        raise NotImplementedError
+    def location(self, sha256: str) -> str:
+        """What Attachment.file_path stores for this blob."""
+        raise NotImplementedError
+    def local_path(self, sha256: str) -> Optional[str]:
+        """A filesystem path, for backends that have one (enables sendfile)."""
+        return None
+    def read(self, sha256: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        raise NotImplementedError
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: str = UPLOAD_DIR):
+        self.root = root
+        self.staging_dir = os.path.join(root, "tmp")
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(self.root, "blobs", sha256[:2], sha256[2:4], sha256)
+
+    async def open_staging(self):
+        token = os.path.join(self.staging_dir, uuid.uuid4().hex)
+        return token, await aiofiles.open(token, "wb")
+
+    def commit(self, staged: StagedBlob):
+        path = self._path(staged.sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(staged.token, path)
+
+    def discard(self, staged: StagedBlob):
+        if os.path.exists(staged.token):
+            os.remove(staged.token)
+
+    def delete(self, sha256: str):
+        path = self._path(sha256)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self._path(sha256))
+
+    def location(self, sha256: str) -> str:
+        return self._path(sha256).replace(os.sep, "/")
+
+    def local_path(self, sha256: str) -> Optional[str]:
+        return self._path(sha256)
+
+    def read(self, sha256: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        with open(self._path(sha256), "rb") as f:
+            f.seek(start)
+            return f.read() if end is None else f.read(end - start)
+
+class _MemoryWriter:
+    def __init__(self, buffer: bytearray):
+        self.buffer = buffer
+
+    async def write(self, chunk: bytes):
+        self.buffer.extend(chunk)
+
+    async def close(self):
+        pass
+
+class MemoryStorage(StorageBackend):
+    def __init__(self):
+        self.blobs = {}
+        self._staging = {}
+
+    async def open_staging(self):
+        token = uuid.uuid4().hex
+        self._staging[token] = bytearray()
+        return token, _MemoryWriter(self._staging[token])
+
+    def commit(self, staged: StagedBlob):
+        self.blobs[staged.sha256] = bytes(self._staging.pop(staged.token))
+
+    def discard(self, staged: StagedBlob):
+        self._staging.pop(staged.token, None)
+
+    def delete(self, sha256: str):
+        self.blobs.pop(sha256, None)
+
+    def exists(self, sha256: str) -> bool:
+        return sha256 in self.blobs
+
+    def location(self, sha256: str) -> str:
+        return f"memory/{sha256}"
+
+    def read(self, sha256: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        return self.blobs[sha256][start:end]
+
+_storage = None
+
+def get_storage() -> StorageBackend:
+    global _storage
+    if _storage is None:
+        _storage = MemoryStorage() if os.getenv("STORAGE_BACKEND") == "memory" else LocalStorage()
+    return _storage
+
+def set_storage(backend: StorageBackend):
+    global _storage
+    _storage = backend
+
+# --- Uploads ---
+
+async def stage_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> StagedBlob:
+    """Stream an upload into staging, hashing as it goes. Raises 413 past max_bytes."""
+    backend = get_storage()
+    token, writer = await backend.open_staging()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge()
+            digest.update(chunk)
+            await writer.write(chunk)
+    except BaseException as e:
+        await writer.close()
+        backend.discard(StagedBlob("", size, token))
+        if isinstance(e, UploadTooLarge):
+            raise HTTPException(status_code=413, detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+        raise
+    await writer.close()
+    return StagedBlob(digest.hexdigest(), size, token)
+
+def attach_blob(db: Session, staged: StagedBlob):
+    """Take a reference on the staged blob's hash; it is moved into place once `db` commits."""
+    referenced = db.execute(
+        update(models.Blob)
+        .where(models.Blob.sha256 == staged.sha256)
+        .values(refcount=models.Blob.refcount + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not referenced:
+        try:
+            with db.begin_nested():
+                db.add(models.Blob(sha256=staged.sha256, size=staged.size, refcount=1))
+        except IntegrityError:
+            # Another upload of the same content created the row first
+            db.execute(
+                update(models.Blob)
+                .where(models.Blob.sha256 == staged.sha256)
+                .values(refcount=models.Blob.refcount + 1)
+                .execution_options(synchronize_session=False)
+            )
+    db.info.setdefault("staged_blobs", []).append(staged)
+
+def release_blob(db: Session, sha256: str):
+    """Drop a reference; the last one deletes the blob row, and its file once `db` commits."""
+    db.execute(
+        update(models.Blob)
+        .where(models.Blob.sha256 == sha256)
+        .values(refcount=models.Blob.refcount - 1)
+        .execution_options(synchronize_session=False)
+    )
+    unreferenced = db.execute(
+        delete(models.Blob)
+        .where(models.Blob.sha256 == sha256, models.Blob.refcount <= 0)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if unreferenced:
+        db.info.setdefault("released_blobs", set()).add(sha256)
+
+def _delete_released(sha256: str):
+    db = database.SessionLocal()
+    try:
+        # The placeholder is never committed: it only holds the hash while the file goes
+        db.add(models.Blob(sha256=sha256, size=0, refcount=0))
+        db.flush()
+    except IntegrityError:
+        db.rollback() # uploaded again since; the file is in use
+        return
+    try:
+        get_storage().delete(sha256)
+    finally:
+        db.rollback()
+        db.close()
+
+# On Session rather than SessionLocal so the admin panel's sessions release blobs too
+@event.listens_for(Session, "before_flush")
+def _release_deleted_attachments(session, flush_context, instances):
+    for obj in session.deleted:
+        if isinstance(obj, models.Attachment):
+            if obj.sha256:
+                release_blob(session, obj.sha256)
+            elif obj.file_path:
+                # Uploaded before content-addressed storage: the file is this attachment's alone
+                session.info.setdefault("released_files", set()).add(obj.file_path)
+
+@event.listens_for(Session, "after_commit")
+def _apply_file_changes(session):
+    for staged in session.info.pop("staged_blobs", ()):
+        try:
+            get_storage().commit(staged)
+        except Exception:
+            logger.exception("Could not store blob %s", staged.sha256)
+    for sha256 in session.info.pop("released_blobs", ()):
+        try:
+            _delete_released(sha256)
+        except Exception:
+            logger.exception("Could not delete blob %s", sha256)
+    for path in session.info.pop("released_files", ()):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            logger.exception("Could not delete %s", path)
+
+# Not after_rollback: that also fires for savepoints, e.g. attach_blob()'s.
+# Whatever after_commit didn't take when the outermost transaction ends was rolled back.
+@event.listens_for(Session, "after_transaction_end")
+def _drop_file_changes(session, transaction):
+    if transaction.parent is not None:
+        return
+    for staged in session.info.pop("staged_blobs", ()):
+        get_storage().discard(staged)
+    session.info.pop("released_blobs", None)
+    session.info.pop("released_files", None)
+
+def create_attachment(db: Session, staged: StagedBlob, file: UploadFile, project_id: int, task_id: int = None):
+    """Attachment row + blob reference for a staged upload, committed together."""
+    try:
+        attach_blob(db, staged)
+        attachment = models.Attachment(
+            filename=file.filename or "file",
+            file_path=get_storage().location(staged.sha256),
+            sha256=staged.sha256,
+            size=staged.size,
+            content_type=file.content_type,
+            task_id=task_id,
+            project_id=None if task_id else project_id,
+        )
+        db.add(attachment)
+        db.flush()
+        record_change(db, project_id, "attachment", attachment.id, data=attachment.to_dict())
+        db.commit()
+    except BaseException:
+        db.rollback()
+        get_storage().discard(staged)
+        raise
+    db.refresh(attachment)
+    return attachment
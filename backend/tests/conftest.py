@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# Backend modules import each other by bare name and read their settings at import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", "sqlite://") # one shared in-memory connection (database.make_engine)
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ADMIN_EMAIL", "admin@example.com")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="uploads-"))
+
+ADMIN_EMAIL = os.environ["ADMIN_EMAIL"]
+
+@pytest.fixture
+def app():
+    """The API on a fresh, empty database, with every in-process cache cleared."""
+    import cache, database, main, models, snapshots
+    models.Base.metadata.drop_all(bind=database.engine)
+    models.Base.metadata.create_all(bind=database.engine)
+    for each in cache._registry.values():
+        each.clear()
+    snapshots._committed_versions.clear()
+    return main.app
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+    return TestClient(app)
+
+@pytest.fixture
+def signup(client):
+    """signup(email, name) -> Authorization headers for a new user."""
+    def make(email: str, full_name: str = "User"):
+        response = client.post("/users/", json={"email": email, "password": "pw", "full_name": full_name})
+        assert response.status_code == 200, response.text
+        response = client.post("/token", data={"username": email, "password": "pw"})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return make
+
+@pytest.fixture
+def admin(signup):
+    return signup(ADMIN_EMAIL, "Admin")
@@ -0,0 +1,85 @@
+from conftest import ADMIN_EMAIL
+
+def test_admin_api_is_not_shadowed_by_the_admin_panel(client, admin):
+    for path in ("/admin/stats", "/admin/users", "/admin/projects", "/admin/logs", "/admin/jobs", "/admin/metrics"):
+        response = client.get(path, headers=admin)
+        assert response.status_code == 200, (path, response.text)
+        assert response.headers["content-type"].startswith("application/json"), path
+
+def test_admin_api_requires_admin(client, signup):
+    user = signup("someone@example.com")
+    assert client.get("/admin/jobs", headers=user).status_code == 403
+
+def test_job_metrics(client, admin):
+    import database, jobs
+    db = database.SessionLocal()
+    try:
+        jobs.enqueue(db, "notify", user_id=1, content="x")
+        db.commit()
+    finally:
+        db.close()
+    metrics = client.get("/admin/jobs", headers=admin).json()
+    assert metrics["queue_depth"] == 1
+    assert metrics["by_status"] == {"pending": 1}
+    assert metrics["oldest_pending_age_seconds"] >= 0
+    for key in ("processed", "failed", "retried", "queue_wait", "run_time"):
+        assert key in metrics
+
+def test_metrics_expose_cache_and_pool_stats(client, admin, signup):
+    import jobs
+    owner = signup("owner@example.com", "Owner")
+    signup("bob@example.com", "Bob")
+    project = client.post("/projects/", json={"name": "P"}, headers=owner).json()
+    client.post(f"/projects/{project['id']}/invite", params={"email": "bob@example.com"}, headers=owner)
+    task = client.post(f"/projects/{project['id']}/tasks/", json={"title": "T"}, headers=owner).json()
+
+    def caches():
+        return client.get("/admin/metrics", headers=admin).json()["caches"]
+
+    before = caches()
+    for _ in range(2):
+        client.post(f"/tasks/{task['id']}/comments/", json={"content": "@bob look"}, headers=owner)
+    while jobs.run_one(): # mentions are resolved by the comment_created job
+        pass
+    client.get(f"/projects/{project['id']}", headers=owner)
+    client.get(f"/projects/{project['id']}", headers=owner) # unchanged since the last read: a snapshot hit
+    metrics = client.get("/admin/metrics", headers=admin).json()
+
+    after = metrics["caches"]
+    for name in ("mention_index", "project_snapshots", "auth_tokens", "shared_configs"):
+        assert name in after, name
+    assert after["mention_index"]["hits"] > before["mention_index"]["hits"]
+    assert after["project_snapshots"]["hits"] > before["project_snapshots"]["hits"]
+    assert "checkouts" in metrics["db_pools"]["primary"]
+
+def test_admin_users_paging_and_search(client, admin, signup):
+    for i in range(5):
+        signup(f"user{i}@example.com", f"Person {i}")
+    response = client.get("/admin/users", params={"sort": "email", "order": "asc", "limit": 2}, headers=admin)
+    assert response.headers["X-Total-Count"] == "6"
+    assert [user["email"] for user in response.json()] == [ADMIN_EMAIL, "user0@example.com"]
+    response = client.get("/admin/users", params={"sort": "email", "order": "asc", "skip": 4, "limit": 2}, headers=admin)
+    assert [user["email"] for user in response.json()] == ["user3@example.com", "user4@example.com"]
+
+    response = client.get("/admin/users", params={"q": "person 3"}, headers=admin)
+    assert response.headers["X-Total-Count"] == "1"
+    assert [user["email"] for user in response.json()] == ["user3@example.com"]
+    response = client.get("/admin/users", params={"q": "USER1@"}, headers=admin)
+    assert [user["email"] for user in response.json()] == ["user1@example.com"]
+
+    assert client.get("/admin/users", params={"limit": 0}, headers=admin).status_code == 400
+    assert client.get("/admin/users", params={"sort": "password"}, headers=admin).status_code == 400
+
+def test_admin_projects_paging_and_search(client, admin, signup):
+    for i in range(4):
+        owner = signup(f"owner{i}@example.com", f"Owner {i}")
+        client.post("/projects/", json={"name": f"Project {i}"}, headers=owner)
+    response = client.get("/admin/projects", params={"sort": "name", "order": "desc", "skip": 1, "limit": 2}, headers=admin)
+    assert response.headers["X-Total-Count"] == "4"
+    assert [project["name"] for project in response.json()] == ["Project 2", "Project 1"]
+
+    response = client.get("/admin/projects", params={"q": "project 3"}, headers=admin)
+    assert response.headers["X-Total-Count"] == "1"
+    assert [project["name"] for project in response.json()] == ["Project 3"]
+    response = client.get("/admin/projects", params={"q": "owner0@"}, headers=admin)
+    assert [(project["name"], project["owner_email"]) for project in response.json()] == [("Project 0", "owner0@example.com")]
@@ -0,0 +1,56 @@
+import asyncio
+import time
+import httpx
+from passlib.hash import bcrypt
+import auth, database, models
+
+LOGINS = 8
+
+def _use_real_cost(email: str, rounds: int = 11):
+    """Store a production-like hash; the test suite otherwise hashes at the cheapest cost."""
+    hashed = bcrypt.using(rounds=rounds).hash("pw")
+    db = database.SessionLocal()
+    try:
+        db.query(models.User).filter(models.User.email == email).update({"hashed_password": hashed})
+        db.commit()
+    finally:
+        db.close()
+    return hashed
+
+async def _logins_and_loop_lag(app, email: str):
+    """Run LOGINS concurrent logins; returns (statuses, seconds taken, worst event-loop stall)."""
+    stop = asyncio.Event()
+    worst = 0.0
+
+    async def ticker():
+        nonlocal worst
+        loop = asyncio.get_running_loop()
+        while not stop.is_set():
+            started = loop.time()
+            await asyncio.sleep(0.005)
+            worst = max(worst, loop.time() - started - 0.005)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        watcher = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/token", data={"username": email, "password": "pw"}) for _ in range(LOGINS)
+        ))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await watcher
+    return [response.status_code for response in responses], elapsed, worst
+
+def test_benchmark_login_does_not_block_the_event_loop(app, signup):
+    """Benchmark: concurrent logins at a real bcrypt cost leave the event loop responsive."""
+    signup("owner@example.com")
+    hashed = _use_real_cost("owner@example.com")
+    started = time.perf_counter()
+    assert auth.verify_password("pw", hashed)
+    one_hash = time.perf_counter() - started
+
+    statuses, elapsed, worst = asyncio.run(_logins_and_loop_lag(app, "owner@example.com"))
+    print(f"{LOGINS} logins in {elapsed * 1000:.0f}ms ({LOGINS / elapsed:.1f}/s, one hash {one_hash * 1000:.0f}ms), worst event-loop stall {worst * 1000:.1f}ms")
+    assert statuses == [200] * LOGINS
+    # Hashing on the loop would stall it for at least one hash per login
+    assert worst < one_hash / 2
@@ -0,0 +1,50 @@
+import threading
+import pytest
+from sqlalchemy import text
+import database
+
+@pytest.mark.parametrize("url, memory", [
+    ("sqlite://", True),
+    ("sqlite:///:memory:", True),
+    ("sqlite:///file::memory:?mode=memory&uri=true", True),
+    ("sqlite:///app.db", False),
+    ("mysql+pymysql://user:pw@localhost/app", False),
+])
+def test_is_memory_sqlite(url, memory):
+    assert database.is_memory_sqlite(url) is memory
+
+def test_memory_engine_is_shared_across_threads():
+    engine = database.make_engine("test_memory", "sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        conn.execute(text("INSERT INTO t VALUES (1)"))
+    seen = []
+    def count():
+        with engine.connect() as conn:
+            seen.append(conn.execute(text("SELECT COUNT(*) FROM t")).scalar())
+    thread = threading.Thread(target=count)
+    thread.start()
+    thread.join()
+    assert seen == [1]
+    database._engines.pop("test_memory", None)
+
+def test_async_engine_accepts_memory_sqlite_and_reports_pool_stats(tmp_path):
+    import asyncio
+    memory = database.make_engine("test_async_memory", "sqlite+aiosqlite://", is_async=True)
+    on_disk = database.make_engine("test_async_file", f"sqlite+aiosqlite:///{tmp_path / 'async.db'}", is_async=True)
+
+    async def run():
+        async with memory.begin() as conn:
+            await conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        async with memory.connect() as conn:
+            assert (await conn.execute(text("SELECT COUNT(*) FROM t"))).scalar() == 0
+        async with on_disk.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        await memory.dispose()
+        await on_disk.dispose()
+    asyncio.run(run())
+
+    stats = database.pool_stats()["test_async_file"]
+    assert stats["checkouts"] >= 1 and "checked_out" in stats
+    database._engines.pop("test_async_memory", None)
+    database._engines.pop("test_async_file", None)
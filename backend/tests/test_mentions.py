@@ -0,0 +1,60 @@
+import pytest
+import models
+from mentions import MentionIndex
+
+@pytest.fixture
+def index():
+    return MentionIndex([
+        models.User(id=1, full_name="Bob Stone", email="bob@example.com"),
+        models.User(id=2, full_name="Bo Lin", email="bo.lin@example.com"),
+        models.User(id=3, full_name=None, email="carol.d@example.org"),
+        models.User(id=4, full_name="Straße Admin", email="strasse@example.com"),
+    ])
+
+def test_case_insensitive(index):
+    assert index.resolve("@BOB and @bO") == [1, 2]
+
+def test_case_folding_beyond_lowercase(index):
+    # "ß" case-folds to "ss", so either spelling and any case finds the user
+    assert index.resolve("@STRASSE") == [4]
+    assert index.resolve("@straße") == [4]
+
+@pytest.mark.parametrize("text", ["@bob.", "@bob,", "@bob!", "@bob?", "(@bob)", "@bob's", "@bob:", "@bob..."])
+def test_trailing_punctuation(index, text):
+    assert index.resolve(text) == [1]
+
+def test_email_handles(index):
+    assert index.resolve("ping @bob@example.com") == [1]
+    assert index.resolve("ping @BO.LIN@EXAMPLE.COM.") == [2]
+    # No name: the email local part is the short handle
+    assert index.resolve("@carol.d and @carol.d@example.org") == [3]
+
+def test_prefix_collisions(index):
+    assert index.resolve("@Bo") == [2]
+    assert index.resolve("@Bob") == [1]
+    assert index.resolve("@Bobby @B") == []
+
+def test_order_and_duplicates(index):
+    assert index.resolve("@bo @bob @bo @bob@example.com") == [2, 1]
+
+def test_no_mentions(index):
+    assert index.resolve("") == []
+    assert index.resolve(None) == []
+    assert index.resolve("mail bob@example.com, not a mention") == []
+    assert index.resolve("@nobody") == []
+
+def _resolve_seconds(members: int) -> float:
+    import timeit
+    index = MentionIndex([
+        models.User(id=i, full_name=f"Member{i} Surname", email=f"member{i}@example.com")
+        for i in range(members)
+    ])
+    text = "Thanks @member3, can @Member7 and @member9@example.com review? cc @nobody. " * 4
+    # Best of several runs: the least disturbed by whatever else the machine is doing
+    return min(timeit.repeat(lambda: index.resolve(text), number=200, repeat=7)) / 200
+
+def test_benchmark_resolve_cost_is_flat_in_member_count():
+    """Micro-benchmark: resolving a comment costs the same at 10 and 1000 members."""
+    timings = {members: _resolve_seconds(members) for members in (10, 100, 1000)}
+    print("resolve() per comment:", {members: f"{seconds * 1e6:.1f}us" for members, seconds in timings.items()})
+    assert timings[1000] < timings[10] * 3
@@ -0,0 +1,23 @@
+from urllib.parse import parse_qs, urlparse
+import auth
+
+def test_stream_link_is_signed_for_the_user(client, signup):
+    headers = signup("owner@example.com")
+    link = client.get("/notifications/stream-link", headers=headers).json()
+    url = urlparse(link["url"])
+    assert url.path == "/notifications/stream"
+    params = {key: values[0] for key, values in parse_qs(url.query).items()}
+    assert "token" not in params
+    assert auth.verify_stream("notifications", int(params["user_id"]), int(params["expires"]), params["signature"])
+    # Bound to the user and the stream
+    assert not auth.verify_stream("notifications", int(params["user_id"]) + 1, int(params["expires"]), params["signature"])
+    assert not auth.verify_stream("project:1", int(params["user_id"]), int(params["expires"]), params["signature"])
+
+def test_stream_rejects_bad_or_expired_links(client, signup, monkeypatch):
+    signup("owner@example.com")
+    assert client.get("/notifications/stream").status_code == 401
+    assert client.get("/notifications/stream", params={"user_id": 1, "expires": 9999999999, "signature": "0" * 64}).status_code == 403
+
+    monkeypatch.setattr(auth, "STREAM_URL_TTL", -1)
+    expires, signature = auth.sign_stream("notifications", 1)
+    assert client.get("/notifications/stream", params={"user_id": 1, "expires": expires, "signature": signature}).status_code == 403
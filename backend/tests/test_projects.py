@@ -0,0 +1,17 @@
+def test_removed_member_loses_access_despite_a_cached_snapshot(client, signup):
+    import database, models
+    owner = signup("owner@example.com", "Owner")
+    bob = signup("bob@example.com", "Bob")
+    project_id = client.post("/projects/", json={"name": "P"}, headers=owner).json()["id"]
+    client.post(f"/projects/{project_id}/invite", params={"email": "bob@example.com"}, headers=owner)
+    assert client.get(f"/projects/{project_id}", headers=bob).status_code == 200
+
+    # As another worker would: the membership goes, this process's snapshot stays
+    db = database.SessionLocal()
+    try:
+        db.execute(models.project_members.delete().where(models.project_members.c.project_id == project_id))
+        db.commit()
+    finally:
+        db.close()
+    assert client.get(f"/projects/{project_id}", headers=bob).status_code == 403
+    assert client.get(f"/projects/{project_id}", headers=owner).status_code == 200
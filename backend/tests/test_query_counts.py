@@ -0,0 +1,48 @@
+import cache
+import database
+import queries
+
+def _seed(client, owner, member, project_id, stage_id, count):
+    """`count` more tasks, each assigned to the member and with one comment. Returns the last task id."""
+    for i in range(count):
+        task = client.post(f"/projects/{project_id}/tasks/", json={"title": f"t{i}", "stage_id": stage_id, "assignee_id": 2}, headers=owner).json()
+        client.post(f"/tasks/{task['id']}/comments/", json={"content": "hi @Bob"}, headers=member)
+    return task["id"]
+
+def test_statement_count_does_not_grow_with_the_data(client, admin, signup):
+    owner = signup("owner@example.com", "Owner")
+    member = signup("bob@example.com", "Bob")
+    project_id = client.post("/projects/", json={"name": "P"}, headers=owner).json()["id"]
+    client.post(f"/projects/{project_id}/invite", params={"email": "bob@example.com"}, headers=owner)
+    stage_id = client.post(f"/projects/{project_id}/stages/", json={"name": "S"}, headers=owner).json()["id"]
+    config_id = client.post(f"/projects/{project_id}/configs/", json={"name": "C"}, headers=owner).json()["id"]
+
+    counts = {}
+    for size in (2, 12):
+        task_id = _seed(client, owner, member, project_id, stage_id, size)
+        calls = [
+            ("get", "/projects/", {}),
+            ("get", f"/projects/{project_id}", {}),
+            ("get", f"/projects/{project_id}/tasks", {}),
+            ("get", f"/projects/{project_id}/activity", {}),
+            ("get", f"/projects/{project_id}/configs/", {}),
+            ("patch", f"/tasks/{task_id}", {"params": {"status": "DONE"}}),
+            ("put", f"/configs/{config_id}", {"json": {"content": f"{{\"size\": {size}}}"}}),
+            ("get", "/notifications/", {}),
+            ("post", f"/tasks/{task_id}/comments/", {"json": {"content": "x @Bob"}}),
+            ("get", "/admin/stats", {}),
+            ("get", "/admin/users", {}),
+            ("get", "/admin/projects", {}),
+            ("get", "/admin/logs", {}),
+        ]
+        for method, path, kwargs in calls:
+            headers = admin if path.startswith("/admin") else owner
+            for each in cache._registry.values(): # count the uncached path every time
+                each.clear()
+            with queries.count_queries(database.engine) as counter:
+                response = getattr(client, method)(path, headers=headers, **kwargs)
+            assert response.status_code == 200, (path, response.text)
+            counts.setdefault((method, path.replace(str(task_id), "{task_id}")), []).append(counter["count"])
+
+    for call, (small, large) in counts.items():
+        assert small == large, (call, small, large)
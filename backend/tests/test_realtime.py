@@ -0,0 +1,27 @@
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+def test_project_events_open_with_a_signed_link(client, signup):
+    owner = signup("owner@example.com", "Owner")
+    project_id = client.post("/projects/", json={"name": "P"}, headers=owner).json()["id"]
+    url = client.get(f"/projects/{project_id}/events-link", headers=owner).json()["url"]
+    assert "token" not in url
+
+    with client.websocket_connect(url) as websocket:
+        assert websocket.receive_json()["type"] == "ready"
+        client.post(f"/projects/{project_id}/tasks/", json={"title": "a"}, headers=owner)
+        message = websocket.receive_json()
+        assert (message["type"], message["entity"], message["op"]) == ("change", "task", "upsert")
+
+def test_project_events_link_is_for_members_and_one_project(client, signup):
+    owner = signup("owner@example.com", "Owner")
+    outsider = signup("out@example.com", "Out")
+    project_id = client.post("/projects/", json={"name": "P"}, headers=owner).json()["id"]
+    other_id = client.post("/projects/", json={"name": "Q"}, headers=outsider).json()["id"]
+    assert client.get(f"/projects/{project_id}/events-link", headers=outsider).status_code == 403
+
+    url = client.get(f"/projects/{other_id}/events-link", headers=outsider).json()["url"]
+    for rejected in (url.replace(f"/projects/{other_id}/", f"/projects/{project_id}/"), url.split("&signature=")[0] + "&signature=" + "0" * 64, f"/projects/{project_id}/events"):
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect(rejected) as websocket:
+                websocket.receive_json()
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import pytest
+from sqlalchemy import event
+import database, models, storage
+
+@pytest.fixture
+def backend():
+    backend = storage.MemoryStorage()
+    previous = storage.get_storage()
+    storage.set_storage(backend)
+    yield backend
+    storage.set_storage(previous)
+
+def _refcounts():
+    db = database.SessionLocal()
+    try:
+        return {blob.sha256: blob.refcount for blob in db.query(models.Blob)}
+    finally:
+        db.close()
+
+def _stage(backend, data: bytes):
+    async def write():
+        token, writer = await backend.open_staging()
+        await writer.write(data)
+        await writer.close()
+        return token
+    return storage.StagedBlob(hashlib.sha256(data).hexdigest(), len(data), asyncio.run(write()))
+
+@pytest.fixture
+def task(client, signup):
+    owner = signup("owner@example.com", "Owner")
+    project = client.post("/projects/", json={"name": "P"}, headers=owner).json()
+    task = client.post(f"/projects/{project['id']}/tasks/", json={"title": "T"}, headers=owner).json()
+    return owner, project["id"], task["id"]
+
+def test_identical_uploads_share_one_blob(client, backend, task):
+    owner, project_id, task_id = task
+    sha256 = hashlib.sha256(b"same").hexdigest()
+    first = client.post(f"/tasks/{task_id}/attachments/", files={"file": ("a.txt", b"same")}, headers=owner).json()
+    second = client.post(f"/projects/{project_id}/attachments/", files={"file": ("b.txt", b"same")}, headers=owner).json()
+    assert list(backend.blobs) == [sha256]
+    assert _refcounts() == {sha256: 2}
+    assert not backend._staging
+
+    client.delete(f"/attachments/{first['id']}", headers=owner)
+    assert _refcounts() == {sha256: 1}
+    assert backend.blobs[sha256] == b"same"
+    client.delete(f"/attachments/{second['id']}", headers=owner)
+    assert _refcounts() == {}
+    assert backend.blobs == {}
+
+@pytest.mark.parametrize("delete", ["task", "project"])
+def test_deleting_the_parent_releases_its_blobs(client, backend, task, delete):
+    owner, project_id, task_id = task
+    client.post(f"/tasks/{task_id}/attachments/", files={"file": ("a.txt", b"on the task")}, headers=owner)
+    client.post(f"/projects/{project_id}/attachments/", files={"file": ("b.txt", b"on the project")}, headers=owner)
+    assert len(backend.blobs) == 2
+
+    assert client.delete(f"/tasks/{task_id}" if delete == "task" else f"/projects/{project_id}", headers=owner).status_code == 200
+    remaining = {} if delete == "project" else {hashlib.sha256(b"on the project").hexdigest(): b"on the project"}
+    assert backend.blobs == remaining
+    assert set(_refcounts()) == set(remaining)
+
+def test_released_file_is_unlinked_only_after_commit(client, backend, task):
+    owner, project_id, task_id = task
+    attachment_id = client.post(f"/tasks/{task_id}/attachments/", files={"file": ("a.txt", b"data")}, headers=owner).json()["id"]
+    sha256 = hashlib.sha256(b"data").hexdigest()
+
+    db = database.SessionLocal()
+    try:
+        db.delete(db.get(models.Attachment, attachment_id))
+        db.flush()
+        assert sha256 in backend.blobs
+        db.rollback()
+        assert sha256 in backend.blobs
+        assert _refcounts() == {sha256: 1}
+
+        db.delete(db.get(models.Attachment, attachment_id))
+        db.commit()
+        assert sha256 not in backend.blobs
+    finally:
+        db.close()
+
+def test_staged_upload_is_stored_only_after_commit(app, backend):
+    staged = _stage(backend, b"new")
+    db = database.SessionLocal()
+    try:
+        storage.attach_blob(db, staged)
+        assert staged.sha256 not in backend.blobs
+        db.commit()
+        assert backend.blobs[staged.sha256] == b"new"
+        assert not backend._staging
+    finally:
+        db.close()
+
+def test_failed_commit_leaves_no_orphan_blob(app, backend):
+    staged = _stage(backend, b"orphan?")
+    db = database.SessionLocal()
+
+    def fail(session):
+        raise RuntimeError("commit failed")
+
+    try:
+        storage.attach_blob(db, staged)
+        event.listen(db, "before_commit", fail)
+        with pytest.raises(RuntimeError):
+            db.commit()
+        db.rollback()
+    finally:
+        db.close()
+    assert backend.blobs == {}
+    assert not backend._staging
+    assert _refcounts() == {}
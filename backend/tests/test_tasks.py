@@ -0,0 +1,51 @@
+from datetime import datetime
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+def test_noop_task_update_records_no_change(client, signup):
+    owner = signup("owner@example.com", "Owner")
+    project_id = client.post("/projects/", json={"name": "P"}, headers=owner).json()["id"]
+    task = client.post(f"/projects/{project_id}/tasks/", json={"title": "T"}, headers=owner).json()
+
+    def version():
+        return client.get(f"/projects/{project_id}/changes", params={"since": 0}, headers=owner).json()["version"]
+
+    before = version()
+    response = client.patch(f"/tasks/{task['id']}", params={"title": "T", "status": task["status"]}, headers=owner)
+    assert response.status_code == 200
+    assert version() == before
+
+    client.patch(f"/tasks/{task['id']}", params={"title": "Renamed"}, headers=owner)
+    assert version() == before + 1
+
+def test_task_pages_cover_every_task_once(client, signup):
+    import database, models
+    owner = signup("owner@example.com", "Owner")
+    project_id = client.post("/projects/", json={"name": "P"}, headers=owner).json()["id"]
+    ids = [client.post(f"/projects/{project_id}/tasks/", json={"title": f"t{i}"}, headers=owner).json()["id"] for i in range(5)]
+    db = database.SessionLocal()
+    try:
+        # Ties on updated_at are broken by id
+        db.query(models.Task).filter(models.Task.id.in_(ids[1:4])).update({"updated_at": datetime(2024, 1, 1)})
+        db.commit()
+    finally:
+        db.close()
+
+    seen, cursor = [], None
+    while True:
+        page = client.get(f"/projects/{project_id}/tasks", params={"limit": 2, **({"cursor": cursor} if cursor else {})}, headers=owner).json()
+        seen += [task["id"] for task in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [ids[4], ids[0], ids[3], ids[2], ids[1]]
+
+def test_task_updated_at_is_never_null(app):
+    import database, models
+    db = database.SessionLocal()
+    try:
+        with pytest.raises(IntegrityError):
+            db.execute(models.Task.__table__.insert().values(title="T", updated_at=None))
+    finally:
+        db.rollback()
+        db.close()
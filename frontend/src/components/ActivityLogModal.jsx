@@ -6,12 +6,20 @@ import { formatDistanceToNow } from 'date-fns';
 const ActivityLogModal = ({ projectId, onClose }) => {
     const [logs, setLogs] = useState([]);
     const [loading, setLoading] = useState(true);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+
+    // Pages come newest first; X-Next-Cursor fetches the next older page
+    const fetchPage = async (before) => {
+        const res = await api.get(`/projects/${projectId}/activity`, { params: before ? { before } : {} });
+        setNextCursor(res.headers['x-next-cursor'] || null);
+        return res.data;
+    };
 
     useEffect(() => {
         const fetchLogs = async () => {
             try {
-                const res = await api.get(`/projects/${projectId}/activity`);
-                setLogs(res.data);
+                setLogs(await fetchPage());
             } catch (error) {
                 console.error(error);
             } finally {
@@ -21,6 +29,18 @@ const ActivityLogModal = ({ projectId, onClose }) => {
         fetchLogs();
     }, [projectId]);
 
+    const loadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const older = await fetchPage(nextCursor);
+            setLogs(current => [...current, ...older]);
+        } catch (error) {
+            console.error(error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     return (
         <div className="fixed inset-0 bg-black/70 flex items-center justify-center z-50 p-4 backdrop-blur-sm">
             <div className="bg-slate-800 border border-slate-700 rounded-xl w-full max-w-lg h-[70vh] flex flex-col shadow-2xl">
@@ -56,6 +76,15 @@ const ActivityLogModal = ({ projectId, onClose }) => {
                             </div>
                         ))
                     )}
+                    {!loading && nextCursor && (
+                        <button
+                            onClick={loadMore}
+                            disabled={loadingMore}
+                            className="w-full py-2 text-sm text-indigo-300 hover:text-indigo-200 disabled:text-slate-500"
+                        >
+                            {loadingMore ? 'Loading...' : 'Load older activity'}
+                        </button>
+                    )}
                 </div>
             </div>
         </div>
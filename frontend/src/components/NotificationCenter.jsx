@@ -1,18 +1,26 @@
 import React, { useEffect, useState } from 'react';
 import { Bell } from 'lucide-react';
 import api from '../utils/api';
+import { store } from '../store';
 import { formatDistanceToNow } from 'date-fns';
 import { motion, AnimatePresence } from 'framer-motion';
 
+const NOTIFICATION_LIMIT = 20;
+
 const NotificationCenter = () => {
     const [notifications, setNotifications] = useState([]);
+    const [unreadCount, setUnreadCount] = useState(0);
     const [show, setShow] = useState(false);
-    const unreadCount = notifications.filter(n => !n.is_read).length;
 
+    // The badge comes from the server's counter; only the latest few items are listed
     const fetchNotifications = async () => {
         try {
-            const res = await api.get('/notifications/');
-            setNotifications(res.data);
+            const [list, count] = await Promise.all([
+                api.get('/notifications/', { params: { limit: NOTIFICATION_LIMIT } }),
+                api.get('/notifications/unread-count'),
+            ]);
+            setNotifications(list.data);
+            setUnreadCount(count.data.unread);
         } catch (error) {
             console.error(error);
         }
@@ -23,18 +31,58 @@ const NotificationCenter = () => {
             api.put('/notifications/read-all');
             // Optimistically mark all read
             setNotifications(notifications.map(n => ({ ...n, is_read: true })));
+            setUnreadCount(0);
         }
     }, [show]);
 
     useEffect(() => {
         fetchNotifications();
-        const interval = setInterval(fetchNotifications, 60000); // Poll every minute
-        return () => clearInterval(interval);
+        const token = store.getState().auth.token;
+        if (!window.EventSource || !token) {
+            const interval = setInterval(fetchNotifications, 60000); // Poll every minute
+            return () => clearInterval(interval);
+        }
+        // New notifications are pushed by the server. The stream URL is signed and
+        // short-lived, so every (re)connect fetches a fresh one instead of letting
+        // EventSource retry the old URL.
+        let source = null;
+        let retry = null;
+        let closed = false;
+        const connect = async () => {
+            try {
+                const link = await api.get('/notifications/stream-link');
+                if (closed) return;
+                source = new EventSource(`${api.defaults.baseURL}${link.data.url}`);
+                source.addEventListener('notification', (event) => {
+                    const notification = JSON.parse(event.data);
+                    setNotifications(prev => [notification, ...prev.filter(n => n.id !== notification.id)].slice(0, NOTIFICATION_LIMIT));
+                    if (!notification.is_read) {
+                        setUnreadCount(count => count + 1);
+                    }
+                });
+                source.onerror = () => {
+                    source.close();
+                    retry = setTimeout(connect, 5000);
+                };
+            } catch (error) {
+                console.error(error);
+                retry = setTimeout(connect, 60000);
+            }
+        };
+        connect();
+        return () => {
+            closed = true;
+            clearTimeout(retry);
+            if (source) source.close();
+        };
     }, []);
 
     const markRead = async (id) => {
         try {
             await api.put(`/notifications/${id}/read`);
+            if (notifications.some(n => n.id === id && !n.is_read)) {
+                setUnreadCount(count => Math.max(count - 1, 0));
+            }
             setNotifications(notifications.map(n => n.id === id ? { ...n, is_read: true } : n));
         } catch (error) {
             console.error(error);
@@ -1,43 +1,55 @@
 import React, { useEffect, useState } from 'react';
 import { X, Save, FileText } from 'lucide-react';
 import api from '../utils/api';
+import { saveConfigContent, isConflict } from '../utils/configPatch';
 
 const PlanningModal = ({ projectId, onClose }) => {
     const [content, setContent] = useState('');
-    const [configId, setConfigId] = useState(null);
+    const [plan, setPlan] = useState(null); // last saved version: content + revision
     const [saving, setSaving] = useState(false);
 
+    const fetchPlan = async () => {
+        const res = await api.get(`/projects/${projectId}/configs/`);
+        return res.data.find(c => c.name === 'Project Plan') || null;
+    };
+
     useEffect(() => {
-        const fetchPlan = async () => {
+        const loadPlan = async () => {
             try {
-                const res = await api.get(`/projects/${projectId}/configs/`);
-                const plan = res.data.find(c => c.name === 'Project Plan');
-                if (plan) {
-                    setContent(plan.content);
-                    setConfigId(plan.id);
+                const found = await fetchPlan();
+                if (found) {
+                    setContent(found.content);
+                    setPlan(found);
                 }
             } catch (error) {
                 console.error(error);
             }
         };
-        fetchPlan();
+        loadPlan();
     }, [projectId]);
 
     const handleSave = async () => {
         setSaving(true);
         try {
-            if (configId) {
-                await api.put(`/configs/${configId}`, { content });
+            if (plan) {
+                // Only the edited span is sent, against the revision it was made on
+                setPlan(await saveConfigContent(plan, content));
             } else {
                 const res = await api.post(`/projects/${projectId}/configs/`, {
                     name: 'Project Plan',
                     content
                 });
-                setConfigId(res.data.id);
+                setPlan(res.data);
             }
         } catch (error) {
             console.error(error);
-            alert("Failed to save plan");
+            if (isConflict(error)) {
+                // Keep the local text; the next save overwrites the newer version on purpose
+                setPlan(await fetchPlan());
+                alert("The plan was changed by someone else since you opened it. Your text is kept; save again to overwrite their changes.");
+            } else {
+                alert("Failed to save plan");
+            }
         } finally {
             setSaving(false);
         }
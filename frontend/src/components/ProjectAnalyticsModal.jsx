@@ -1,20 +1,29 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 import { X, BarChart2, CheckCircle, AlertTriangle, Users, File } from 'lucide-react';
+import api from '../utils/api';
 
-const ProjectAnalyticsModal = ({ project, tasks, onClose }) => {
-    const totalTasks = tasks.length;
-    const doneTasks = tasks.filter(t => t.status === 'DONE').length;
-    const inProgressTasks = tasks.filter(t => t.status === 'IN_PROGRESS').length;
-    const todoTasks = tasks.filter(t => t.status === 'TODO').length;
+const ProjectAnalyticsModal = ({ project, onClose }) => {
+    const [analytics, setAnalytics] = useState(null);
+
+    useEffect(() => {
+        // Aggregated server-side, so the chart doesn't depend on having every task loaded
+        api.get(`/projects/${project.id}/analytics`)
+            .then(res => setAnalytics(res.data))
+            .catch(err => console.error("Failed to load analytics", err));
+    }, [project.id, project.version]);
+
+    const byStatus = analytics?.by_status || {};
+    const totalTasks = analytics?.total_tasks || 0;
+    const doneTasks = byStatus.DONE || 0;
+    const inProgressTasks = byStatus.IN_PROGRESS || 0;
+    const todoTasks = byStatus.TODO || 0;
     const completionRate = totalTasks ? Math.round((doneTasks / totalTasks) * 100) : 0;
 
-    const overdueTasks = tasks.filter(t => t.due_date && new Date(t.due_date) < new Date() && t.status !== 'DONE').length;
+    const overdueTasks = analytics?.overdue || 0;
 
     const memberStats = {};
-    tasks.forEach(t => {
-        const name = t.assignee ? t.assignee.full_name : 'Unassigned';
-        if (!memberStats[name]) memberStats[name] = 0;
-        memberStats[name]++;
+    (analytics?.by_assignee || []).forEach(a => {
+        memberStats[a.name] = (memberStats[a.name] || 0) + a.total;
     });
 
     const uniqueMembersCount = new Set([project.owner_id, ...(project.members?.map(m => m.id) || [])]).size;
@@ -1,6 +1,6 @@
 import React, { useState } from 'react';
 import { X, File, Paperclip, Upload, Trash2 } from 'lucide-react';
-import api from '../utils/api';
+import api, { openAttachment } from '../utils/api';
 import ConfirmDialog from './ConfirmDialog';
 
 const ProjectFilesModal = ({ project, onClose, onUpdate }) => {
@@ -63,13 +63,13 @@ const ProjectFilesModal = ({ project, onClose, onUpdate }) => {
                     ) : (
                         attachments.map(att => (
                             <div key={att.id} className="flex items-center gap-3 p-3 bg-slate-800/50 rounded-lg hover:bg-slate-800 border border-slate-700 hover:border-indigo-500/50 transition group">
-                                <a href={`http://localhost:8000/${att.file_path}`} target="_blank" rel="noreferrer" className="flex items-center gap-3 flex-1 min-w-0 group-hover:text-indigo-300">
+                                <button type="button" onClick={() => openAttachment(att)} className="flex items-center gap-3 flex-1 min-w-0 text-left group-hover:text-indigo-300">
                                     <File size={20} className="text-indigo-400" />
                                     <div className="flex-1 min-w-0 text-left">
                                         <div className="font-medium text-slate-300 truncate">{att.filename}</div>
                                         <div className="text-xs text-slate-500">{new Date(att.created_at).toLocaleDateString()}</div>
                                     </div>
-                                </a>
+                                </button>
                                 <button
                                     onClick={() => setDeleteId(att.id)}
                                     className="p-2 text-slate-500 hover:text-red-400 opacity-0 group-hover:opacity-100 transition"
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { X, Send, User, Trash2, Paperclip, Clock, Calendar, AtSign, Edit2, Check, Plus } from 'lucide-react';
-import api from '../utils/api';
+import api, { openAttachment } from '../utils/api';
 import { formatDistanceToNow, format } from 'date-fns';
 import ConfirmDialog from './ConfirmDialog';
 
@@ -212,10 +212,10 @@ const TaskDetailModal = ({ task, onClose, onUpdate, members }) => {
                             <div className="space-y-2">
                                 {task.attachments?.map(att => (
                                     <div key={att.id} className="flex items-center gap-2 group p-2 bg-slate-800/50 rounded-lg border border-transparent hover:border-slate-700">
-                                        <a href={`http://localhost:8000/${att.file_path}`} target="_blank" rel="noreferrer" className="flex items-center gap-3 flex-1 min-w-0">
+                                        <button type="button" onClick={() => openAttachment(att)} className="flex items-center gap-3 flex-1 min-w-0 text-left">
                                             <Paperclip size={16} className="text-indigo-400" />
                                             <span className="text-sm text-indigo-300 truncate">{att.filename}</span>
-                                        </a>
+                                        </button>
                                         <button
                                             onClick={() => setDeleteConf({ open: true, type: 'attachment', id: att.id })}
                                             className="opacity-100 md:opacity-0 group-hover:opacity-100 text-slate-500 hover:text-red-400 transition"
@@ -2,9 +2,10 @@ import React, { useEffect, useState } from 'react';
 import api from '../utils/api';
 import { Link } from 'react-router-dom';
 import { useSelector } from 'react-redux';
-import { Users, Folder, CheckSquare, Activity, ShieldAlert, ArrowLeft, Crown, User } from 'lucide-react';
+import { Users, Folder, CheckSquare, Activity, ShieldAlert, ArrowLeft, Crown, User, Search, ChevronLeft, ChevronRight } from 'lucide-react';
 
 const ADMIN_EMAIL = import.meta.env.VITE_ADMIN_EMAIL;
+const PAGE_SIZE = 50;
 
 const StatCard = ({ icon: Icon, label, value, color }) => (
     <div className="bg-slate-800/50 border border-slate-700/50 rounded-lg p-4 flex items-center gap-4">
@@ -40,32 +41,100 @@ const formatDateTime = (dt) => {
     return new Date(dt).toLocaleString('en-US', { month: 'short', day: 'numeric', hour: '2-digit', minute: '2-digit' });
 };
 
+// One server-side page of /admin/users or /admin/projects, with search; the total comes from X-Total-Count
+const usePagedList = (path, enabled, onError) => {
+    const [rows, setRows] = useState([]);
+    const [total, setTotal] = useState(null);
+    const [skip, setSkip] = useState(0);
+    const [search, setSearch] = useState('');
+    const [query, setQuery] = useState('');
+
+    useEffect(() => {
+        const timer = setTimeout(() => {
+            setQuery(search.trim());
+            setSkip(0);
+        }, 300);
+        return () => clearTimeout(timer);
+    }, [search]);
+
+    useEffect(() => {
+        if (!enabled) return;
+        let cancelled = false;
+        const params = { skip, limit: PAGE_SIZE };
+        if (query) params.q = query;
+        api.get(path, { params })
+            .then(res => {
+                if (cancelled) return;
+                setRows(res.data);
+                const header = res.headers['x-total-count'];
+                setTotal(header != null ? Number(header) : skip + res.data.length);
+            })
+            .catch(err => {
+                if (!cancelled) onError(err.response?.data?.detail || 'Failed to load admin data.');
+            });
+        return () => { cancelled = true; };
+    }, [path, enabled, skip, query]);
+
+    return { rows, total, skip, setSkip, search, setSearch };
+};
+
+const ListControls = ({ list, placeholder }) => {
+    const { total, skip, setSkip, search, setSearch } = list;
+    const last = total != null ? Math.min(skip + PAGE_SIZE, total) : skip + list.rows.length;
+    return (
+        <div className="flex items-center justify-between gap-3">
+            <div className="relative w-64">
+                <Search size={14} className="absolute left-2.5 top-1/2 -translate-y-1/2 text-slate-500" />
+                <input
+                    value={search}
+                    onChange={e => setSearch(e.target.value)}
+                    placeholder={placeholder}
+                    className="w-full bg-slate-800/60 border border-slate-700/50 rounded-lg pl-8 pr-3 py-1.5 text-xs text-slate-200 placeholder-slate-600 focus:outline-none focus:border-indigo-500"
+                />
+            </div>
+            <div className="flex items-center gap-2 text-xs text-slate-500">
+                <span>{total ? `${skip + 1}–${last} of ${total}` : '0 results'}</span>
+                <button
+                    onClick={() => setSkip(Math.max(skip - PAGE_SIZE, 0))}
+                    disabled={skip === 0}
+                    className="p-1 rounded hover:bg-slate-800 hover:text-white disabled:opacity-30 disabled:hover:bg-transparent transition"
+                >
+                    <ChevronLeft size={14} />
+                </button>
+                <button
+                    onClick={() => setSkip(skip + PAGE_SIZE)}
+                    disabled={total == null || skip + PAGE_SIZE >= total}
+                    className="p-1 rounded hover:bg-slate-800 hover:text-white disabled:opacity-30 disabled:hover:bg-transparent transition"
+                >
+                    <ChevronRight size={14} />
+                </button>
+            </div>
+        </div>
+    );
+};
+
 const AdminPanel = () => {
     const { user } = useSelector(state => state.auth);
     const [activeTab, setActiveTab] = useState('users');
     const [stats, setStats] = useState(null);
-    const [users, setUsers] = useState([]);
-    const [projects, setProjects] = useState([]);
     const [logs, setLogs] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState('');
 
     const isAdmin = user?.email === ADMIN_EMAIL;
+    const users = usePagedList('/admin/users', isAdmin, setError);
+    const projects = usePagedList('/admin/projects', isAdmin, setError);
 
     useEffect(() => {
         if (!isAdmin) { setLoading(false); return; }
         const fetchAll = async () => {
             setLoading(true);
             try {
-                const [statsRes, usersRes, projectsRes, logsRes] = await Promise.all([
+                const [statsRes, logsRes] = await Promise.all([
                     api.get('/admin/stats'),
-                    api.get('/admin/users'),
-                    api.get('/admin/projects'),
                     api.get('/admin/logs?limit=200'),
                 ]);
                 setStats(statsRes.data);
-                setUsers(usersRes.data);
-                setProjects(projectsRes.data);
                 setLogs(logsRes.data);
             } catch (err) {
                 setError(err.response?.data?.detail || 'Failed to load admin data.');
@@ -155,69 +224,75 @@ const AdminPanel = () => {
 
                         {/* Users Tab */}
                         {activeTab === 'users' && (
-                            <div className="overflow-x-auto rounded-lg border border-slate-700/50">
-                                <table className="w-full text-sm">
-                                    <thead className="bg-slate-800/60 text-xs text-slate-500 uppercase tracking-wide">
-                                        <tr>
-                                            <th className="px-4 py-3 text-left">Name</th>
-                                            <th className="px-4 py-3 text-left">Email</th>
-                                            <th className="px-4 py-3 text-left">Plan</th>
-                                            <th className="px-4 py-3 text-left">Projects</th>
-                                            <th className="px-4 py-3 text-left">Joined</th>
-                                        </tr>
-                                    </thead>
-                                    <tbody className="divide-y divide-slate-800">
-                                        {users.map(u => (
-                                            <tr key={u.id} className="hover:bg-slate-800/30 transition">
-                                                <td className="px-4 py-3 font-medium text-slate-200">{u.full_name || '—'}</td>
-                                                <td className="px-4 py-3 text-slate-400 text-xs">{u.email}</td>
-                                                <td className="px-4 py-3"><PlanBadge plan={u.plan} /></td>
-                                                <td className="px-4 py-3 text-slate-400">{u.project_count}</td>
-                                                <td className="px-4 py-3 text-slate-500 text-xs">{formatDate(u.created_at)}</td>
+                            <div className="space-y-3">
+                                <ListControls list={users} placeholder="Search name or email" />
+                                <div className="overflow-x-auto rounded-lg border border-slate-700/50">
+                                    <table className="w-full text-sm">
+                                        <thead className="bg-slate-800/60 text-xs text-slate-500 uppercase tracking-wide">
+                                            <tr>
+                                                <th className="px-4 py-3 text-left">Name</th>
+                                                <th className="px-4 py-3 text-left">Email</th>
+                                                <th className="px-4 py-3 text-left">Plan</th>
+                                                <th className="px-4 py-3 text-left">Projects</th>
+                                                <th className="px-4 py-3 text-left">Joined</th>
                                             </tr>
-                                        ))}
-                                        {users.length === 0 && (
-                                            <tr><td colSpan={5} className="px-4 py-10 text-center text-slate-600 text-xs">No users found</td></tr>
-                                        )}
-                                    </tbody>
-                                </table>
+                                        </thead>
+                                        <tbody className="divide-y divide-slate-800">
+                                            {users.rows.map(u => (
+                                                <tr key={u.id} className="hover:bg-slate-800/30 transition">
+                                                    <td className="px-4 py-3 font-medium text-slate-200">{u.full_name || '—'}</td>
+                                                    <td className="px-4 py-3 text-slate-400 text-xs">{u.email}</td>
+                                                    <td className="px-4 py-3"><PlanBadge plan={u.plan} /></td>
+                                                    <td className="px-4 py-3 text-slate-400">{u.project_count}</td>
+                                                    <td className="px-4 py-3 text-slate-500 text-xs">{formatDate(u.created_at)}</td>
+                                                </tr>
+                                            ))}
+                                            {users.rows.length === 0 && (
+                                                <tr><td colSpan={5} className="px-4 py-10 text-center text-slate-600 text-xs">No users found</td></tr>
+                                            )}
+                                        </tbody>
+                                    </table>
+                                </div>
                             </div>
                         )}
 
                         {/* Projects Tab */}
                         {activeTab === 'projects' && (
-                            <div className="overflow-x-auto rounded-lg border border-slate-700/50">
-                                <table className="w-full text-sm">
-                                    <thead className="bg-slate-800/60 text-xs text-slate-500 uppercase tracking-wide">
-                                        <tr>
-                                            <th className="px-4 py-3 text-left">Project</th>
-                                            <th className="px-4 py-3 text-left">Owner</th>
-                                            <th className="px-4 py-3 text-left">Tasks</th>
-                                            <th className="px-4 py-3 text-left">Members</th>
-                                            <th className="px-4 py-3 text-left">Created</th>
-                                        </tr>
-                                    </thead>
-                                    <tbody className="divide-y divide-slate-800">
-                                        {projects.map(p => (
-                                            <tr key={p.id} className="hover:bg-slate-800/30 transition">
-                                                <td className="px-4 py-3">
-                                                    <p className="font-medium text-slate-200">{p.name}</p>
-                                                    {p.description && <p className="text-[11px] text-slate-600 truncate max-w-[200px]">{p.description}</p>}
-                                                </td>
-                                                <td className="px-4 py-3">
-                                                    <p className="text-slate-300 text-xs">{p.owner_name}</p>
-                                                    <p className="text-slate-600 text-[11px]">{p.owner_email}</p>
-                                                </td>
-                                                <td className="px-4 py-3 text-slate-400">{p.task_count}</td>
-                                                <td className="px-4 py-3 text-slate-400">{p.member_count}</td>
-                                                <td className="px-4 py-3 text-slate-500 text-xs">{formatDate(p.created_at)}</td>
+                            <div className="space-y-3">
+                                <ListControls list={projects} placeholder="Search project or owner" />
+                                <div className="overflow-x-auto rounded-lg border border-slate-700/50">
+                                    <table className="w-full text-sm">
+                                        <thead className="bg-slate-800/60 text-xs text-slate-500 uppercase tracking-wide">
+                                            <tr>
+                                                <th className="px-4 py-3 text-left">Project</th>
+                                                <th className="px-4 py-3 text-left">Owner</th>
+                                                <th className="px-4 py-3 text-left">Tasks</th>
+                                                <th className="px-4 py-3 text-left">Members</th>
+                                                <th className="px-4 py-3 text-left">Created</th>
                                             </tr>
-                                        ))}
-                                        {projects.length === 0 && (
-                                            <tr><td colSpan={5} className="px-4 py-10 text-center text-slate-600 text-xs">No projects found</td></tr>
-                                        )}
-                                    </tbody>
-                                </table>
+                                        </thead>
+                                        <tbody className="divide-y divide-slate-800">
+                                            {projects.rows.map(p => (
+                                                <tr key={p.id} className="hover:bg-slate-800/30 transition">
+                                                    <td className="px-4 py-3">
+                                                        <p className="font-medium text-slate-200">{p.name}</p>
+                                                        {p.description && <p className="text-[11px] text-slate-600 truncate max-w-[200px]">{p.description}</p>}
+                                                    </td>
+                                                    <td className="px-4 py-3">
+                                                        <p className="text-slate-300 text-xs">{p.owner_name}</p>
+                                                        <p className="text-slate-600 text-[11px]">{p.owner_email}</p>
+                                                    </td>
+                                                    <td className="px-4 py-3 text-slate-400">{p.task_count}</td>
+                                                    <td className="px-4 py-3 text-slate-400">{p.member_count}</td>
+                                                    <td className="px-4 py-3 text-slate-500 text-xs">{formatDate(p.created_at)}</td>
+                                                </tr>
+                                            ))}
+                                            {projects.rows.length === 0 && (
+                                                <tr><td colSpan={5} className="px-4 py-10 text-center text-slate-600 text-xs">No projects found</td></tr>
+                                            )}
+                                        </tbody>
+                                    </table>
+                                </div>
                             </div>
                         )}
 
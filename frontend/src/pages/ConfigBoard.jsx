@@ -1,6 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import api from '../utils/api';
+import { saveConfigContent, isConflict } from '../utils/configPatch';
 import { ArrowLeft, Plus, Share2, Trash2, Copy, ExternalLink, X, FileCode } from 'lucide-react';
 import ConfirmDialog from '../components/ConfirmDialog';
 
@@ -12,6 +13,7 @@ const ConfigBoard = () => {
     const [shareInfo, setShareInfo] = useState(null);
     const [deleteConfirm, setDeleteConfirm] = useState({ open: false, configId: null });
     const [loading, setLoading] = useState(true);
+    const [conflicts, setConflicts] = useState({}); // config id -> unsaved text that another save got ahead of
 
     const fetchConfigs = async () => {
         setLoading(true);
@@ -41,10 +43,26 @@ const ConfigBoard = () => {
         }
     };
 
-    const handleUpdate = async (configId, content) => {
+    const clearConflict = (configId) => {
+        setConflicts(({ [configId]: _, ...rest }) => rest);
+    };
+
+    const handleUpdate = async (config, content) => {
         try {
-            await api.put(`/configs/${configId}`, { content });
+            const saved = await saveConfigContent(config, content);
+            setConfigs(current => current.map(c => c.id === saved.id ? saved : c));
+            clearConflict(config.id);
         } catch (error) {
+            if (isConflict(error)) {
+                // Keep the user's text and load the other save underneath it; saving again applies it on top of that revision
+                setConflicts(current => ({ ...current, [config.id]: content }));
+                try {
+                    const res = await api.get(`/projects/${id}/configs/`);
+                    setConfigs(res.data);
+                } catch (fetchError) {
+                    console.error(fetchError);
+                }
+            }
             console.error(error);
         }
     };
@@ -70,6 +88,15 @@ const ConfigBoard = () => {
         }
     };
 
+    const handleUnshare = async (configId) => {
+        try {
+            await api.delete(`/configs/${configId}/share`);
+            fetchConfigs();
+        } catch (error) {
+            console.error(error);
+        }
+    };
+
     const copyToClipboard = (text) => {
         navigator.clipboard.writeText(text);
     };
@@ -112,7 +139,12 @@ const ConfigBoard = () => {
                                         <span className="text-xs font-medium">{config.name}</span>
                                         <div className="flex items-center gap-1">
                                             {config.share_token && (
-                                                <span className="text-xs text-green-400 bg-green-400/10 px-1.5 py-0.5 rounded">shared</span>
+                                                <span className="flex items-center gap-1 text-xs text-green-400 bg-green-400/10 px-1.5 py-0.5 rounded">
+                                                    shared
+                                                    <button onClick={() => handleUnshare(config.id)} className="hover:text-red-400 transition" title="Stop sharing">
+                                                        <X size={10} />
+                                                    </button>
+                                                </span>
                                             )}
                                             <button onClick={() => handleShare(config.id)} className="p-1 text-slate-400 hover:text-indigo-400 transition">
                                                 <Share2 size={12} />
@@ -122,12 +154,40 @@ const ConfigBoard = () => {
                                             </button>
                                         </div>
                                     </div>
+                                    {conflicts[config.id] !== undefined && (
+                                        <div className="px-3 py-2 border-b border-amber-500/20 bg-amber-500/10 text-[11px] text-amber-300 space-y-1.5">
+                                            <p>Someone else saved this config while you were editing. Your unsaved version is below; saving it replaces theirs.</p>
+                                            <details>
+                                                <summary className="cursor-pointer text-amber-400/80 hover:text-amber-300">Show their version (revision {config.revision})</summary>
+                                                <pre className="mt-1 max-h-32 overflow-auto whitespace-pre-wrap font-mono text-slate-300">{config.content}</pre>
+                                            </details>
+                                            <div className="flex items-center gap-2">
+                                                <button
+                                                    onClick={() => handleUpdate(config, conflicts[config.id])}
+                                                    className="bg-amber-500/20 hover:bg-amber-500/30 text-amber-200 px-2 py-0.5 rounded transition"
+                                                >
+                                                    Save mine
+                                                </button>
+                                                <button onClick={() => clearConflict(config.id)} className="text-slate-400 hover:text-white px-2 py-0.5 rounded transition">
+                                                    Discard mine
+                                                </button>
+                                            </div>
+                                        </div>
+                                    )}
                                     <textarea
+                                        key={`${config.id}-${config.revision}-${conflicts[config.id] !== undefined ? 'draft' : 'saved'}`}
                                         className="w-full h-40 bg-slate-900/50 text-green-400 p-3 text-xs font-mono resize-none focus:outline-none"
-                                        defaultValue={config.content}
+                                        defaultValue={conflicts[config.id] ?? config.content}
+                                        onChange={(e) => {
+                                            if (conflicts[config.id] !== undefined) {
+                                                const draft = e.target.value;
+                                                setConflicts(current => ({ ...current, [config.id]: draft }));
+                                            }
+                                        }}
                                         onBlur={(e) => {
-                                            if (e.target.value !== config.content) {
-                                                handleUpdate(config.id, e.target.value);
+                                            // While a conflict is open the user saves explicitly
+                                            if (conflicts[config.id] === undefined && e.target.value !== config.content) {
+                                                handleUpdate(config, e.target.value);
                                             }
                                         }}
                                         spellCheck={false}
@@ -509,7 +509,7 @@ const ProjectView = () => {
             )}
 
             {showAnalytics && (
-                <ProjectAnalyticsModal project={project} tasks={tasks} onClose={() => setShowAnalytics(false)} />
+                <ProjectAnalyticsModal project={project} onClose={() => setShowAnalytics(false)} />
             )}
 
             {showStageModal && (
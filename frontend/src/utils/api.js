@@ -38,4 +38,20 @@ api.interceptors.response.use(
     }
 );
 
+// Links can't carry the Authorization header, so downloads go through a short-lived signed URL
+export const openAttachment = async (attachment) => {
+    // Opened before the request so popup blockers still treat it as a click
+    const tab = window.open('', '_blank');
+    if (tab) tab.opener = null;
+    try {
+        const { data } = await api.get(`/attachments/${attachment.id}/link`);
+        const url = `${api.defaults.baseURL}${data.url}`;
+        if (tab) tab.location.href = url;
+        else window.location.href = url;
+    } catch (error) {
+        if (tab) tab.close();
+        console.error(error);
+    }
+};
+
 export default api;
@@ -0,0 +1,28 @@
+import api from './api';
+
+// The single splice that turns `before` into `after`: everything between their
+// common prefix and suffix. Positions are JS string indices (UTF-16 units),
+// which is what PATCH /configs/{id} expects.
+export const diffEdits = (before, after) => {
+    const limit = Math.min(before.length, after.length);
+    let prefix = 0;
+    while (prefix < limit && before.charCodeAt(prefix) === after.charCodeAt(prefix)) prefix++;
+    let suffix = 0;
+    while (suffix < limit - prefix && before.charCodeAt(before.length - suffix - 1) === after.charCodeAt(after.length - suffix - 1)) suffix++;
+    // Don't split surrogate pairs
+    if (prefix > 0 && /[\uD800-\uDBFF]/.test(before[prefix - 1])) prefix--;
+    if (suffix > 0 && /[\uDC00-\uDFFF]/.test(before[before.length - suffix])) suffix--;
+    return [{ pos: prefix, delete: before.length - prefix - suffix, insert: after.slice(prefix, after.length - suffix) }];
+};
+
+// Sends only the changed part of a config's content. Resolves to the updated
+// config; rejects with a 409 response if someone else saved since `config.revision`.
+export const saveConfigContent = async (config, content) => {
+    const res = await api.patch(`/configs/${config.id}`, {
+        base_revision: config.revision,
+        edits: diffEdits(config.content || '', content),
+    });
+    return res.data;
+};
+
+export const isConflict = (error) => error.response?.status === 409;